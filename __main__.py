@@ -1,16 +1,116 @@
 ''' Main executable for the "hg_tweetfeeder" Twitter bot. '''
 
-from tweetfeeder import TweetFeederBot
-from tweetfeeder.flags import BotFunctions
+import argparse
+import sys
+from os import path
 
-def main():
-    """ Main body for starting up and terminating Tweetfeeder bot """
-    # pylint: disable=no-member
+COMMANDS = ('run', 'host', 'fleet', 'report', 'validate', 'simulate')
+
+def run(args):
+    ''' Starts one bot from a config file '''
+    from tweetfeeder.bot import TweetFeederBot
+    from tweetfeeder.flags import BotFunctions
+    bot = TweetFeederBot(BotFunctions.All, args.config)
+    #bot.master_cmd.cmdloop()
+    return bot
+
+def host(args):
+    ''' Runs one bot per config in a directory, all in this process '''
+    from tweetfeeder.host import BotHost
+    from tweetfeeder.flags import BotFunctions
+    bot_host = BotHost(args.configs, BotFunctions.All, args.workers)
+    try:
+        bot_host.wait()
+    except KeyboardInterrupt:
+        bot_host.shutdown()
+    return bot_host
+
+def fleet(args):
+    ''' Spreads the configs in a directory over worker processes '''
+    from tweetfeeder.fleet import Fleet
+    from tweetfeeder.flags import BotFunctions
+    bot = Fleet(args.configs, args.processes, BotFunctions.All, args.workers)
+    bot.start()
     try:
-        bot = TweetFeederBot(BotFunctions.All, "config/settings.ini")
-        #bot.master_cmd.cmdloop()
+        bot.wait()
     except KeyboardInterrupt:
         bot.shutdown()
+    return bot
+
+def report(args):
+    ''' Prints a summary of a stats file '''
+    from tweetfeeder import analytics
+    analytics.main([args.stats, '--top', str(args.top)] + (['--json'] if args.json else []))
+
+def validate(args):
+    ''' Checks that a feed file would load; returns 1 if it wouldn't '''
+    from tweetfeeder.exceptions import LoadFeedError
+    from tweetfeeder.file_io.models import Feed
+    try:
+        entries, _ = Feed(args.feed).read()
+    except LoadFeedError:
+        return 1 # Already logged
+    chained = sum(1 for entry in entries if entry['chain'])
+    print("{} entries ({} chained to the next), {} can be rerun".format(
+        len(entries), chained, sum(1 for entry in entries if entry['rerun'])
+    ))
+    return 0
+
+def simulate(args):
+    ''' Prints the upcoming tweets of a config without tweeting them '''
+    from tweetfeeder.file_io.config import Config
+    from tweetfeeder.file_io.models import Feed, Stats
+    from tweetfeeder.flags import BotFunctions
+    from tweetfeeder import simulation
+    config = Config(BotFunctions(), None, args.config)
+    schedule = simulation.simulate(
+        config, Feed(config.feed_filepath), Stats(config.stats_filepath), args.count
+    )
+    print(simulation.describe(schedule))
+
+def parse_args(argv: list):
+    """
+    Reads the subcommand and its arguments.
+    Without a subcommand, the first argument is a config (run), a directory of them (host),
+    or a directory followed by a number of processes (fleet), as before subcommands existed.
+    """
+    if not argv or argv[0] not in COMMANDS and not argv[0].startswith('-'):
+        config_path = argv[0] if argv else "config/settings.ini"
+        if path.isdir(config_path):
+            argv = ['fleet'] + argv if len(argv) > 1 else ['host'] + argv
+        else:
+            argv = ['run'] + argv[:1]
+    parser = argparse.ArgumentParser(prog="tweetfeeder", description=__doc__.strip())
+    commands = parser.add_subparsers(dest='command')
+    command = commands.add_parser('run', help=run.__doc__.strip())
+    command.add_argument('config', nargs='?', default="config/settings.ini")
+    command = commands.add_parser('host', help=host.__doc__.strip())
+    command.add_argument('configs', help="directory of .ini configs")
+    command.add_argument('--workers', type=int, default=4, help="scheduler worker threads")
+    command = commands.add_parser('fleet', help=fleet.__doc__.strip())
+    command.add_argument('configs', help="directory of .ini configs")
+    command.add_argument('processes', type=int, nargs='?', help="worker processes (default: one per core)")
+    command.add_argument('--workers', type=int, default=4, help="scheduler worker threads per process")
+    command = commands.add_parser('report', help=report.__doc__.strip())
+    command.add_argument('stats', help="path to a stats JSON file")
+    command.add_argument('--top', type=int, default=10, help="number of top tweets to list")
+    command.add_argument('--json', action='store_true', help="print JSON instead of text")
+    command = commands.add_parser('validate', help=validate.__doc__.strip())
+    command.add_argument('feed', help="path to a feed JSON file")
+    command = commands.add_parser('simulate', help=simulate.__doc__.strip())
+    command.add_argument('config', nargs='?', default="config/settings.ini")
+    command.add_argument('--count', type=int, default=10, help="number of tweets to list")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Main body for starting up and terminating Tweetfeeder bot,
+    or for running one of the short-lived commands (report, validate, simulate).
+    Each command imports only what it needs.
+    """
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    result = globals()[args.command](args)
+    return result if isinstance(result, int) else 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""
+Benchmarks for TweetFeeder's hot paths.
+As with the tests, run them from the repository root,
+e.g. python -m benchmarks.stream_replay
+so that the tweetfeeder module is found.
+"""
@@ -0,0 +1,500 @@
+"""
+Local stand-in for the parts of the Twitter API that TweetFeeder uses,
+with configurable latency, error injection and rate limits, for offline load tests.
+python -m benchmarks.fake_twitter --loops 8 --tweets 200 --latency 0.02 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import sys
+from collections import Counter, namedtuple
+from datetime import datetime
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from time import perf_counter, sleep, time
+from urllib.parse import urlencode, urlparse, parse_qs
+from requests.structures import CaseInsensitiveDict
+from tweepy.error import TweepError, RateLimitError
+from tweepy.models import Status, DirectMessage
+from tweepy.parsers import ModelParser
+from benchmarks import fixtures
+from benchmarks.stream_replay import PayloadFactory, parse_mix, BOT_ID, MASTER_ID, DEFAULT_MIX
+
+# Requests allowed per rate limit window, by endpoint (0 for unlimited)
+DEFAULT_LIMITS = {
+    'statuses/update': 300,
+    'statuses/show': 900,
+    'statuses/lookup': 900,
+    'statuses/user_timeline': 900,
+    'direct_messages/new': 1000
+}
+
+ROUTES = {
+    ('POST', '/1.1/statuses/update.json'): 'statuses/update',
+    ('GET', '/1.1/statuses/show.json'): 'statuses/show',
+    ('GET', '/1.1/statuses/lookup.json'): 'statuses/lookup',
+    ('POST', '/1.1/statuses/lookup.json'): 'statuses/lookup',
+    ('GET', '/1.1/statuses/user_timeline.json'): 'statuses/user_timeline',
+    ('POST', '/1.1/direct_messages/new.json'): 'direct_messages/new',
+    ('POST', '/1.1/direct_messages/events/new.json'): 'direct_messages/new',
+    ('GET', '/1.1/user.json'): 'user'
+}
+
+Response = namedtuple('Response', 'status_code headers text')
+
+class FakeTwitterError(Exception):
+    ''' An error response: HTTP status, Twitter error code and message '''
+    def __init__(self, status: int, code: int, message: str):
+        super(FakeTwitterError, self).__init__(message)
+        self.status = status
+        self.code = code
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    ''' Hands every request to the FakeTwitter that owns the server '''
+    def do_GET(self):
+        ''' Reads, shows, timelines and the userstream '''
+        self.server.fake.handle(self, 'GET')
+
+    def do_POST(self):
+        ''' Status updates, lookups and direct messages '''
+        self.server.fake.handle(self, 'POST')
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        ''' Keep requests out of stderr '''
+        pass
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    ''' HTTPServer answering each request on its own thread '''
+    daemon_threads = True
+
+class FakeTwitter:
+    """
+    In-memory Twitter on a loopback port. Statuses posted to it can be shown, looked up,
+    found in their poster's timeline and favorited or retweeted in its synthetic userstream.
+    Clients say which bot they are with an X-Fake-User header, in place of OAuth.
+    Every response waits [latency] (+ up to [jitter]) seconds; [error_rate] of them
+    fail with Over capacity, and endpoints answer 429 once their [rate_limits] are used up.
+    """
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limits: dict = None, window: float = 900, stream_rate: float = 0.0, seed: int = 0):
+        ''' Prepares the server; start() begins serving '''
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limits = dict(DEFAULT_LIMITS, **(rate_limits or {}))
+        self.window = window
+        self.stream_rate = stream_rate
+        self.statuses = {}
+        self.posted = [] # IDs of statuses posted through statuses/update
+        self.direct_messages = []
+        self.requests = Counter() # Requests by endpoint
+        self.errors = Counter() # Injected errors by endpoint
+        self.rate_limited = Counter() # 429 responses by endpoint
+        self._random = random.Random(seed)
+        self._seed = seed
+        self._next_id = 900000000000000000
+        self._users = {}
+        self._windows = {} # (Endpoint, user ID): [window start, requests made]
+        self._failures = [] # (status, code, message) to answer the next requests with
+        self._lock = Lock()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', port), FakeTwitterHandler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        ''' Base URL of the server '''
+        return "http://{}:{}".format(*self._server.server_address)
+
+    def start(self):
+        ''' Serves from a daemon thread '''
+        self._thread = Thread(target=self._server.serve_forever, name="FakeTwitter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        ''' Shuts the server down '''
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def client(self, user_id: int = BOT_ID):
+        ''' Client acting as the bot with the given user ID '''
+        return FakeTwitterClient(self.url, user_id)
+
+    def api_factory(self, user_id: int = BOT_ID):
+        ''' Drop-in for tweepy.API as an api_factory (see TweetLoop and TweetFeederListener) '''
+        return lambda authorization=None, **options: self.client(user_id)
+
+    def fail_next(self, count: int = 1, status: int = 503, code: int = 130, message: str = "Over capacity"):
+        ''' Answers the next [count] API requests with an error '''
+        with self._lock:
+            self._failures.extend([(status, code, message)] * count)
+
+    # Request handling
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str):
+        ''' Routes, delays, limits and answers one request '''
+        url = urlparse(request.path)
+        endpoint = ROUTES.get((method, url.path))
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if method == 'POST':
+            body = request.rfile.read(int(request.headers.get('Content-Length') or 0)).decode('utf8')
+            if 'json' in (request.headers.get('Content-Type') or ''):
+                params.update(json.loads(body or "{}"))
+            else:
+                params.update({key: values[-1] for key, values in parse_qs(body).items()})
+        params['_user'] = int(request.headers.get('X-Fake-User') or BOT_ID)
+        if endpoint == 'user':
+            self._userstream(request, params)
+            return
+        headers = {}
+        try:
+            if not endpoint:
+                raise FakeTwitterError(404, 34, "Sorry, that page does not exist.")
+            with self._lock:
+                self.requests[endpoint] += 1
+                headers = self._use_rate_limit(endpoint, params['_user'])
+                failure = self._failures.pop(0) if self._failures else None
+            delay = self.latency + self.jitter * self._random.random()
+            if delay:
+                sleep(delay)
+            if failure or self._random.random() < self.error_rate:
+                with self._lock:
+                    self.errors[endpoint] += 1
+                raise FakeTwitterError(*(failure or (503, 130, "Over capacity")))
+            status, payload = 200, getattr(self, '_' + endpoint.replace('/', '_'))(params)
+        except FakeTwitterError as e:
+            status, payload = e.status, {'errors': [{'code': e.code, 'message': str(e)}]}
+            headers = getattr(e, 'headers', headers)
+        self._respond(request, status, payload, headers)
+
+    def _use_rate_limit(self, endpoint: str, user_id: int) -> dict:
+        ''' Counts a request against the user's window for the endpoint; raises a 429 if it's used up '''
+        limit = self.rate_limits.get(endpoint, 0)
+        if not limit:
+            return {}
+        now = time()
+        window = self._windows.get((endpoint, user_id))
+        if not window or now >= window[0] + self.window:
+            window = self._windows[(endpoint, user_id)] = [now, 0]
+        headers = {
+            'x-rate-limit-limit': str(limit),
+            'x-rate-limit-remaining': str(max(limit - window[1] - 1, 0)),
+            'x-rate-limit-reset': str(int(window[0] + self.window))
+        }
+        if window[1] >= limit:
+            self.rate_limited[endpoint] += 1
+            error = FakeTwitterError(429, 88, "Rate limit exceeded")
+            error.headers = headers
+            raise error
+        window[1] += 1
+        return headers
+
+    @staticmethod
+    def _respond(request: BaseHTTPRequestHandler, status: int, payload, headers: dict):
+        ''' Writes a JSON response '''
+        body = json.dumps(payload).encode('utf8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json;charset=utf-8')
+        request.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _user(self, user_id: int) -> dict:
+        ''' The (shared) user object for an ID '''
+        if user_id not in self._users:
+            self._users[user_id] = {
+                'id': user_id, 'id_str': str(user_id), 'name': "User {}".format(user_id),
+                'screen_name': "fake_bot" if user_id == BOT_ID else "user{}".format(user_id)
+            }
+        return self._users[user_id]
+
+    def _make_status(self, text: str, user: dict, **fields) -> dict:
+        ''' Stores and returns a new status '''
+        with self._lock:
+            self._next_id += 1
+            status = {
+                'id': self._next_id, 'id_str': str(self._next_id), 'text': text, 'user': user,
+                'created_at': datetime.utcnow().strftime("%a %b %d %H:%M:%S +0000 %Y"),
+                'favorite_count': 0, 'retweet_count': 0, 'in_reply_to_status_id': None
+            }
+            status.update(fields)
+            self.statuses[status['id']] = status
+        return status
+
+    def _find_status(self, params: dict) -> dict:
+        ''' The status named by the id parameter, or a 404 '''
+        try:
+            return self.statuses[int(params.get('id'))]
+        except (KeyError, TypeError, ValueError):
+            raise FakeTwitterError(404, 144, "No status found with that ID.")
+
+    # Endpoints
+
+    def _statuses_update(self, params: dict) -> dict:
+        ''' Posts a status as the client's bot; Twitter refuses to post the same text twice in a row '''
+        text = params.get('status', "")
+        user = self._user(params['_user'])
+        with self._lock:
+            latest = next((self.statuses[twid] for twid in reversed(self.posted) if self.statuses[twid]['user'] is user), None)
+        if latest and latest['text'] == text:
+            raise FakeTwitterError(403, 187, "Status is a duplicate.")
+        reply_to = params.get('in_reply_to_status_id')
+        status = self._make_status(text, user, in_reply_to_status_id=int(reply_to) if reply_to else None)
+        with self._lock:
+            self.posted.append(status['id'])
+        return status
+
+    def _statuses_show(self, params: dict) -> dict:
+        ''' One status, with some engagement so stats syncs have something to count '''
+        status = self._find_status(params)
+        status['favorite_count'] += self._random.randint(0, 2)
+        status['retweet_count'] += self._random.randint(0, 1)
+        return status
+
+    def _statuses_lookup(self, params: dict) -> list:
+        ''' Statuses for up to 100 comma separated IDs; unknown IDs are left out '''
+        ids = [int(twid) for twid in str(params.get('id', "")).split(',') if twid.strip()][:100]
+        return [self.statuses[twid] for twid in ids if twid in self.statuses]
+
+    def _statuses_user_timeline(self, params: dict) -> list:
+        """
+        A bot's statuses, newest first. Any user who hasn't posted has retweeted
+        the latest posted status and then commented on it.
+        """
+        count = int(params.get('count', 20))
+        user = self._user(int(params.get('user_id') or params.get('id') or params['_user']))
+        with self._lock:
+            posted = [self.statuses[twid] for twid in reversed(self.posted)]
+        timeline = [status for status in posted if status['user'] is user]
+        if timeline or not posted:
+            return timeline[:count]
+        retweeted = posted[0]
+        retweet = self._make_status("RT @{}: {}".format(retweeted['user']['screen_name'], retweeted['text']), user, retweeted_status=retweeted)
+        comment = self._make_status("Great RT, had to share", user)
+        return [comment, retweet]
+
+    def _direct_messages_new(self, params: dict) -> dict:
+        ''' Sends a DM (old style user_id/text, or an events/new message_create event) '''
+        event = params.get('event')
+        if event:
+            recipient = event['message_create']['target']['recipient_id']
+            text = event['message_create']['message_data']['text']
+        else:
+            recipient, text = params.get('user_id') or params.get('recipient_id'), params.get('text')
+        with self._lock:
+            self._next_id += 1
+            message = {'id': self._next_id, 'text': text, 'recipient_id': int(recipient), 'sender_id': params['_user']}
+            self.direct_messages.append(message)
+        return message
+
+    def _userstream(self, request: BaseHTTPRequestHandler, params: dict):
+        """
+        Length-delimited stream of [count] synthetic events (see stream_replay)
+        aimed at the bot's statuses, at [stream_rate] events/sec.
+        """
+        count = int(params.get('count', 100))
+        kinds = parse_mix(params.get('mix', DEFAULT_MIX))
+        with self._lock:
+            self.requests['user'] += 1
+            registered = list(self.posted)
+        factory = PayloadFactory(registered or [1], self._seed)
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.end_headers()
+        started = perf_counter()
+        try:
+            for num in range(count):
+                if self.stream_rate:
+                    delay = started + num / self.stream_rate - perf_counter()
+                    if delay > 0:
+                        sleep(delay)
+                message = (factory.make(factory.random.choice(kinds)) + "\r\n").encode('utf8')
+                request.wfile.write("{}\r\n".format(len(message)).encode('utf8') + message)
+            request.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass # The client hung up
+
+class FakeTwitterClient:
+    """
+    The part of tweepy.API that TweetFeeder calls, over plain HTTP to a FakeTwitter.
+    (Tweepy itself only speaks HTTPS to fixed hosts.) Returns tweepy models and raises
+    TweepError or RateLimitError with the response, like tweepy does.
+    """
+    def __init__(self, url: str, user_id: int = BOT_ID):
+        ''' Remembers the server; connections are made per call, as tweepy 3 does '''
+        address = urlparse(url)
+        self.host, self.port = address.hostname, address.port
+        self.user_id = user_id
+        self.parser = ModelParser()
+        self.last_response: Response = None
+
+    def _call(self, method: str, path: str, params: dict = None):
+        ''' Makes one request and returns its decoded JSON '''
+        connection = HTTPConnection(self.host, self.port, timeout=30)
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        try:
+            headers = {'X-Fake-User': str(self.user_id)}
+            if method == 'GET':
+                connection.request('GET', "/1.1/{}.json?{}".format(path, urlencode(params)), headers=headers)
+            else:
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                connection.request('POST', "/1.1/{}.json".format(path), urlencode(params), headers)
+            reply = connection.getresponse()
+            response = Response(reply.status, CaseInsensitiveDict(reply.getheaders()), reply.read().decode('utf8'))
+        except OSError as e:
+            raise TweepError("Failed to send request: {}".format(e))
+        finally:
+            connection.close()
+        self.last_response = response
+        payload = json.loads(response.text)
+        if response.status_code != 200:
+            error = payload['errors'][0]
+            error_class = RateLimitError if response.status_code == 429 else TweepError
+            raise error_class(error['message'], response, error['code'])
+        return payload
+
+    def update_status(self, status: str = None, in_reply_to_status_id=None, **kwargs) -> Status:
+        ''' POST statuses/update '''
+        return Status.parse(self, self._call('POST', 'statuses/update', {
+            'status': kwargs.get('status', status), 'in_reply_to_status_id': in_reply_to_status_id
+        }))
+
+    def get_status(self, id=None, **kwargs) -> Status: # pylint: disable=redefined-builtin
+        ''' GET statuses/show '''
+        return Status.parse(self, self._call('GET', 'statuses/show', {'id': id}))
+
+    def statuses_lookup(self, id_: list, **kwargs) -> list:
+        ''' POST statuses/lookup '''
+        payload = self._call('POST', 'statuses/lookup', {'id': ",".join(str(twid) for twid in id_)})
+        return [Status.parse(self, status) for status in payload]
+
+    def user_timeline(self, id=None, user_id=None, count: int = 20, **kwargs) -> list: # pylint: disable=redefined-builtin
+        ''' GET statuses/user_timeline '''
+        payload = self._call('GET', 'statuses/user_timeline', {'id': id, 'user_id': user_id, 'count': count})
+        return [Status.parse(self, status) for status in payload]
+
+    def send_direct_message(self, recipient_id=None, text: str = None, user_id=None, **kwargs) -> DirectMessage:
+        ''' POST direct_messages/new (recipient_id and user_id both name the recipient) '''
+        return DirectMessage.parse(self, self._call('POST', 'direct_messages/new', {
+            'user_id': user_id or recipient_id, 'text': text
+        }))
+
+    def stream(self, listener, count: int = 100, mix: str = DEFAULT_MIX) -> int:
+        ''' Feeds [count] userstream events to listener.on_data; returns how many arrived '''
+        connection = HTTPConnection(self.host, self.port, timeout=30)
+        connection.request('GET', "/1.1/user.json?" + urlencode({'delimited': 'length', 'count': count, 'mix': mix}))
+        reply = connection.getresponse()
+        delivered = 0
+        try:
+            while True:
+                length = reply.readline().strip()
+                if not length:
+                    break
+                listener.on_data(reply.read(int(length)).decode('utf8'))
+                delivered += 1
+        finally:
+            connection.close()
+        return delivered
+
+# Load test
+
+def run(loops=4, tweets=100, events=1000, latency=0.0, jitter=0.0, error_rate=0.0,
+        update_limit=300, stream_rate=0.0, timeout=120.0, seed=0) -> dict:
+    """
+    Runs [loops] online TweetLoops over a [tweets] entry feed each, as fast as they go,
+    while a TweetFeederListener takes [events] userstream events; returns a dict of results.
+    """
+    from tweetfeeder.file_io import Config
+    from tweetfeeder.file_io.models import Feed, Stats
+    from tweetfeeder.flags import BotFunctions
+    from tweetfeeder.streaming import TweetFeederListener
+    from tweetfeeder.tweeting import TweetLoop
+
+    fake = FakeTwitter(
+        latency=latency, jitter=jitter, error_rate=error_rate,
+        rate_limits={'statuses/update': update_limit}, stream_rate=stream_rate, seed=seed
+    ).start()
+    config = Config(BotFunctions.Online, None)
+    config.bot_id, config.master_id = BOT_ID, MASTER_ID
+    config.min_tweet_delay = 0
+    config.retry_base_delay = 1
+    config.retry_max_delay = 4
+    started = perf_counter()
+    try:
+        tweet_loops = [ # Each its own bot, so they may post the same texts
+            TweetLoop(config, Feed(fixtures.feed_file(tweets)), Stats(), None, fake.api_factory(BOT_ID + num))
+            for num in range(loops)
+        ]
+        listener = TweetFeederListener(config, Stats(), lambda text: None, None, fake.api_factory())
+        delivered = fake.client().stream(listener, events)
+        listener.ingest.stop()
+        listener.cancel_checks()
+        while perf_counter() - started < timeout:
+            if not any(loop.is_running() or len(loop.outbox) for loop in tweet_loops):
+                break
+            sleep(0.05)
+        elapsed = perf_counter() - started
+        for loop in tweet_loops:
+            loop.stop()
+        posted = len(fake.posted)
+    finally:
+        fake.stop()
+    return {
+        'loops': loops,
+        'feed_entries': tweets,
+        'elapsed_s': elapsed,
+        'statuses_posted': posted,
+        'statuses_per_sec': posted / elapsed if elapsed else 0.0,
+        'left_in_outboxes': sum(len(loop.outbox) for loop in tweet_loops),
+        'stream_events': delivered,
+        'requests': dict(fake.requests),
+        'injected_errors': dict(fake.errors),
+        'rate_limited': dict(fake.rate_limited)
+    }
+
+def main(argv=None):
+    ''' Command line entry point; serves, or load tests and prints results as JSON. '''
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--serve', type=int, metavar='PORT', help="only serve on this port until interrupted")
+    parser.add_argument('--loops', type=int, default=4, help="TweetLoops posting concurrently")
+    parser.add_argument('--tweets', type=int, default=100, help="feed entries per loop")
+    parser.add_argument('--events', type=int, default=1000, help="userstream events to the listener")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many more seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument('--update-limit', type=int, default=300, help="statuses/update per window (0: unlimited)")
+    parser.add_argument('--stream-rate', type=float, default=0.0, help="events/sec, 0 for unthrottled")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.serve is not None:
+        fake = FakeTwitter(args.serve, args.latency, args.jitter, args.error_rate,
+                           {'statuses/update': args.update_limit}, stream_rate=args.stream_rate, seed=args.seed)
+        print("Serving fake Twitter at " + fake.url, file=sys.stderr)
+        fake.start()
+        try:
+            while True:
+                sleep(3600)
+        except KeyboardInterrupt:
+            fake.stop()
+        return
+    results = run(
+        args.loops, args.tweets, args.events, args.latency, args.jitter, args.error_rate,
+        args.update_limit, args.stream_rate, args.timeout, args.seed
+    )
+    json.dump(results, sys.stdout, indent=4)
+    print()
+
+if __name__ == "__main__":
+    main()
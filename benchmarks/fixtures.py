@@ -0,0 +1,68 @@
+"""
+Deterministic, generated feed and stats files for the benchmarks.
+Files are cached in benchmarks/__fixtures__ and only rebuilt when missing.
+"""
+import random
+from os import path, makedirs
+from tweetfeeder.file_io.utils import FileIO
+
+FIXTURE_DIR = path.join(path.dirname(path.abspath(__file__)), '__fixtures__')
+
+def _fixture_path(name: str) -> str:
+    ''' Returns the cache path for a fixture, creating the cache folder if needed. '''
+    makedirs(FIXTURE_DIR, exist_ok=True)
+    return path.join(FIXTURE_DIR, name)
+
+def title_for(num: int) -> str:
+    ''' Title used for the [num]th feed entry. '''
+    return "TITLE_{:07d}".format(num)
+
+def make_feed(entries: int, chain_every: int = 10, seed: int = 0) -> list:
+    ''' Builds a feed list in the shape of tweet_feed.json. '''
+    rand = random.Random(seed)
+    feed = []
+    for num in range(entries):
+        entry = {
+            'title': title_for(num),
+            'text': "Generated tweet #{} {}".format(num, "x" * rand.randint(10, 120)),
+            'chain': num % chain_every == 0 and num + 1 < entries
+        }
+        if num % 3:
+            entry['rerun'] = bool(num % 2)
+        feed.append(entry)
+    return feed
+
+def make_stats(ids: int, ids_per_title: int = 2, comments_every: int = 50, seed: int = 0) -> dict:
+    ''' Builds a stats dictionary in the shape of tweet_stats.json with [ids] registered Tweet IDs. '''
+    rand = random.Random(seed)
+    stats = {'feed_index': 0, 'times_rerun': 0, 'rerun_index': 0, 'id_to_title': {}, 'tweets': {}}
+    for num in range(ids):
+        title = title_for(num // ids_per_title)
+        stats['id_to_title'][str(900000000000000000 + num)] = title
+        if title not in stats['tweets']:
+            stats['tweets'][title] = {
+                'favorites': rand.randint(0, 50),
+                'retweets': rand.randint(0, 20),
+                'requotes': rand.randint(0, 5),
+                'replies': rand.randint(0, 10),
+                'rt_comments': int(num % comments_every == 0),
+                'recent_rt_comments': (
+                    ["RT comment on {}".format(title)] if num % comments_every == 0 else []
+                )
+            }
+    return stats
+
+def feed_file(entries: int, chain_every: int = 10) -> str:
+    ''' Returns the path of a generated feed file with [entries] tweets (all one chain if chain_every is 1). '''
+    name = "feed_{}.json" if chain_every == 10 else "feed_{}_chain{}.json"
+    filepath = _fixture_path(name.format(entries, chain_every))
+    if not path.exists(filepath):
+        FileIO.save_json_dict(filepath, make_feed(entries, chain_every))
+    return filepath
+
+def stats_file(ids: int) -> str:
+    ''' Returns the path of a generated stats file with [ids] registered Tweet IDs. '''
+    filepath = _fixture_path("stats_{}.json".format(ids))
+    if not path.exists(filepath):
+        FileIO.save_json_dict(filepath, make_stats(ids))
+    return filepath
@@ -0,0 +1,369 @@
+"""
+Times TweetFeeder's feed, stats and scheduling hot paths on generated fixtures
+and writes machine-readable JSON, so runs can be compared across releases.
+python -m benchmarks.hot_paths --output bench.json [--compare previous.json]
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+from datetime import datetime, timedelta
+from os import path, walk
+from tempfile import mkdtemp
+from threading import Event
+from time import perf_counter
+from tweetfeeder import __version__
+from tweetfeeder import bot as bot_module
+from tweetfeeder import tweeting
+from tweetfeeder.file_io import Config
+from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.file_io.snapshots import SnapshotStore
+from tweetfeeder.file_io.utils import FileIO
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.ratelimit import ApiScheduler
+from benchmarks import fixtures
+
+def measure(name: str, func, repeat: int = 5, ops: int = 1, **params) -> dict:
+    """
+    Calls func() [repeat] times and returns its timings.
+    [ops] is the number of operations a single call performs.
+    """
+    times = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        times.append(perf_counter() - started)
+    result = {
+        'name': name,
+        'params': params,
+        'repeat': repeat,
+        'ops': ops,
+        'min_s': min(times),
+        'mean_s': sum(times) / len(times),
+        'max_s': max(times),
+        'ops_per_sec': ops / min(times) if min(times) else 0.0
+    }
+    print("{:<28}{:<32}{:>12.6f}s".format(name, json.dumps(params), result['min_s']), file=sys.stderr)
+    return result
+
+# Feed
+
+def bench_feed(sizes: list) -> list:
+    ''' Feed.get_tweets at random indices and a cold total_tweets. '''
+    results = []
+    for size in sizes:
+        filepath = fixtures.feed_file(size)
+        feed = Feed(filepath)
+        indices = random.Random(size).sample(range(size), 5)
+        results.append(measure(
+            'feed.total_tweets', lambda: Feed(filepath).total_tweets, 3, entries=size
+        ))
+        results.append(measure(
+            'feed.get_tweets', lambda: [feed.get_tweets(idx) for idx in indices],
+            3, len(indices), entries=size
+        ))
+    return results
+
+# Stats
+
+def _loaded_stats(filepath: str, save: bool) -> Stats:
+    ''' Loads a stats fixture, redirecting its saves to a scratch file. '''
+    stats = Stats(filepath, save)
+    assert stats.data
+    stats._filepath = path.join(mkdtemp(), 'tweet_stats.json')
+    return stats
+
+def bench_stats(sizes: list) -> list:
+    ''' Stats load, in-memory mutation, save and find_title_from_id. '''
+    results = []
+    for size in sizes:
+        filepath = fixtures.stats_file(size)
+        results.append(measure('stats.load', lambda: Stats(filepath).data, 3, ids=size))
+
+        stats = _loaded_stats(filepath, False)
+        ids = list(stats.data['id_to_title'])
+        picks = random.Random(size).sample(ids, min(1000, size))
+        results.append(measure(
+            'stats.mutate', lambda: [stats.mod_tweet_stats(twid, 'favorites', 1) for twid in picks],
+            3, len(picks), ids=size
+        ))
+        stats._save = True
+        results.append(measure('stats.save', stats._write_stats_file, 3, ids=size))
+
+        hits = [int(twid) for twid in picks]
+        misses = [twid + 1 for twid in range(len(picks))]
+        results.append(measure(
+            'stats.find_title_from_id',
+            lambda: [stats.find_title_from_id(twid) for twid in hits + misses],
+            5, len(hits) + len(misses), ids=size
+        ))
+    return results
+
+def bench_stats_formats(sizes: list) -> list:
+    ''' Stats save and load in each available FileIO format, with the file size. '''
+    results = []
+    for size in sizes:
+        stats = _loaded_stats(fixtures.stats_file(size), True)
+        for fmt in FileIO.available_formats():
+            stats.file_format = fmt
+            saved = measure('stats.save_format', stats.flush, 3, ids=size, format=fmt)
+            saved['bytes'] = path.getsize(stats.filepath)
+            results.append(saved)
+            results.append(measure('stats.load_format', lambda: Stats(stats.filepath).data, 3, ids=size, format=fmt))
+            print("{:<28}{:<32}{:>12} bytes".format(
+                'stats.size_format', json.dumps({'ids': size, 'format': fmt}), saved['bytes']
+            ), file=sys.stderr)
+    return results
+
+def _disk_usage(directory: str) -> int:
+    ''' Bytes under a directory '''
+    return sum(path.getsize(path.join(root, name)) for root, _, names in walk(directory) for name in names)
+
+def bench_snapshots(sizes: list, changes: int = 10) -> list:
+    ''' save_copy against an incremental Stats.snapshot and a diff, each after a few changes. '''
+    results = []
+    for size in sizes:
+        stats = _loaded_stats(fixtures.stats_file(size), False)
+        titles = random.Random(size).sample(list(stats.data['tweets']), changes)
+        change = lambda: [stats.mod_tweet_stats(title, 'favorites', 1) for title in titles]
+        copies = iter(range(1000))
+        results.append(measure(
+            'stats.save_copy', lambda: (change(), stats.save_copy(str(next(copies)))), 3, ids=size
+        ))
+        stats.snapshots = SnapshotStore(stats.filepath + ".snapshots")
+        stats.snapshot()
+        results.append(measure('stats.snapshot', lambda: (change(), stats.snapshot()), 3, ids=size))
+        results.append(measure('stats.diff_snapshots', lambda: stats.diff_snapshots("-2", "-1"), 3, ids=size))
+        print("{:<28}{:<32}{:>12} bytes per copy, {} bytes for 4 snapshots".format(
+            'stats.snapshot (disk)', json.dumps({'ids': size}),
+            path.getsize(stats.filepath + "-0"), _disk_usage(stats.filepath + ".snapshots")
+        ), file=sys.stderr)
+    return results
+
+# TweetLoop under a virtual clock
+
+class VirtualClock:
+    ''' Stands in for the wall clock and threading.Timer inside the tweeting module. '''
+    def __init__(self):
+        ''' Starts at midnight so tweet times are in the future '''
+        self.now = datetime(2020, 1, 1)
+        self.pending = []
+
+    def install(self):
+        ''' Patches the tweeting module; returns a function that undoes it. '''
+        clock = self
+        class VirtualDatetime(datetime):
+            ''' datetime whose now() reads the virtual clock '''
+            @classmethod
+            def now(cls, tz=None):
+                return cls.combine(clock.now.date(), clock.now.time(), tz)
+
+        class VirtualTimer:
+            ''' threading.Timer lookalike that waits on the virtual clock '''
+            def __init__(self, interval, function, args=None, kwargs=None):
+                self.interval = interval
+                self.function = function
+                self.args = args if args is not None else []
+                self.kwargs = kwargs if kwargs is not None else {}
+                self.finished = Event()
+
+            def start(self):
+                clock.pending.append(self)
+
+            def cancel(self):
+                self.finished.set()
+
+        originals = (tweeting.datetime, tweeting.Timer)
+        tweeting.datetime, tweeting.Timer = VirtualDatetime, VirtualTimer
+        def uninstall():
+            tweeting.datetime, tweeting.Timer = originals
+        return uninstall
+
+    def fire_next(self) -> bool:
+        ''' Advances the clock to the next started timer and runs it. '''
+        while self.pending:
+            timer = self.pending.pop(0)
+            if timer.finished.is_set():
+                continue # Cancelled
+            # Real timers fire a little late; landing exactly on a tweet time would not happen
+            self.now += timedelta(seconds=max(timer.interval, 0) + 0.001)
+            timer.function(*timer.args, **timer.kwargs)
+            timer.finished.set()
+            return True
+        return False
+
+def bench_tweet_loop(sizes: list, cycles: int) -> list:
+    ''' TweetLoop._next / _tweet cycles with no real waiting. '''
+    results = []
+    for size in sizes:
+        config = Config(BotFunctions.Tweet, None)
+        config.tweet_times = Config.parse_tweet_times(["8:00", "20:00"])
+        config.looping_max_times = 1000
+        clock = VirtualClock()
+        uninstall = clock.install()
+        try:
+            # Starts itself, as config.functionality.Tweet is set
+            loop = tweeting.TweetLoop(config, Feed(fixtures.feed_file(size)), Stats())
+            fired = [0]
+            def run_cycles():
+                for _ in range(cycles):
+                    fired[0] += clock.fire_next()
+            results.append(measure('tweet_loop.cycle', run_cycles, 1, cycles, entries=size))
+            loop.stop()
+        finally:
+            uninstall()
+    return results
+
+def bench_rerun_loop(sizes: list, cycles: int, min_score: int = 80) -> list:
+    ''' TweetLoop cycles in rerun mode, where few entries score high enough to rerun. '''
+    results = []
+    for size in sizes:
+        config = Config(BotFunctions.Log, None) # Started below, once in rerun mode
+        config.tweet_times = Config.parse_tweet_times(["8:00", "20:00"])
+        config.looping_max_times = 1000
+        config.looping_min_score = min_score
+        stats = Stats()
+        stats.data.update(Stats.from_json_dict(fixtures.make_stats(size * 2)))
+        stats.data.update(times_rerun=1, rerun_index=size, feed_index=0)
+        clock = VirtualClock()
+        uninstall = clock.install()
+        try:
+            loop = tweeting.TweetLoop(config, Feed(fixtures.feed_file(size)), stats)
+            config.functionality = BotFunctions.Tweet
+            loop.start()
+            def run_cycles():
+                for _ in range(cycles):
+                    clock.fire_next()
+            results.append(measure('tweet_loop.rerun_cycle', run_cycles, 1, cycles, entries=size))
+            loop.stop()
+        finally:
+            uninstall()
+    return results
+
+def bench_chain(lengths: list, stats_size: int) -> list:
+    ''' A whole chain tweeted online to the fake API, saving stats to a scratch file. '''
+    results = []
+    for length in lengths:
+        config = Config(BotFunctions.Online | BotFunctions.SaveStats, None)
+        clock = VirtualClock()
+        uninstall = clock.install()
+        try:
+            stats = _loaded_stats(fixtures.stats_file(stats_size), True)
+            loop = tweeting.TweetLoop(config, Feed(fixtures.feed_file(length, 1)), stats, None, FakeAPI)
+            def run_chain():
+                for _ in range(length):
+                    clock.fire_next()
+            results.append(measure('tweet_loop.chain', run_chain, 1, length, chain=length, ids=stats_size))
+            loop.stop()
+            stats.wait_for_flush()
+        finally:
+            uninstall()
+    return results
+
+# do_sync_stats against a local fake API
+
+class FakeAPI:
+    ''' Answers get_status from memory, like an instant and unlimited Twitter. '''
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        ''' Accepts and ignores tweepy.API arguments '''
+        pass
+
+    def get_status(self, twid):
+        ''' Returns a minimal status object '''
+        FakeAPI.calls += 1
+        status = type('FakeStatus', (), {})()
+        status.id = int(twid)
+        status.favorite_count = int(twid) % 50
+        status.retweet_count = int(twid) % 20
+        return status
+
+    def update_status(self, text, in_reply_to_status_id=None):
+        ''' Returns a status with a fresh ID '''
+        FakeAPI.calls += 1
+        status = type('FakeStatus', (), {})()
+        status.id = 800000000000000000 + FakeAPI.calls
+        return status
+
+def bench_sync_stats(sizes: list, save: bool) -> list:
+    ''' MasterCommand.do_sync_stats over every registered ID. '''
+    results = []
+    for size in sizes:
+        stats = _loaded_stats(fixtures.stats_file(size), save)
+        fake_bot = type('FakeBot', (), {})()
+        fake_bot.config = Config(BotFunctions.SaveStats, None)
+        fake_bot.stats = stats
+        fake_bot._api_factory = FakeAPI
+        fake_bot.api_scheduler = ApiScheduler() # FakeAPI reports no rate limits: every call runs inline
+        command = bot_module.TweetFeederBot.MasterCommand(fake_bot)
+        results.append(measure(
+            'bot.do_sync_stats', lambda: command.do_sync_stats(""), 1, size, ids=size, save=save
+        ))
+    return results
+
+# Running and comparing
+
+def compare(results: list, previous: dict):
+    ''' Prints the min time ratio against a previous run's results. '''
+    old = {(r['name'], json.dumps(r['params'], sort_keys=True)): r for r in previous['results']}
+    for result in results:
+        key = (result['name'], json.dumps(result['params'], sort_keys=True))
+        if key in old and old[key]['min_s']:
+            print("{:<28}{:<32}{:>8.2f}x".format(
+                result['name'], key[1], result['min_s'] / old[key]['min_s']
+            ), file=sys.stderr)
+
+def run(feed_sizes, stats_sizes, loop_sizes, cycles, sync_sizes, chain_lengths) -> dict:
+    ''' Runs every benchmark and returns the JSON-ready report. '''
+    results = []
+    results += bench_feed(feed_sizes)
+    results += bench_stats(stats_sizes)
+    results += bench_snapshots(stats_sizes)
+    results += bench_stats_formats(stats_sizes)
+    results += bench_tweet_loop(loop_sizes, cycles)
+    results += bench_rerun_loop(loop_sizes, cycles)
+    results += bench_chain(chain_lengths, stats_sizes[0])
+    results += bench_sync_stats(sync_sizes, False)
+    results += bench_sync_stats(sync_sizes[:1], True)
+    return {
+        'meta': {
+            'tweetfeeder': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'started': datetime.now().isoformat()
+        },
+        'results': results
+    }
+
+def _sizes(text: str) -> list:
+    ''' Parses a comma separated list of sizes '''
+    return [int(size) for size in text.split(',') if size]
+
+def main(argv=None):
+    ''' Command line entry point '''
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--feed-sizes', type=_sizes, default=[1000, 100000, 1000000])
+    parser.add_argument('--stats-sizes', type=_sizes, default=[1000, 100000])
+    parser.add_argument('--loop-sizes', type=_sizes, default=[1000, 100000])
+    parser.add_argument('--cycles', type=int, default=100, help="TweetLoop timers fired per size")
+    parser.add_argument('--sync-sizes', type=_sizes, default=[1000, 10000])
+    parser.add_argument('--chain-lengths', type=_sizes, default=[10, 100], help="chained tweets posted online")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    parser.add_argument('--compare', help="previous JSON output to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args.feed_sizes, args.stats_sizes, args.loop_sizes, args.cycles, args.sync_sizes, args.chain_lengths)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as outfile:
+            json.dump(report, outfile, indent=4)
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+    if args.compare:
+        with open(args.compare, encoding='utf8') as infile:
+            compare(report['results'], json.load(infile))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Replays synthesized userstream traffic through TweetFeederListener.on_data
+and reports throughput, on_data and handler latency, stats writes and memory growth.
+With ingest workers, on_data only parses, filters and queues each event;
+the handler's latency is timed on whichever thread runs it.
+python -m benchmarks.stream_replay --events 20000 --mix favorite=4,retweet=1,reply=2,dm=1
+"""
+import argparse
+import copy
+import json
+import random
+import sys
+import tracemalloc
+from os import path
+from tempfile import mkdtemp
+from time import perf_counter, sleep
+from tweetfeeder.file_io import Config
+from tweetfeeder.file_io.models import Stats
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.streaming import TweetFeederListener
+
+CASSETTES = path.join(path.dirname(path.dirname(path.abspath(__file__))), 'tests', 'cassettes')
+BOT_ID = 862201622939578368     # Bot account in the stream cassettes
+MASTER_ID = 202527649           # Master account in the stream cassettes
+DEFAULT_MIX = "favorite=4,unfavorite=1,quote=1,retweet=1,reply=2,dm=1,follow=1,mention=2,timeline=4"
+
+TEMPLATES = {
+    'favorite': 'stream_favorited.json',
+    'unfavorite': 'stream_unfavorited.json',
+    'quote': 'stream_quoteretweeted.json',
+    'retweet': 'stream_retweeted.json',
+    'reply': 'stream_get_reply.json',
+    'dm': 'stream_get_master_dm.json',
+    'follow': 'stream_followed.json',
+    'mention': 'stream_mentioned.json',
+    'timeline': 'stream_timeline_status.json'
+}
+
+class PayloadFactory:
+    ''' Synthesizes raw stream data from the cassettes, varying the IDs involved. '''
+    def __init__(self, registered_ids, seed=0):
+        ''' Load every template once '''
+        self.templates = {}
+        for kind, filename in TEMPLATES.items():
+            with open(path.join(CASSETTES, filename), encoding='utf8') as cassette:
+                self.templates[kind] = json.load(cassette)
+        self.registered_ids = registered_ids
+        self.random = random.Random(seed)
+        self.next_id = 10**18
+
+    def make(self, kind: str) -> str:
+        ''' Returns a raw JSON string for an event of the given kind. '''
+        data = copy.deepcopy(self.templates[kind])
+        self.next_id += 1
+        target = self.random.choice(self.registered_ids)
+        if 'target_object' in data:
+            data['target_object']['id'] = target
+        elif 'retweeted_status' in data:
+            data['retweeted_status']['id'] = target
+            data['id'] = self.next_id
+        elif kind == 'reply':
+            data['in_reply_to_status_id'] = target
+            data['id'] = self.next_id
+        elif kind == 'dm':
+            data['direct_message']['id'] = self.next_id
+        elif 'id' in data:
+            data['id'] = self.next_id
+        return json.dumps(data)
+
+def parse_mix(text: str) -> list:
+    ''' Turns "favorite=4,dm=1" into a weighted list of event kinds. '''
+    mix = []
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in TEMPLATES:
+            raise ValueError("Unknown event kind: " + kind)
+        mix.extend([kind.strip()] * int(weight or 1))
+    return mix
+
+def percentile(sorted_values: list, pct: float) -> float:
+    ''' Nearest-rank percentile of an already sorted list. '''
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def run(events=10000, rate=0.0, mix=DEFAULT_MIX, tweets=100, workers=0, save=True, seed=0):
+    """
+    Pushes [events] synthesized payloads through on_data at [rate] events/sec
+    (0 for as fast as possible) and returns a dict of results.
+    """
+    config = Config(BotFunctions.Listen | BotFunctions.SaveStats, None)
+    config.bot_id = BOT_ID
+    config.master_id = MASTER_ID
+    config.ingest_workers = workers
+    stats = Stats(path.join(mkdtemp(), 'tweet_stats.json'), save)
+    registered = [1000 + num for num in range(tweets)]
+    for twid in registered:
+        stats.register_tweet(twid, "BENCH_{}".format(twid))
+
+    writes = [0]
+    write_stats_file = stats._write_stats_file
+    def counting_write():
+        ''' Counts stats writes that reach the disk '''
+        if stats._save:
+            writes[0] += 1
+        write_stats_file()
+    stats._write_stats_file = counting_write
+    writes[0] = 0
+
+    commands = [0]
+    def count_command(text):
+        ''' Stands in for MasterCommand.onecmd '''
+        commands[0] += 1
+    listener = TweetFeederListener(config, stats, count_command)
+    handler_times = []
+    handle = listener.ingest.handler
+    def timed_handle(item):
+        ''' Times the handler on the thread that runs it (a worker, or on_data's with none) '''
+        before = perf_counter()
+        handle(item)
+        handler_times.append(perf_counter() - before) # list.append is atomic
+    listener.ingest.handler = timed_handle
+
+    factory = PayloadFactory(registered, seed)
+    kinds = parse_mix(mix)
+    payloads = [factory.make(factory.random.choice(kinds)) for _ in range(events)]
+
+    tracemalloc.start()
+    mem_start = tracemalloc.get_traced_memory()[0]
+    latencies = []
+    started = perf_counter()
+    for num, raw_data in enumerate(payloads):
+        if rate:
+            delay = started + num / rate - perf_counter()
+            if delay > 0:
+                sleep(delay)
+        before = perf_counter()
+        listener.on_data(raw_data)
+        latencies.append(perf_counter() - before)
+        if num % 1000 == 999:
+            listener.cancel_checks() # Don't let pending RT comment checks pile up threads
+    listener.ingest.stop()
+    elapsed = perf_counter() - started
+    mem_end, mem_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    listener.cancel_checks()
+
+    latencies.sort()
+    handler_times.sort()
+    return {
+        'events': events,
+        'target_rate': rate,
+        'workers': workers,
+        'elapsed_s': elapsed,
+        'events_per_sec': events / elapsed if elapsed else 0.0,
+        'on_data_p50_us': percentile(latencies, 50) * 1e6, # Enqueue time only, with workers
+        'on_data_p99_us': percentile(latencies, 99) * 1e6,
+        'on_data_max_us': latencies[-1] * 1e6 if latencies else 0.0,
+        'handler_p50_us': percentile(handler_times, 50) * 1e6,
+        'handler_p99_us': percentile(handler_times, 99) * 1e6,
+        'handler_max_us': handler_times[-1] * 1e6 if handler_times else 0.0,
+        'stats_writes': writes[0],
+        'commands': commands[0],
+        'memory_growth_bytes': mem_end - mem_start,
+        'memory_peak_bytes': mem_peak - mem_start,
+        'ingest': listener.ingest.metrics()
+    }
+
+def main(argv=None):
+    ''' Command line entry point; prints results as JSON. '''
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--rate', type=float, default=0.0, help="events/sec, 0 for unthrottled")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="weighted kinds, e.g. favorite=4,dm=1")
+    parser.add_argument('--tweets', type=int, default=100, help="registered tweets in Stats")
+    parser.add_argument('--workers', type=int, default=0, help="ingest worker threads")
+    parser.add_argument('--no-save', action='store_true', help="don't write the stats file")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    results = run(
+        args.events, args.rate, args.mix, args.tweets,
+        args.workers, not args.no_save, args.seed
+    )
+    json.dump(results, sys.stdout, indent=4)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Tests the columnar stats analytics behind the report command.
+python -m unittest tests/analytics_check.py
+"""
+import unittest
+from tweetfeeder.analytics import StatsTable, report
+from tweetfeeder.file_io.utils import FileIO
+
+class TFAnalyticsTests(unittest.TestCase):
+    ''' Test aggregates over the registered test stats. '''
+    def setUp(self):
+        ''' Load the registered test stats, one title published twice '''
+        self.stats_data = FileIO.get_json_dict("tests/config/test_stats_with_registered_tweets.json")
+        self.stats_data['id_to_title']['200'] = "CHAIN_1"
+        self.weights = {'favorites': 1, 'requotes': 3}
+
+    def test_aggregates(self):
+        ''' Are totals, top titles, percentiles and reruns computed? '''
+        table = StatsTable(self.stats_data, self.weights)
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.totals()['favorites'], 3)
+        self.assertEqual(table.top(2), [("DO_NOT_TWEET", 4), ("CHAIN_1", 1)])
+        self.assertEqual(table.percentiles((0, 50, 100)), {0: 0, 50: 1, 100: 4})
+        reruns = table.rerun_comparison()
+        self.assertEqual(reruns['rerun'], {'titles': 1, 'mean_score': 1.0})
+        self.assertEqual(reruns['first_run']['titles'], 4)
+
+    def test_report_text(self):
+        ''' Does the report handle empty stats and list the top titles? '''
+        self.assertIn("0 titles", report({'tweets': {}, 'id_to_title': {}}))
+        self.assertIn("DO_NOT_TWEET", report(self.stats_data, 1, self.weights))
@@ -0,0 +1,58 @@
+"""
+Tests the compiled config cache.
+python -m unittest tests/config_check.py
+"""
+import unittest
+from os import path
+from tempfile import mkdtemp
+from unittest import mock
+from tweetfeeder.file_io.config import Config, ConfigParser
+from tweetfeeder.flags import BotFunctions
+
+SETTINGS = """
+[Tweet Settings]
+tweet_times_list = 8:30, 20:00
+min_tweet_delay = 9 seconds
+looping_max_times = 2 times
+"""
+
+class TFConfigCacheTests(unittest.TestCase):
+    ''' Test that unchanged configs are neither parsed nor rewritten again. '''
+    def setUp(self):
+        ''' Write a config that lacks most options to a temporary directory '''
+        self.filepath = path.join(mkdtemp(), "settings.ini")
+        with open(self.filepath, 'w') as outfile:
+            outfile.write(SETTINGS)
+
+    def load(self):
+        ''' Config from the temporary file; returns it and whether its .ini was parsed '''
+        with mock.patch.object(ConfigParser, 'read', autospec=True, side_effect=ConfigParser.read) as read:
+            config = Config(BotFunctions(), None, self.filepath)
+        return config, read.called
+
+    def test_cache_hit(self):
+        ''' Does a second load restore the same values from the cache? '''
+        first, parsed = self.load()
+        self.assertTrue(parsed)
+        self.assertTrue(path.isfile(self.filepath + ".cache.json"))
+        with mock.patch.object(Config, 'verify_paths', return_value=set()) as verify_paths:
+            second, parsed = self.load()
+        self.assertFalse(parsed)
+        self.assertFalse(verify_paths.called, "Paths were verified when the cache was saved")
+        self.assertEqual(second._config_dict, first._config_dict)
+        self.assertEqual((second.min_tweet_delay, second.looping_max_times), (9, 2))
+        self.assertEqual([(t.hour, t.minute) for t in second.tweet_times], [(8, 30), (20, 0)])
+
+    def test_edit_invalidates(self):
+        ''' Is an edited config parsed again, and a complete one left unwritten? '''
+        self.load()
+        with open(self.filepath) as infile:
+            regenerated = infile.read()
+        self.assertIn("[Rerun Scoring]", regenerated)
+        with open(self.filepath, 'w') as outfile:
+            outfile.write(regenerated.replace("9 seconds", "6 seconds"))
+        with mock.patch('tweetfeeder.file_io.config.open', create=True, side_effect=open) as opened:
+            config, parsed = self.load()
+        self.assertTrue(parsed)
+        self.assertEqual(config.min_tweet_delay, 6)
+        self.assertNotIn(mock.call(self.filepath, 'w'), opened.call_args_list)
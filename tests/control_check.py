@@ -97,12 +97,35 @@ class TFControlTests(unittest.TestCase):
         bot.userstream.listener.on_data(json.dumps(json_dict))
         json_dict['direct_message']['text'] = 'functionality add Tweet'
         bot.userstream.listener.on_data(json.dumps(json_dict))
+        bot.command_jobs.join(10) # Commands run on worker threads
         self.assertTrue(bot.tweet_loop.is_running())
         json_dict['direct_message']['text'] = 'functionality remove Tweet'
         bot.tweet_loop.wait_for_tweet(60)
         bot.userstream.listener.on_data(json.dumps(json_dict))
+        bot.command_jobs.join(10)
         self.assertFalse(bot.tweet_loop.is_running())
 
+    def test_diff_refresh(self):
+        """
+        Does changing one function restart only what it affects,
+        keeping in-memory stats and the stream as they were?
+        """
+        bot = TweetFeederBot(BotFunctions(), "tests/config/test_settings.ini")
+        stats = bot.stats
+        stats.data['feed_index'] = 3 # Not saved, so lost by a reload
+        toggled = []
+        bot.toggle_userstream = toggled.append
+        bot.config.functionality = BotFunctions.Log
+        self.assertIs(bot.stats, stats)
+        self.assertEqual(bot.stats.last_feed_index, 3)
+        self.assertEqual(toggled, [])
+        bot.config.functionality = BotFunctions.Log | BotFunctions.Listen
+        self.assertEqual(toggled, [True])
+        self.assertFalse(bot.tweet_loop.is_running())
+        bot.config.functionality = BotFunctions.Listen
+        self.assertEqual(toggled, [True])
+        bot.shutdown()
+
     @unittest.skip("CMD loop not in use at the moment")
     def test_cmd_loop(self):
         """Does a TweetFeederBot behave normally when cmdloop is active?
@@ -0,0 +1,75 @@
+"""
+Tests the fake Twitter API used for offline load tests.
+python -m unittest tests/fake_twitter_check.py
+"""
+import unittest
+from tweepy.error import TweepError, RateLimitError
+from tweetfeeder.file_io import Config
+from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.tweeting import TweetLoop
+from benchmarks.fake_twitter import FakeTwitter
+
+class RecordingListener:
+    ''' Keeps the raw data a stream delivers '''
+    def __init__(self):
+        self.data = []
+
+    def on_data(self, raw_data):
+        self.data.append(raw_data)
+
+class TFFakeTwitterTests(unittest.TestCase):
+    ''' Test the fake API's endpoints, injected errors and rate limits. '''
+    def setUp(self):
+        ''' A fake Twitter allowing three status updates per window '''
+        self.fake = FakeTwitter(rate_limits={'statuses/update': 3}).start()
+        self.api = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_endpoints(self):
+        ''' Can statuses be posted, replied to, shown, looked up and found in timelines? '''
+        first = self.api.update_status("First")
+        reply = self.api.update_status("Second", in_reply_to_status_id=first.id)
+        self.assertEqual(reply.in_reply_to_status_id, first.id)
+        self.assertEqual(self.api.get_status(first.id).text, "First")
+        self.assertEqual([s.id for s in self.api.statuses_lookup([reply.id, 1, first.id])], [reply.id, first.id])
+        self.assertEqual([s.text for s in self.api.user_timeline()], ["Second", "First"])
+        timeline = self.api.user_timeline(id=12345)
+        self.assertEqual(timeline[1].retweeted_status.id, reply.id)
+        self.api.send_direct_message(user_id=202527649, text="Alert")
+        self.assertEqual(self.fake.direct_messages[0]['text'], "Alert")
+        listener = RecordingListener()
+        self.assertEqual(self.api.stream(listener, 5), 5)
+        self.assertEqual(len(listener.data), 5)
+
+    def test_errors_and_limits(self):
+        ''' Are injected errors, duplicates and used up rate limits raised like tweepy raises them? '''
+        self.fake.fail_next()
+        with self.assertRaises(TweepError) as caught:
+            self.api.update_status("Once")
+        self.assertEqual(caught.exception.api_code, 130)
+        self.api.update_status("Once")
+        with self.assertRaises(TweepError) as caught:
+            self.api.update_status("Once")
+        self.assertEqual(caught.exception.api_code, 187)
+        self.assertEqual(self.api.last_response.headers['x-rate-limit-remaining'], "0")
+        with self.assertRaises(RateLimitError) as caught:
+            self.api.update_status("Twice")
+        self.assertEqual(caught.exception.response.status_code, 429)
+        self.fake.client(1).update_status("Twice") # Other users have their own limits
+
+    def test_tweet_loop(self):
+        ''' Does an online TweetLoop post a chain as replies through the fake API? '''
+        config = Config(BotFunctions.Online, None)
+        config.min_tweet_delay = 0
+        stats = Stats()
+        stats.last_feed_index = 1 # Start of the chain
+        loop = TweetLoop(config, Feed("tests/config/test_feed_multiple.json"), stats, None, self.fake.api_factory())
+        loop.wait_for_tweet(10, last_timer=True)
+        loop.stop()
+        chain = [self.fake.statuses[twid] for twid in self.fake.posted]
+        self.assertEqual([s['text'] for s in chain], ["Start of chain", "Middle of chain", "End of chain"])
+        self.assertEqual(chain[2]['in_reply_to_status_id'], chain[1]['id'])
+        self.assertTrue(stats.get_tweet_stats("CHAIN_3"))
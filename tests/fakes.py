@@ -0,0 +1,74 @@
+"""
+Test doubles shared by the checks that drive timers and the Twitter API by hand.
+"""
+from threading import Event
+from time import time
+from tweepy.error import TweepError
+
+class FakeTimer:
+    ''' threading.Timer lookalike that is never started for real, and only fires when told to '''
+    def __init__(self, interval, function, args=None, kwargs=None):
+        self.interval = interval
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.finished = Event()
+
+    def start(self):
+        pass
+
+    def cancel(self):
+        self.finished.set()
+
+    def fire(self):
+        ''' Runs the timer's function as if its interval had passed '''
+        self.finished.set()
+        self.function(*self.args, **self.kwargs)
+
+class FakeStatus:
+    ''' The part of a tweepy Status that callers read '''
+    def __init__(self, status_id):
+        self.id = status_id
+
+class FakeResponse:
+    ''' Just the headers of a requests.Response '''
+    def __init__(self, headers):
+        self.headers = headers
+
+class FakeApi:
+    """
+    tweepy.API lookalike counting down one rate limit window shared by every method.
+    Fails the first [failures] posts with a TweepError, then accepts the rest.
+    Status IDs start at 101.
+    """
+    def __init__(self, failures=0, api_code=None, limit=10, remaining=10):
+        self.failures = failures
+        self.api_code = api_code
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = time() + 900
+        self.calls = []
+        self.posted = []
+        self.last_response = None
+
+    def _respond(self, name):
+        self.calls.append(name)
+        self.remaining -= 1
+        self.last_response = FakeResponse({
+            'x-rate-limit-limit': str(self.limit),
+            'x-rate-limit-remaining': str(self.remaining),
+            'x-rate-limit-reset': str(int(self.reset))
+        })
+        return FakeStatus(len(self.calls) + 100)
+
+    def get_status(self, name):
+        if name == 'broken':
+            raise ValueError("Not a TweepError")
+        return self._respond(name)
+
+    def update_status(self, status, in_reply_to_status_id=None):
+        if self.failures:
+            self.failures -= 1
+            raise TweepError("Over capacity", api_code=self.api_code)
+        self.posted.append((status, in_reply_to_status_id))
+        return self._respond(status)
@@ -0,0 +1,61 @@
+"""
+Tests the file formats FileIO can save and detect.
+python -m unittest tests/file_formats_check.py
+"""
+import unittest
+from os import path
+from tempfile import mkdtemp
+from tweetfeeder.file_io.models import Stats
+from tweetfeeder.file_io.records import TweetStats, TitleTable
+from tweetfeeder.file_io.utils import FileIO
+
+class TFFileFormatTests(unittest.TestCase):
+    ''' Test saving and reading stats-shaped dicts in every available format. '''
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.stats_dict = {
+            'feed_index': 3, 'times_rerun': 0, 'rerun_index': 0,
+            'id_to_title': TitleTable({"1001": "TÏTLE"}),
+            'tweets': {"TÏTLE": TweetStats(favorites=2, rt_comments=["RT one", "RT two"])}
+        }
+        self.expected = {
+            'feed_index': 3, 'times_rerun': 0, 'rerun_index': 0,
+            'id_to_title': {"1001": "TÏTLE"},
+            'tweets': {"TÏTLE": TweetStats(favorites=2, rt_comments=["RT one", "RT two"]).to_dict()}
+        }
+
+    def test_round_trip(self):
+        ''' Is each format detected on read and read back as it was saved? '''
+        for fmt in FileIO.available_formats():
+            with self.subTest(format=fmt):
+                filepath = path.join(self.directory, fmt + ".json")
+                FileIO.save_json_dict(filepath, self.stats_dict, fmt)
+                loaded = Stats.from_json_dict(FileIO.get_json_dict(filepath))
+                self.assertEqual(loaded['tweets']["TÏTLE"], self.expected['tweets']["TÏTLE"])
+                self.assertEqual(loaded['id_to_title'].to_dict(), self.expected['id_to_title'])
+                self.assertEqual(loaded['feed_index'], 3)
+                with open(filepath, 'rb') as infile:
+                    detected = FileIO.detect_format(infile.read())
+                self.assertEqual(detected, 'compact' if fmt == 'pretty' else fmt)
+
+    def test_smaller(self):
+        ''' Are compact and compressed files smaller than pretty ones? '''
+        sizes = {}
+        for fmt in ('pretty', 'compact', 'gzip'):
+            filepath = path.join(self.directory, fmt + ".json")
+            FileIO.save_json_dict(filepath, self.stats_dict, fmt)
+            sizes[fmt] = path.getsize(filepath)
+        self.assertLess(sizes['compact'], sizes['pretty'])
+        self.assertLess(sizes['gzip'], sizes['pretty'])
+        with self.assertRaises(ValueError):
+            FileIO.save_json_dict(path.join(self.directory, "bad.json"), self.stats_dict, 'yaml')
+
+    def test_stats_format(self):
+        ''' Does a Stats object write its file_format, and read any other? '''
+        filepath = path.join(self.directory, "stats.json")
+        FileIO.save_json_dict(filepath, self.stats_dict)
+        stats = Stats(filepath, True, file_format='gzip')
+        stats.mod_tweet_stats(1001, 'favorites', 1)
+        with open(filepath, 'rb') as infile:
+            self.assertTrue(infile.read().startswith(FileIO.GZIP_MAGIC))
+        self.assertEqual(Stats(filepath).get_tweet_stats(1001)['favorites'], 3)
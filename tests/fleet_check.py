@@ -0,0 +1,27 @@
+"""
+Tests how a fleet spreads configs over worker processes.
+python -m unittest tests/fleet_check.py
+"""
+import unittest
+from tweetfeeder.fleet import assign, shard_for
+
+class TFFleetTests(unittest.TestCase):
+    ''' Test consistent assignment of configs to shards. '''
+    CONFIGS = ["configs/bot{}.ini".format(i) for i in range(200)]
+
+    def test_assignment_spread(self):
+        ''' Is every config assigned once, with no shard left idle? '''
+        assignments = assign(self.CONFIGS, 4)
+        self.assertEqual(sorted(sum(assignments.values(), [])), sorted(self.CONFIGS))
+        self.assertEqual(len(assignments), 4)
+        for files in assignments.values():
+            self.assertGreater(len(files), 20)
+        self.assertEqual(shard_for("bot7", 4), shard_for("bot7", 4))
+
+    def test_assignment_consistency(self):
+        ''' Does adding a shard only move configs onto the new shard? '''
+        before = assign(self.CONFIGS, 4)
+        after = assign(self.CONFIGS, 5)
+        for shard, files in before.items():
+            self.assertTrue(set(after[shard]) <= set(files))
+        self.assertLess(len(after[4]), len(self.CONFIGS) / 3)
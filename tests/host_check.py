@@ -0,0 +1,72 @@
+"""
+Tests the pieces that let many bots share one process.
+python -m unittest tests/host_check.py
+"""
+import logging
+import unittest
+from threading import Event
+from tweetfeeder.host import BotHost, Scheduler, StatsFlusher
+from tweetfeeder.logs import DripFilter, Log
+
+class TFHostTests(unittest.TestCase):
+    ''' Test the shared scheduler, stats flusher and log namespaces. '''
+    def test_scheduled_timers(self):
+        ''' Do scheduled timers fire in order, skipping cancelled ones? '''
+        scheduler = Scheduler(2)
+        fired = []
+        done = Event()
+        late = scheduler.timer(0.2, lambda: (fired.append('late'), done.set()))
+        early = scheduler.timer(0.05, fired.append, ['early'])
+        cancelled = scheduler.timer(0.1, fired.append, ['cancelled'])
+        for timer in (late, early, cancelled):
+            timer.start()
+        cancelled.cancel()
+        self.assertTrue(done.wait(2))
+        self.assertEqual(fired, ['early', 'late'])
+        self.assertTrue(late.finished.wait(1))
+        scheduler.stop()
+
+    def test_flusher_batches(self):
+        ''' Does the flusher write each dirty stats object once? '''
+        class FakeStats:
+            ''' Counts flushes '''
+            flushes = 0
+            def flush(self):
+                FakeStats.flushes += 1
+        flusher = StatsFlusher(60)
+        stats = FakeStats()
+        for _ in range(10):
+            flusher.mark_dirty(stats)
+        flusher.stop()
+        self.assertEqual(FakeStats.flushes, 1)
+
+    def test_log_scope(self):
+        ''' Does a log scope route records to the namespace's logger? '''
+        Log.setup("TFHostTests")
+        main_buffer, bot_buffer = Log.DebugStream(), Log.DebugStream()
+        Log.enable_debug_output(True, main_buffer)
+        namespace = Log.namespace("alpha")
+        with Log.scope(namespace):
+            self.assertEqual(Log.current_namespace(), namespace)
+            Log.enable_debug_output(True, bot_buffer)
+            Log.info("host_check", "from alpha")
+        Log.info("host_check", "from main")
+        self.assertIsNone(Log.current_namespace())
+        self.assertTrue(bot_buffer.has_text("from alpha"))
+        self.assertFalse(bot_buffer.has_text("from main"))
+        self.assertTrue(main_buffer.has_all_text(["from alpha", "from main"]))
+
+    def test_alert_limits(self):
+        ''' Does each bot's DM alert filter keep its own speed limit? '''
+        record = lambda: logging.LogRecord("host_check", logging.INFO, __file__, 0, "alert", None, None)
+        alpha, beta = DripFilter(), DripFilter()
+        self.assertTrue(alpha.filter(record()))
+        self.assertFalse(alpha.filter(record()))
+        self.assertTrue(beta.filter(record()))
+
+    def test_host_wait(self):
+        ''' Does wait() block until the host is shut down? '''
+        host = BotHost([])
+        self.assertFalse(host.wait(0.05))
+        host.shutdown()
+        self.assertTrue(host.wait(0))
@@ -0,0 +1,45 @@
+"""
+Import checks: short-lived commands shouldn't pay for the bot.
+python -m unittest tests/imports_check.py
+"""
+import json
+import subprocess
+import sys
+import unittest
+
+HEAVY_MODULES = ('tweepy', 'requests', 'tweetfeeder.bot', 'tweetfeeder.streaming', 'tweetfeeder.tweeting', 'cmd')
+
+def cold_import(statement: str) -> dict:
+    ''' Runs an import in a fresh interpreter; returns its time and the heavy modules it loaded '''
+    code = (
+        "import sys, time, json; start = time.perf_counter(); {}; "
+        "print(json.dumps({{'seconds': time.perf_counter() - start, "
+        "'heavy': [name for name in {!r} if name in sys.modules]}}))"
+    ).format(statement, HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", code], universal_newlines=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+class TFImportTests(unittest.TestCase):
+    ''' Test that the package and its short-lived commands import only what they need. '''
+    def assert_light(self, statement: str):
+        ''' Imports in a fresh interpreter, failing if anything heavy came along '''
+        result = cold_import(statement)
+        self.assertEqual(result['heavy'], [], "{} ({:.1f} ms)".format(statement, result['seconds'] * 1000))
+
+    def test_package(self):
+        ''' Does importing the package leave the bot unloaded? '''
+        self.assert_light("import tweetfeeder")
+        self.assert_light("from tweetfeeder.file_io import models")
+
+    def test_commands(self):
+        ''' Do the report, validate and simulate commands avoid the bot and tweepy? '''
+        self.assert_light("import tweetfeeder.analytics")
+        self.assert_light("import tweetfeeder.simulation")
+        self.assert_light("import runpy; runpy.run_path('__main__.py', run_name='tweetfeeder_cli')")
+
+    def test_lazy_attributes(self):
+        ''' Are lazy attributes listed, and unknown ones still errors? '''
+        import tweetfeeder
+        self.assertIn('TweetFeederBot', dir(tweetfeeder))
+        with self.assertRaises(AttributeError):
+            tweetfeeder.NotAnAttribute
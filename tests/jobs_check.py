@@ -0,0 +1,77 @@
+"""
+Tests running master commands as jobs.
+python -m unittest tests/jobs_check.py
+"""
+import unittest
+from concurrent.futures import Future
+from threading import Event
+from tweetfeeder.exceptions import InvalidCommand
+from tweetfeeder.jobs import Job, JobTable
+
+class FakeCommands:
+    ''' Stands in for MasterCommand.onecmd '''
+    def __init__(self):
+        self.ran = []
+        self.release = Event()
+        self.fetching = Event()
+        self.futures = [Future() for _ in range(3)]
+
+    def onecmd(self, text):
+        self.ran.append(text)
+        if text == 'slow':
+            self.release.wait(5)
+        elif text == 'bad':
+            raise InvalidCommand("Bad command")
+        elif text == 'fetch':
+            job = Job.current()
+            job.set_total(len(self.futures))
+            self.futures[0].set_result(None)
+            job.advance()
+            self.fetching.set()
+            job.wait_for(self.futures)
+
+class TFJobTests(unittest.TestCase):
+    ''' Test the job table that runs master commands off the stream thread. '''
+    def setUp(self):
+        self.commands = FakeCommands()
+        self.table = JobTable(self.commands.onecmd, 1, ['jobs'])
+
+    def tearDown(self):
+        self.commands.release.set()
+        self.table.stop(5)
+
+    def test_not_blocking(self):
+        ''' Does a slow command leave the submitting thread free, and the next command queued? '''
+        slow = self.table.submit('slow')
+        status = self.table.submit('status')
+        self.assertIsNone(self.table.submit('jobs'))
+        self.assertEqual(self.commands.ran[-1], 'jobs') # Inline, ahead of the queue
+        self.assertEqual(status.status, Job.QUEUED)
+        self.commands.release.set()
+        self.assertTrue(self.table.join(5))
+        self.assertEqual([slow.status, status.status], [Job.DONE, Job.DONE])
+        self.assertEqual([job.id for job in self.table.jobs()], [1, 2])
+
+    def test_failure(self):
+        ''' Is a failing command recorded, without stopping the worker? '''
+        bad = self.table.submit('bad')
+        good = self.table.submit('good')
+        self.assertTrue(self.table.join(5))
+        self.assertEqual((bad.status, bad.error), (Job.FAILED, "Bad command"))
+        self.assertEqual(good.status, Job.DONE)
+
+    def test_cancel(self):
+        ''' Can queued and running jobs be cancelled, with their progress kept? '''
+        fetch = self.table.submit('fetch')
+        queued = self.table.submit('queued')
+        self.assertIs(self.table.cancel(queued.id), queued)
+        self.assertEqual(queued.status, Job.CANCELLED)
+        self.assertTrue(self.commands.fetching.wait(5))
+        self.table.cancel(fetch.id)
+        self.assertTrue(fetch.wait(5))
+        self.assertEqual(fetch.status, Job.CANCELLED)
+        self.assertEqual((fetch.done, fetch.total), (1, 3))
+        self.assertTrue(self.commands.futures[2].cancelled())
+        self.assertNotIn('queued', self.commands.ran)
+        self.assertIsNone(self.table.cancel(99))
+        self.assertIn("1/3", fetch.describe())
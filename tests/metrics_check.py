@@ -0,0 +1,60 @@
+"""
+Tests the metrics registry and its text export.
+python -m unittest tests/metrics_check.py
+"""
+import unittest
+from urllib.request import urlopen
+from tweetfeeder.metrics import Metrics
+
+class TFMetricsTests(unittest.TestCase):
+    ''' Test counters, gauges, histograms and their exporters. '''
+    def tearDown(self):
+        ''' Zero everything between tests '''
+        Metrics.reset()
+        Metrics.stop_serving()
+
+    def test_counter_labels(self):
+        ''' Are counters tracked separately by label and exported? '''
+        counter = Metrics.counter("test_events_total", "Test events")
+        counter.inc(type='favorite')
+        counter.inc(2, type='favorite')
+        counter.inc(type='retweet')
+        self.assertIs(counter, Metrics.counter("test_events_total"))
+        self.assertEqual(counter.value(type='favorite'), 3)
+        text = Metrics.export_text()
+        self.assertIn("# TYPE test_events_total counter", text)
+        self.assertIn('test_events_total{type="favorite"} 3', text)
+        self.assertIn('test_events_total{type="retweet"} 1', text)
+
+    def test_histogram_buckets(self):
+        ''' Are histogram buckets cumulative, with a sum and count? '''
+        histogram = Metrics.histogram("test_seconds", "Test latency", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        text = Metrics.export_text()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count 3', text)
+        total, count = histogram.value()
+        self.assertAlmostEqual(total, 5.55)
+        self.assertEqual(count, 3)
+
+    def test_http_endpoint(self):
+        ''' Does the loopback endpoint serve the text export? '''
+        Metrics.gauge("test_depth", "Test depth").set(7)
+        server = Metrics.serve(0)
+        body = urlopen("http://127.0.0.1:{}/metrics".format(server.server_address[1])).read()
+        self.assertIn(b"test_depth 7", body)
+
+    def test_snapshot_merge(self):
+        ''' Can another process's snapshot be merged in under an extra label? '''
+        Metrics.counter("test_merged_total", "Test merges").inc(4, type='a')
+        Metrics.histogram("test_merged_seconds", "Test merges", buckets=(1.0,)).observe(0.5)
+        snapshot = Metrics.snapshot()
+        Metrics.reset()
+        Metrics.merge(snapshot, shard=2)
+        text = Metrics.export_text()
+        self.assertIn('test_merged_total{shard="2",type="a"} 4', text)
+        self.assertIn('test_merged_seconds_count{shard="2"} 1', text)
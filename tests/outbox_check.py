@@ -0,0 +1,111 @@
+"""
+Tests the durable outbound tweet queue.
+python -m unittest tests/outbox_check.py
+"""
+import unittest
+from concurrent.futures import Future
+from os import path
+from tempfile import mkdtemp
+from tweetfeeder.file_io.models import Stats
+from tweetfeeder.outbox import Outbox
+from tests.fakes import FakeApi, FakeTimer
+
+class FakeScheduler:
+    ''' ApiScheduler lookalike that defers every call until released '''
+    def __init__(self):
+        self.calls = []
+
+    def wait_time(self, method, priority):
+        return 0.0
+
+    def submit(self, priority, api, method, *args, **kwargs):
+        future = Future()
+        self.calls.append((future, getattr(api, method), args, kwargs))
+        return future
+
+    def release(self):
+        for future, method, args, kwargs in self.calls:
+            future.set_result(method(*args, **kwargs))
+        self.calls = []
+
+class TFOutboxTests(unittest.TestCase):
+    ''' Test that posts are retried in order, threaded, deduplicated and kept on disk. '''
+    def setUp(self):
+        ''' Saved stats in a temporary directory '''
+        directory = mkdtemp()
+        self.stats = Stats(path.join(directory, "stats.json"), True)
+        self.filepath = path.join(directory, "stats.json.outbox.json")
+
+    def outbox(self, api):
+        ''' Outbox for the temporary stats, retrying after 10-20 seconds at first '''
+        return Outbox(api, self.stats, self.filepath, FakeTimer, 20, 60, 3)
+
+    def test_retry_in_order(self):
+        ''' Does a failed post hold back the chain after it, then thread it once sent? '''
+        api = FakeApi(failures=1)
+        outbox = self.outbox(api)
+        outbox.add({'title': "FIRST", 'text': "One"}, 0)
+        outbox.add({'title': "SECOND", 'text': "Two"}, 1, "FIRST")
+        self.assertFalse(outbox.add({'title': "SECOND", 'text': "Two"}, 1, "FIRST"))
+        outbox.flush()
+        self.assertEqual(api.posted, [])
+        self.assertTrue(10 <= outbox._timer.interval <= 20)
+        self.assertEqual(outbox.pending()[0]['attempts'], 1)
+        for post in outbox._pending:
+            post['next_try'] = 0
+        outbox.flush()
+        self.assertEqual(api.posted, [("One", None), ("Two", 101)])
+        self.assertEqual(len(outbox), 0)
+        self.assertTrue(self.stats.get_tweet_stats("SECOND"))
+
+    def test_single_write(self):
+        ''' Does queueing a post and flushing it write the outbox file once? '''
+        outbox = self.outbox(FakeApi(failures=1))
+        saves = []
+        save = outbox._save
+        outbox._save = lambda: (saves.append(len(outbox)), save())
+        outbox.add({'title': "FIRST", 'text': "One"}, 0, save=False)
+        self.assertFalse(path.exists(self.filepath))
+        outbox.flush()
+        self.assertEqual(saves, [1])
+        self.assertEqual(self.outbox(FakeApi()).pending()[0]['title'], "FIRST")
+
+    def test_deferred_post(self):
+        ''' Does a post the scheduler defers leave flush() unblocked, then go out once the call is made? '''
+        api, scheduler = FakeApi(), FakeScheduler()
+        outbox = Outbox(api, self.stats, self.filepath, FakeTimer, 20, 60, 3, scheduler)
+        outbox.add({'title': "FIRST", 'text': "One"}, 0)
+        outbox.flush()
+        outbox.flush()
+        self.assertEqual(len(scheduler.calls), 1, "A deferred post shouldn't be submitted twice")
+        self.assertIsNone(outbox._timer)
+        self.assertEqual(outbox.pending()[0]['attempts'], 0)
+        scheduler.release()
+        self.assertEqual(outbox._timer.interval, 0)
+        outbox._timer.function()
+        self.assertEqual(api.posted, [("One", None)])
+        self.assertEqual(len(outbox), 0)
+        self.assertTrue(self.stats.get_tweet_stats("FIRST"))
+
+    def test_backoff(self):
+        ''' Do retry delays double, with jitter, up to the maximum? '''
+        outbox = self.outbox(FakeApi())
+        for attempts, (low, high) in enumerate([(10, 20), (20, 40), (30, 60), (30, 60)], 1):
+            self.assertTrue(low <= outbox.backoff(attempts) <= high)
+
+    def test_survives_restart(self):
+        ''' Are waiting posts reloaded, and hopeless ones given up on? '''
+        outbox = self.outbox(FakeApi(failures=1))
+        outbox.add({'title': "FIRST", 'text': "One"}, 0)
+        outbox.flush()
+        outbox.stop()
+        api = FakeApi(failures=1, api_code=187)
+        outbox = self.outbox(api)
+        self.assertEqual(outbox.pending()[0]['title'], "FIRST")
+        outbox.resume()
+        self.assertIsNotNone(outbox._timer)
+        outbox._pending[0]['next_try'] = 0
+        outbox.add({'title': "SECOND", 'text': "Two"}, 1)
+        outbox.flush()
+        self.assertEqual(api.posted, [("Two", None)])
+        self.assertEqual(self.outbox(api).pending(), [])
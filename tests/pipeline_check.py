@@ -0,0 +1,61 @@
+"""
+Tests pipelined posting of chain tweets.
+python -m unittest tests/pipeline_check.py
+"""
+import unittest
+from os import path
+from tempfile import mkdtemp
+from tweetfeeder.file_io import Config
+from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.file_io.utils import FileIO
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.tweeting import TweetLoop
+from tests.fakes import FakeTimer
+
+class TFPipelineTests(unittest.TestCase):
+    ''' Test that a chain is recorded in one stats transaction. '''
+    def setUp(self):
+        ''' Offline loop over the multiple tweet feed, saving stats to a temporary file '''
+        self.filepath = path.join(mkdtemp(), "stats.json")
+        self.stats = Stats(self.filepath, True)
+        self.stats.last_feed_index = 1 # Start of the chain
+        self.config = Config(BotFunctions.Tweet, None)
+        self.loop = TweetLoop(self.config, Feed("tests/config/test_feed_multiple.json"), self.stats, FakeTimer)
+
+    def saved_index(self) -> int:
+        ''' Feed index in the stats file, once any background write is done '''
+        self.stats.wait_for_flush()
+        return FileIO.get_json_dict(self.filepath)['feed_index']
+
+    def test_chain_transaction(self):
+        ''' Is the stats file written once, after the chain's last tweet? '''
+        self.assertEqual([timer.args[1] for timer in self.loop.timers], [2, 3])
+        self.loop.current_timer.fire()
+        self.assertEqual(self.stats.last_feed_index, 2)
+        self.assertEqual(self.saved_index(), 1)
+        self.assertLessEqual(self.loop.current_timer.interval, self.config.min_tweet_delay)
+        self.loop.current_timer.fire()
+        self.assertEqual(self.saved_index(), 1)
+        self.loop.current_timer.fire()
+        self.assertEqual(self.saved_index(), 4)
+
+    def test_single_tweet(self):
+        ''' Is a tweet outside any chain saved as it goes, without a background write? '''
+        self.loop.stop()
+        self.stats.last_feed_index = 0
+        loop = TweetLoop(self.config, Feed("tests/config/test_feed_multiple.json"), self.stats, FakeTimer)
+        self.assertEqual(loop.current_timer.args[1], 0)
+        loop.current_timer.fire()
+        self.assertIsNone(self.stats._background_flush)
+        self.assertEqual(FileIO.get_json_dict(self.filepath)['feed_index'], 1)
+        loop.stop()
+
+    def test_stop_commits(self):
+        ''' Does stopping in the middle of a chain still save its progress? '''
+        self.loop.current_timer.fire()
+        self.loop.stop()
+        self.assertEqual(self.saved_index(), 2)
+        with self.stats.transaction():
+            self.stats.last_feed_index = 3
+            self.assertEqual(self.saved_index(), 2)
+        self.assertEqual(self.saved_index(), 3)
@@ -0,0 +1,75 @@
+"""
+Tests on-demand profiling and the "profile" master command.
+python -m unittest tests/profiling_check.py
+"""
+import unittest
+from glob import glob
+from os import mkdir, path, remove
+from tweetfeeder import TweetFeederBot
+from tweetfeeder.exceptions import InvalidCommand
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.profiling import Profiler
+
+def profiled_work(count):
+    ''' Something for cProfile to find in a report '''
+    return sum(range(count))
+
+class TFProfilerTests(unittest.TestCase):
+    ''' Test Profiler.run and the profile command. '''
+    @classmethod
+    def setUpClass(cls):
+        ''' Ensures a place for profile reports to go. '''
+        try:
+            mkdir("tests/__temp_output__")
+        except FileExistsError:
+            pass
+
+    def tearDown(self):
+        ''' Profiler is process-wide '''
+        Profiler.stop()
+        Profiler.mode = None
+
+    def test_run_cprofile(self):
+        ''' Does run() record a targeted function's stats while a cprofile run is on? '''
+        Profiler.start('stream', 'cprofile')
+        self.assertTrue(Profiler.is_running())
+        self.assertEqual(Profiler.run('stream', profiled_work, 10), 45)
+        Profiler.stop()
+        report = Profiler.report()
+        self.assertIn("stopped", report)
+        self.assertIn("profiled_work", report)
+
+    def test_run_disabled(self):
+        ''' Does run() just call the function when nothing profiles it? '''
+        self.assertEqual(Profiler.run('stream', profiled_work, 10), 45)
+        Profiler.start('tweet', 'cprofile')
+        self.assertEqual(Profiler.run('stream', profiled_work, 10), 45)
+        self.assertIn("No profiled calls", Profiler.report())
+        Profiler.start('stream', 'sample')
+        self.assertEqual(Profiler.run('stream', profiled_work, 10), 45)
+        self.assertFalse(Profiler._profiles)
+
+    def test_profile_command(self):
+        ''' Does the profile command start, stop and dump profiles, and reject bad arguments? '''
+        bot = TweetFeederBot(BotFunctions.Log, "tests/config/test_settings.ini")
+        reports = path.join(path.dirname(bot.config.log_filepath), "profile-*.txt")
+        try:
+            command = bot.master_cmd
+            command.do_profile("start stream cprofile")
+            self.assertEqual((Profiler.target, Profiler.mode), ('stream', 'cprofile'))
+            command.do_profile("STOP")
+            self.assertFalse(Profiler.is_running())
+            self.assertTrue(glob(reports), "Stopping should save a report")
+            with self.assertRaises(InvalidCommand):
+                command.do_profile("stop")
+            command.do_profile("start")
+            self.assertEqual((Profiler.target, Profiler.mode), ('all', 'sample'))
+            command.do_profile("dump")
+            self.assertTrue(Profiler.is_running(), "Dumping shouldn't stop the profile")
+            for args in ("start nowhere", "start all fast", "", "restart"):
+                with self.assertRaises(InvalidCommand, msg=args):
+                    command.do_profile(args)
+        finally:
+            bot.shutdown()
+            for report in glob(reports):
+                remove(report)
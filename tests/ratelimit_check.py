@@ -0,0 +1,93 @@
+"""
+Tests the shared API call scheduler.
+python -m unittest tests/ratelimit_check.py
+"""
+import unittest
+from time import time
+from tweetfeeder.file_io.models import Stats
+from tweetfeeder.outbox import Outbox
+from tweetfeeder.ratelimit import ApiScheduler, Priority
+from tests.fakes import FakeApi, FakeTimer
+
+class TFRateLimitTests(unittest.TestCase):
+    ''' Test rate limit budgets and call priorities. '''
+    def setUp(self):
+        self.timers = []
+        self.scheduler = ApiScheduler(self.timer)
+        self.api = FakeApi(limit=10, remaining=4)
+
+    def timer(self, interval, function, args=None, kwargs=None):
+        ''' FakeTimer that the test can fire later '''
+        timer = FakeTimer(interval, function, args, kwargs)
+        self.timers.append(timer)
+        return timer
+
+    def test_budget_from_headers(self):
+        ''' Are the rate limit headers of a response recorded? '''
+        self.scheduler.call(Priority.SYNC, self.api, 'get_status', 'first')
+        budget = self.scheduler.budget('get_status')
+        self.assertEqual((budget.limit, budget.remaining), (10, 3))
+        self.assertAlmostEqual(budget.reset, int(self.api.reset))
+
+    def test_reserve(self):
+        ''' Does low priority work leave the end of a window to scheduled posts? '''
+        self.scheduler.call(Priority.SYNC, self.api, 'get_status', 'first') # 3 left: SYNC keeps 3
+        deferred = self.scheduler.submit(Priority.SYNC, self.api, 'get_status', 'deferred')
+        self.assertFalse(deferred.done())
+        self.assertEqual(self.scheduler.queued(), 1)
+        self.assertGreater(self.timers[-1].interval, 800)
+        self.assertEqual(self.scheduler.call(Priority.POST, self.api, 'get_status', 'post').id, 102)
+
+    def test_drain_by_priority(self):
+        ''' Do queued calls run most important first once the window resets? '''
+        self.scheduler.call(Priority.SYNC, self.api, 'get_status', 'first')
+        sync = self.scheduler.submit(Priority.SYNC, self.api, 'get_status', 'sync')
+        check = self.scheduler.submit(Priority.RT_CHECK, self.api, 'get_status', 'check')
+        self.assertTrue(check.done()) # RT_CHECK only keeps 2
+        later = self.scheduler.submit(Priority.RT_CHECK, self.api, 'get_status', 'later')
+        alert = self.scheduler.submit(Priority.ALERT, self.api, 'get_status', 'alert')
+        self.assertFalse(later.done() or sync.done())
+        self.assertTrue(alert.done())
+        self.api.remaining, self.api.reset = 10, time() + 1800 # New window
+        self.scheduler.budget('get_status').reset = time() - 1
+        self.timers[-1].fire()
+        self.assertEqual(self.api.calls[-2:], ['later', 'sync'])
+        self.assertEqual(self.scheduler.queued(), 0)
+
+    def test_unexpected_error(self):
+        ''' Does an error other than TweepError reach the caller, without ending a drain? '''
+        with self.assertRaises(ValueError):
+            self.scheduler.call(Priority.POST, self.api, 'get_status', 'broken')
+        self.scheduler.call(Priority.SYNC, self.api, 'get_status', 'first') # 3 left: SYNC keeps 3
+        broken = self.scheduler.submit(Priority.SYNC, self.api, 'get_status', 'broken')
+        after = self.scheduler.submit(Priority.SYNC, self.api, 'get_status', 'after')
+        self.assertFalse(broken.done())
+        self.api.remaining, self.api.reset = 10, time() + 1800 # New window
+        self.scheduler.budget('get_status').reset = time() - 1
+        self.timers[-1].fire()
+        self.assertIsInstance(broken.exception(0), ValueError)
+        self.assertEqual(after.result(0).id, 102)
+        self.assertEqual(self.scheduler.queued(), 0)
+
+    def test_stop_cancels(self):
+        ''' Are queued calls cancelled when the scheduler stops? '''
+        self.scheduler.call(Priority.SYNC, self.api, 'get_status', 'first')
+        deferred = self.scheduler.submit(Priority.SYNC, self.api, 'get_status', 'deferred')
+        self.scheduler.stop()
+        self.assertTrue(deferred.cancelled())
+        self.assertTrue(self.timers[-1].finished.is_set())
+        self.assertEqual(self.scheduler.queued(), 0)
+
+    def test_outbox_waits(self):
+        ''' Does the outbox hold posts back for the window, without counting attempts? '''
+        api = FakeApi(limit=10, remaining=1)
+        outbox = Outbox(api, Stats(None, False), timer_factory=self.timer, api_scheduler=self.scheduler)
+        outbox.add({'title': 'one', 'text': 'One'}, 0)
+        outbox.add({'title': 'two', 'text': 'Two'}, 1)
+        outbox.flush()
+        self.assertEqual(api.calls, ['One'])
+        outbox.flush()
+        self.assertEqual(api.calls, ['One'])
+        post = outbox.pending()[0]
+        self.assertEqual((post['title'], post['attempts']), ('two', 0))
+        self.assertGreater(post['next_try'], time() + 800)
@@ -0,0 +1,104 @@
+"""
+Tests the compact feed and stats records against the JSON files.
+python -m unittest tests/records_check.py
+"""
+import unittest
+from os import path
+from tempfile import mkdtemp
+from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.file_io.records import FeedEntry, TweetStats, TitleTable
+from tweetfeeder.file_io.utils import FileIO
+
+class TFRecordsTests(unittest.TestCase):
+    ''' Test dict-style access and JSON round trips of records. '''
+    def test_feed_entries(self):
+        ''' Are feed entries records with traits filled in and unknown keys kept? '''
+        feed = Feed("tests/config/test_feed_multiple.json")
+        entry = feed.get_tweets(2)[0]
+        self.assertIsInstance(entry, FeedEntry)
+        self.assertIs(feed.entry(2), entry)
+        self.assertEqual(entry['title'], "CHAIN_2")
+        self.assertTrue(entry['rerun'])
+        extra = FeedEntry.from_dict({'title': "T", 'text': "X", 'image': "a.png"})
+        self.assertEqual(extra.get('image'), "a.png")
+        self.assertEqual(extra.to_dict(), {'title': "T", 'text': "X", 'chain': False, 'rerun': True, 'image': "a.png"})
+
+    def test_stats_round_trip(self):
+        ''' Do stats records modify like dicts and save as the same JSON? '''
+        original = FileIO.get_json_dict("tests/config/test_stats_with_recent_comments.json")
+        stats = Stats("tests/config/test_stats_with_recent_comments.json")
+        self.assertIsInstance(stats.get_tweet_stats("CHAIN_1"), TweetStats)
+        self.assertEqual(stats.data, original)
+        stats.mod_tweet_stats("CHAIN_1", 'favorites', 2)
+        stats.mod_tweet_stats("CHAIN_1", 'rt_comments', "Nice")
+        self.assertEqual(stats.get_tweet_stats(101)['favorites'], 3)
+        self.assertEqual(stats.get_tweet_stats(101)['rt_comments'], 1)
+        self.assertEqual(stats.get_rt_comments(101), ["Nice"])
+        self.assertEqual(TweetStats().recent_rt_comments, ())
+
+    def test_partial_stats(self):
+        ''' Does a stats file with only the session keys load with no tweets registered? '''
+        stats = Stats("tests/config/skip_first_tweet_stats.json")
+        self.assertEqual(stats.last_feed_index, 1)
+        self.assertEqual(stats.data['tweets'], {})
+        self.assertIsNone(stats.find_title_from_id(101))
+        stats.register_tweet(101, "CHAIN_1")
+        self.assertEqual(stats.find_title_from_id(101), "CHAIN_1")
+        filepath = path.join(mkdtemp(), "stats.json")
+        FileIO.save_json_dict(filepath, FileIO.get_json_dict("tests/config/skip_first_tweet_stats.json"))
+        self.assertEqual(Stats(filepath, True).last_feed_index, 1) # Saved stats move old comments out first
+
+    def test_legacy_stats(self):
+        ''' Do stats files with full rt_comments lists load as counts, and move their lists to the comment log? '''
+        legacy = Stats("tests/config/test_stats_with_registered_tweets.json")
+        self.assertEqual(legacy.data, Stats("tests/config/test_stats_with_recent_comments.json").data)
+        filepath = path.join(mkdtemp(), "stats.json")
+        old_stats = FileIO.get_json_dict("tests/config/test_stats_with_registered_tweets.json")
+        old_stats['tweets']['CHAIN_1']['rt_comments'] = ["First", "Second"]
+        FileIO.save_json_dict(filepath, old_stats)
+        stats = Stats(filepath, True)
+        self.assertEqual(stats.get_tweet_stats("CHAIN_1")['rt_comments'], 2)
+        saved = FileIO.get_json_dict(filepath)['tweets']['CHAIN_1']
+        self.assertEqual(saved['rt_comments'], 2)
+        self.assertEqual(saved['recent_rt_comments'], ["First", "Second"])
+        self.assertEqual(stats.get_rt_comments("CHAIN_1"), ["First", "Second"])
+        self.assertEqual(Stats(filepath, True).get_rt_comments("CHAIN_1"), ["First", "Second"])
+
+    def test_comment_log(self):
+        ''' Are RT comments counted, logged in full and trimmed to the recent few in the stats file? '''
+        filepath = path.join(mkdtemp(), "stats.json")
+        old_stats = FileIO.get_json_dict("tests/config/test_stats_real_excerpt.json")
+        old_stats['tweets']['SINGULARITY']['rt_comments'] = ["Old"]
+        FileIO.save_json_dict(filepath, old_stats)
+        stats = Stats(filepath, True)
+        for num in range(TweetStats.RECENT_COMMENTS + 1):
+            stats.mod_tweet_stats("SINGULARITY", 'rt_comments', "RT {}".format(num))
+        saved = FileIO.get_json_dict(filepath)['tweets']['SINGULARITY']
+        self.assertEqual(saved['rt_comments'], TweetStats.RECENT_COMMENTS + 2)
+        self.assertEqual(len(saved['recent_rt_comments']), TweetStats.RECENT_COMMENTS)
+        self.assertEqual(saved['recent_rt_comments'][-1], "RT {}".format(TweetStats.RECENT_COMMENTS))
+        comments = stats.get_rt_comments("SINGULARITY")
+        self.assertEqual(len(comments), TweetStats.RECENT_COMMENTS + 2)
+        self.assertEqual(comments[0], "Old")
+        stats.set_dirty()
+        self.assertEqual(len(stats.get_rt_comments("SINGULARITY")), TweetStats.RECENT_COMMENTS + 2)
+
+    def test_title_table(self):
+        ''' Does the title table intern titles, key by int and save as the JSON dict? '''
+        stats = Stats("tests/config/test_stats_with_registered_tweets.json")
+        table = stats.data['id_to_title']
+        self.assertEqual(stats.find_title_from_id(101), "CHAIN_1")
+        self.assertEqual(stats.find_title_from_id("101"), "CHAIN_1")
+        self.assertIsNone(stats.find_title_from_id("CHAIN_1"))
+        self.assertIsNone(stats.find_title_from_id(999))
+        stats.register_tweet(200, "CHAIN_1")
+        self.assertIs(table[200], table["101"])
+        self.assertEqual(table.counts()["CHAIN_1"], 2)
+        self.assertEqual(table.to_dict()["200"], "CHAIN_1")
+        self.assertIn("200", list(table))
+        table.add("not-an-id", "CHAIN_2")
+        table.add("\u0661\u0662", "CHAIN_3") # Arabic-Indic digits
+        self.assertEqual(table["not-an-id"], "CHAIN_2")
+        self.assertEqual(table["\u0661\u0662"], "CHAIN_3")
+        self.assertNotIn(12, table)
+        self.assertEqual(TitleTable(table.to_dict()).to_dict(), table.to_dict())
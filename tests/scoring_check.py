@@ -0,0 +1,30 @@
+"""
+Tests the scoring of tweets for reruns.
+python -m unittest tests/scoring_check.py
+"""
+import unittest
+from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.scoring import RerunIndex, score
+
+class TFScoringTests(unittest.TestCase):
+    ''' Test rerun scores and the rerun-eligible index. '''
+    def setUp(self):
+        ''' Load the registered test stats '''
+        self.entries = Feed("tests/config/test_feed_multiple.json").get_entries()
+        self.stats = Stats("tests/config/test_stats_with_registered_tweets.json")
+
+    def test_score_weights(self):
+        ''' Are stats weighted, with rt_comments counted by entry? '''
+        weights = {'favorites': 1, 'requotes': 3, 'rt_comments': 2}
+        self.assertEqual(score(self.stats.get_tweet_stats("DO_NOT_TWEET"), weights), 4)
+        self.assertEqual(score({'favorites': 2, 'rt_comments': ["a", "b"]}, weights), 6)
+        self.assertEqual(score(None, weights), 0)
+
+    def test_rerun_index(self):
+        ''' Does the index skip entries that can't be rerun or scored too low? '''
+        index = RerunIndex(self.entries, self.stats.all_tweet_stats(), min_score=1)
+        self.assertEqual(index.indices, [2])  # CHAIN_2; the rest are unrerunnable or unscored
+        self.assertEqual(index.next_index(0), 2)
+        self.assertEqual(index.next_index(3), len(self.entries))
+        self.assertEqual(index.next_index(3, limit=4), 4)
+        self.assertEqual(RerunIndex(self.entries, {}).indices, [2, 3, 4])
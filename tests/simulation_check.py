@@ -0,0 +1,37 @@
+"""
+Tests the dry run of a bot's tweet schedule.
+python -m unittest tests/simulation_check.py
+"""
+import unittest
+from datetime import datetime
+from tweetfeeder.file_io.config import Config
+from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.simulation import simulate, describe
+
+class TFSimulationTests(unittest.TestCase):
+    ''' Test that simulated schedules follow tweet times, chains and reruns. '''
+    def setUp(self):
+        ''' Two tweet times a day over the multiple tweet feed '''
+        self.config = Config(BotFunctions(), None)
+        self.config.tweet_times = Config.parse_tweet_times(["8:00", "20:00"])
+        self.feed = Feed("tests/config/test_feed_multiple.json")
+        self.stats = Stats("tests/config/test_stats_with_registered_tweets.json")
+        self.start = datetime(2020, 1, 1, 12, 0)
+
+    def test_chains_and_times(self):
+        ''' Are chains tweeted together at the next tweet time? '''
+        schedule = simulate(self.config, self.feed, self.stats, 10, self.start)
+        self.assertEqual([index for _, index, _, _ in schedule], [1, 2, 3, 4])
+        self.assertEqual(schedule[0][0], datetime(2020, 1, 1, 20, 0))
+        self.assertEqual(schedule[1][0], datetime(2020, 1, 1, 20, 0, self.config.min_tweet_delay))
+        self.assertEqual(schedule[3][0], datetime(2020, 1, 2, 8, 0))
+        self.assertIn("BROKEN_CHAIN", describe(schedule))
+
+    def test_reruns(self):
+        ''' Does looping skip entries that can't be rerun? '''
+        self.config.looping_max_times = 1
+        schedule = simulate(self.config, self.feed, self.stats, 10, self.start)
+        reruns = [(index, rerun) for _, index, _, rerun in schedule[4:]]
+        self.assertEqual(reruns, [(2, True), (3, True), (4, True)])
+        self.assertEqual(describe([]), "Nothing left to tweet.")
@@ -0,0 +1,65 @@
+"""
+Tests stats snapshots and diffs.
+python -m unittest tests/snapshots_check.py
+"""
+import unittest
+from os import path, walk
+from tempfile import mkdtemp
+from tweetfeeder.file_io.models import Stats
+
+class TFSnapshotTests(unittest.TestCase):
+    ''' Test snapshot sharing, diffs and pruning. '''
+    def setUp(self):
+        ''' In-memory stats with a hundred registered titles, snapshotting next to a temporary file '''
+        self.stats = Stats(path.join(mkdtemp(), "stats.json"))
+        for num in range(100):
+            self.stats.register_tweet(1000 + num, "TITLE_{}".format(num))
+
+    def objects(self) -> int:
+        ''' Buckets stored so far '''
+        return sum(len(files) for _, _, files in walk(path.join(self.stats.snapshots.directory, 'objects')))
+
+    def test_sharing(self):
+        ''' Does a snapshot only store the buckets that changed since the last one? '''
+        first = self.stats.snapshot("start")
+        stored = self.objects()
+        self.stats.mod_tweet_stats("TITLE_3", 'favorites', 2)
+        second = self.stats.snapshot()
+        self.assertEqual(self.objects(), stored + 1)
+        changed = [i for i, (a, b) in enumerate(zip(first['tweets'], second['tweets'])) if a != b]
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(second['id_to_title'], first['id_to_title'])
+        self.assertNotEqual(first['name'], second['name'])
+        loaded = self.stats.snapshots.load(second['name'])
+        self.assertEqual(loaded['tweets']['TITLE_3']['favorites'], 2)
+        self.assertEqual(loaded['id_to_title']['1003'], "TITLE_3")
+
+    def test_diff(self):
+        ''' Does a diff report engagement gained, new titles, and the period between? '''
+        self.stats.snapshots.take(self.stats.data, "start", now=1000)
+        self.stats.mod_tweet_stats("TITLE_3", 'favorites', 2)
+        self.stats.mod_tweet_stats("TITLE_3", 'rt_comments', "RT nice")
+        self.stats.mod_tweet_stats("TITLE_7", 'retweets', 5)
+        self.stats.mod_tweet_stats("TITLE_9", 'favorites', -1)
+        self.stats.register_tweet(5000, "NEW_TITLE")
+        self.stats.snapshots.take(self.stats.data, "end", now=4600)
+        diff = self.stats.diff_snapshots("start", "end")
+        self.assertEqual(diff.gains, {'TITLE_3': {'favorites': 2, 'rt_comments': 1}, 'TITLE_7': {'retweets': 5}})
+        self.assertEqual(diff.ranked(), ['TITLE_7', 'TITLE_3'])
+        self.assertEqual(diff.new_titles, ['NEW_TITLE'])
+        self.assertEqual(diff.seconds, 3600)
+        self.assertIn("TITLE_7: +5 retweets", diff.report())
+        self.stats.mod_tweet_stats("TITLE_1", 'replies', 1)
+        self.assertEqual(self.stats.diff_snapshots("-1").gains, {'TITLE_1': {'replies': 1}})
+        with self.assertRaises(KeyError):
+            self.stats.diff_snapshots("missing")
+
+    def test_prune(self):
+        ''' Does pruning delete old snapshots and only the buckets nothing else uses? '''
+        self.stats.snapshot()
+        self.stats.mod_tweet_stats("TITLE_3", 'favorites', 2)
+        kept = self.stats.snapshot()
+        self.assertEqual(self.stats.snapshots.prune(1), 1)
+        self.assertEqual(self.stats.snapshots.names(), [kept['name']])
+        self.assertEqual(self.objects(), len(set(kept['tweets'] + kept['id_to_title'])))
+        self.assertEqual(self.stats.snapshots.load(kept['name'])['tweets']['TITLE_3']['favorites'], 2)
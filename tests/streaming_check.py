@@ -5,10 +5,13 @@ As with all tests, use python -m unittest tests
 so that the tweetfeeder module is found.
 """
 import unittest
+import json
 from os import mkdir, remove, path
 from time import time, sleep
+from threading import Event
 from tweetfeeder import TweetFeederBot
 from tweetfeeder.streaming import TweetFeederListener
+from tweetfeeder.ingest import IngestQueue
 from tweetfeeder.flags import BotFunctions
 from tweetfeeder.logs import Log
 from vcr import VCR
@@ -94,6 +97,38 @@ class TFStreamTests(unittest.TestCase):
             self.listener.on_data(cassette.read())
             self.assertFalse(self.log_buffer.has_text(), "Buffer should be empty!")
 
+    def test_unregistered_favorited(self):
+        ''' Does the bot skip events on tweets it has no stats for? '''
+        with open('tests/cassettes/stream_favorited.json', encoding='utf8') as cassette:
+            json_dict = json.loads(cassette.read())
+        json_dict['target_object']['id'] = 101
+        json_dict['source']['id'] = 3 # The master's events are dispatched regardless
+        ccount = self.bot.stats.get_tweet_stats("STREAM_TEST")['favorites']
+        self.listener.on_data(json.dumps(json_dict))
+        self.assertTrue(self.log_buffer.has_text('unregistered'), "Skip not recorded")
+        self.assertFalse(self.log_buffer.has_text('STR.on_event'), "Event should not be dispatched")
+        self.assertEqual(self.bot.stats.get_tweet_stats("STREAM_TEST")['favorites'], ccount)
+
+    def test_master_unregistered(self):
+        ''' Are the master's retweets, replies and favorites dispatched even on unregistered tweets? '''
+        master = {'id': self.bot.config.master_id}
+        for name in ('retweeted', 'get_reply', 'favorited'):
+            with open('tests/cassettes/stream_{}.json'.format(name), encoding='utf8') as cassette:
+                json_dict = json.loads(cassette.read())
+            if 'event' in json_dict:
+                sender = json_dict['source']
+                json_dict['target_object']['id'] = 101
+            else:
+                sender = json_dict['user']
+                if 'retweeted_status' in json_dict:
+                    json_dict['retweeted_status'].update(id=101, user={'id': self.bot.config.bot_id})
+                else:
+                    json_dict.update(in_reply_to_status_id=101, in_reply_to_user_id=self.bot.config.bot_id)
+            sender.update(master)
+            self.assertTrue(self.listener.is_relevant(json_dict), name + " should be dispatched")
+            sender['id'] = 3
+            self.assertFalse(self.listener.is_relevant(json_dict), name + " from others should be skipped")
+
     def test_get_reply(self):
         """
         Test replies to bot account's tweets.
@@ -153,10 +188,42 @@ class TFStreamTests(unittest.TestCase):
         ''' Does the bot respond to a DM from the master account? '''
         with open('tests/cassettes/stream_get_master_dm.json', encoding='utf8') as cassette:
             self.listener.on_data(cassette.read())
-            self.assertTrue(self.log_buffer.has_text("CMD.status"))
+        self.bot.command_jobs.join(10) # Commands run on worker threads
+        self.assertTrue(self.log_buffer.has_text("CMD.status"))
     
     @TAPE.use_cassette("test_rt_comment_check.json")
     def test_rt_comment_check(self):
         ''' Does the check_for_tweets method discover and record RT comments? '''
         self.bot.userstream.listener.check_for_comments(100, self.bot.config.master_id)
         self.assertTrue(self.bot.stats.get_tweet_stats(100)['rt_comments'])
+
+class TFIngestTests(unittest.TestCase):
+    ''' Test the bounded queue between the userstream and event handlers. '''
+    def test_drop_oldest(self):
+        ''' Does a full drop_oldest queue keep only the newest items? '''
+        handled = []
+        holding, release = Event(), Event()
+        def handle(item):
+            holding.set()
+            release.wait(5)
+            handled.append(item)
+        ingest = IngestQueue(handle, 2, 'drop_oldest', workers=1)
+        ingest.put('status', 0)
+        self.assertTrue(holding.wait(5), "The worker should be holding the first item")
+        for num in range(1, 6):
+            ingest.put('status', num)
+        release.set()
+        ingest.stop()
+        self.assertEqual(handled, [0, 4, 5])
+        self.assertEqual(ingest.metrics()['dropped'], {'status': 3})
+
+    def test_drop_by_type(self):
+        ''' Does drop_by_type spare direct messages? '''
+        handled = []
+        ingest = IngestQueue(lambda item: (sleep(0.01), handled.append(item)), 1, 'drop_by_type', ['favorite'], 1)
+        ingest.put('favorite', 'fav')
+        for num in range(3):
+            ingest.put('direct_message', num)
+        ingest.stop()
+        self.assertEqual(handled[-3:], [0, 1, 2])
+        self.assertEqual(ingest.metrics()['processed'], len(handled))
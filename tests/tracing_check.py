@@ -0,0 +1,45 @@
+"""
+Tests sampled span tracing.
+python -m unittest tests/tracing_check.py
+"""
+import unittest
+from tweetfeeder.tracing import Tracer
+
+class TFTracingTests(unittest.TestCase):
+    ''' Test span nesting, sampling and the ring buffer. '''
+    def tearDown(self):
+        ''' Turn tracing back off '''
+        Tracer.configure(0.0, 100)
+        Tracer.clear()
+
+    def test_nested_spans(self):
+        ''' Do spans opened inside a trace become its children? '''
+        Tracer.configure(1.0)
+        with Tracer.span("TWT.tweet", title="TEST"):
+            with Tracer.span("API.update_status"):
+                pass
+            with Tracer.span("TWT.next"):
+                with Tracer.span("IO.get_tweets"):
+                    pass
+        trace = Tracer.traces()[-1]
+        self.assertEqual(trace.name, "TWT.tweet")
+        self.assertEqual([child.name for child in trace.children], ["API.update_status", "TWT.next"])
+        self.assertEqual(trace.children[1].children[0].name, "IO.get_tweets")
+        self.assertIn("title=TEST", Tracer.dump(1))
+
+    def test_unsampled(self):
+        ''' Are unsampled traces, including their children, left out? '''
+        Tracer.configure(0.0)
+        with Tracer.span("TWT.tweet") as span:
+            self.assertIsNone(span)
+            with Tracer.span("TWT.next") as child:
+                self.assertIsNone(child)
+        self.assertFalse(Tracer.traces())
+
+    def test_ring_buffer(self):
+        ''' Does the ring buffer keep only the most recent traces? '''
+        Tracer.configure(1.0, 3)
+        for num in range(5):
+            with Tracer.span("STR.on_data", num=num):
+                pass
+        self.assertEqual([trace.attrs['num'] for trace in Tracer.traces()], [2, 3, 4])
@@ -174,7 +174,11 @@ class TFTweetingTests(unittest.TestCase):
         ''' Does the tweeting loop continue to loop when the end of the feed is reached? '''
         Log.info("check_no_bools", "Est. runtime: 8 seconds")
         feed = Feed("tests/config/test_feed_singular.json")
-        timer = TweetLoop(self.botless_config, feed)
+        stats = Stats()
+        stats.register_tweet(1, "TEST_ONE_TWEET")
+        # Only tweets scoring looping_min_score or more are rerun
+        stats.mod_tweet_stats("TEST_ONE_TWEET", 'favorites', self.botless_config.looping_min_score)
+        timer = TweetLoop(self.botless_config, feed, stats)
         timer.wait_for_tweet(8)
         timer.wait_for_tweet(8)
         timer.stop()
@@ -206,10 +210,12 @@ class TFTweetingTests(unittest.TestCase):
         stats = Stats("tests/config/test_stats_with_registered_tweets.json")
         stats.times_rerun = 1
         stats.last_feed_index = 0
+        stats.mod_tweet_stats("CHAIN_2", 'favorites', 1) # Reaches looping_min_score; nothing else does
         timer = TweetLoop(self.botless_config, feed, stats)
         timer.wait_for_tweet(8)
         timer.stop()
-        print(self.log_buffer.buffer)
+        self.assertTrue(self.log_buffer.has_text('CHAIN_2'), self.log_buffer.buffer)
+        self.assertFalse(self.log_buffer.has_text('DO_NOT_TWEET'), self.log_buffer.buffer)
 
     def test_feed_loop_start_at_limit(self):
         ''' What happens when the bot starts in rerun mode
@@ -221,9 +227,11 @@ class TFTweetingTests(unittest.TestCase):
         feed = Feed("tests/config/test_feed_multiple.json")
         stats = Stats("tests/config/test_stats_with_registered_tweets.json")
         stats.times_rerun = 1
+        stats.mod_tweet_stats("CHAIN_2", 'favorites', 1) # Reaches looping_min_score; nothing else does
         self.assertEqual(stats.times_rerun, self.botless_config.looping_max_times)
         timer = TweetLoop(self.botless_config, feed, stats)
         timer.wait_for_tweet(2)
+        timer.stop()
 
     @unittest.skip("VCR not working very well")
     @TAPE.use_cassette("test_online_tweet.json")
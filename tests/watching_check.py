@@ -0,0 +1,89 @@
+"""
+Tests hot reloading of the tweet feed.
+python -m unittest tests/watching_check.py
+"""
+import unittest
+from os import path, utime
+from tempfile import mkdtemp
+from tweetfeeder.file_io import Config
+from tweetfeeder.file_io.models import Feed, FeedChange, Stats
+from tweetfeeder.file_io.utils import FileIO
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.tweeting import TweetLoop
+from tweetfeeder.watching import FeedWatcher
+from tests.fakes import FakeTimer
+
+class TFWatchingTests(unittest.TestCase):
+    ''' Test feed reloads, the regions they report and how a TweetLoop follows them. '''
+    def setUp(self):
+        ''' Write a five tweet feed to a temporary file '''
+        self.entries = [{'title': "T{}".format(num), 'text': "Tweet {}".format(num)} for num in range(5)]
+        self.filepath = path.join(mkdtemp(), "feed.json")
+        self.write_feed(self.entries)
+        self.feed = Feed(self.filepath)
+
+    def write_feed(self, feed_data, mtime=1):
+        ''' Saves feed data with a distinct modification time '''
+        if isinstance(feed_data, list):
+            FileIO.save_json_dict(self.filepath, feed_data)
+        else:
+            with open(self.filepath, 'w') as outfile:
+                outfile.write(feed_data)
+        utime(self.filepath, (mtime, mtime))
+
+    def test_feed_change(self):
+        ''' Does a reload report the changed region and keep the records around it? '''
+        old = self.feed.get_entries()
+        self.entries[2]['text'] = "Edited"
+        self.write_feed(self.entries, 2)
+        change = self.feed.swap(*self.feed.read())
+        self.assertEqual(change, FeedChange(2, 3, 3))
+        new = self.feed.get_entries()
+        self.assertIs(new[1], old[1])
+        self.assertIs(new[3], old[3])
+        self.write_feed([{'title': "NEW", 'text': "New"}] + self.entries, 3)
+        change = self.feed.swap(*self.feed.read())
+        self.assertEqual(change, FeedChange(0, 0, 1))
+        self.assertEqual(change.map_index(3), 4)
+        self.assertEqual(change.map_index(0), 0)
+        self.assertIsNone(self.feed.swap(*self.feed.read()))
+
+    def test_unwatched_feed_reloads(self):
+        ''' Does an unwatched feed pick up edits on its next read? '''
+        self.assertEqual(self.feed.total_tweets, 5)
+        self.write_feed(self.entries[:3], 2)
+        self.assertEqual(self.feed.total_tweets, 3)
+
+    def test_watcher_rejects_invalid_feed(self):
+        ''' Does the watcher keep the last good feed when the file is broken? '''
+        changes = []
+        watcher = FeedWatcher(self.feed, on_change=changes.append)
+        self.feed.get_entries()
+        self.feed.watched = True
+        self.write_feed('[{"title": "T0", "text": ', 2)
+        self.assertIsNone(watcher.reload())
+        self.assertEqual(self.feed.total_tweets, 5)
+        self.write_feed([{'title': "T0"}], 3)
+        self.assertIsNone(watcher.reload())
+        self.entries.append({'title': "T5", 'text': "Tweet 5"})
+        self.write_feed(self.entries, 4)
+        self.assertEqual(watcher.reload(), FeedChange(5, 5, 6))
+        self.assertEqual(changes, [FeedChange(5, 5, 6)])
+        self.assertEqual(self.feed.total_tweets, 6)
+
+    def test_loop_follows_change(self):
+        ''' Are queued timers only rebuilt when their entries change? '''
+        config = Config(BotFunctions.Tweet, None)
+        loop = TweetLoop(config, self.feed, Stats(), FakeTimer)
+        first_timer = loop.current_timer
+        self.assertEqual(first_timer.args[1], 0)
+        self.entries[4]['text'] = "Edited later"
+        self.write_feed(self.entries, 2)
+        loop.on_feed_change(self.feed.swap(*self.feed.read()))
+        self.assertIs(loop.current_timer, first_timer)
+        self.entries[0]['text'] = "Edited now"
+        self.write_feed(self.entries, 3)
+        loop.on_feed_change(self.feed.swap(*self.feed.read()))
+        self.assertTrue(first_timer.finished.is_set())
+        self.assertEqual(loop.current_timer.args[0]['text'], "Edited now")
+        self.assertEqual(loop.current_index, 1)
@@ -11,4 +11,10 @@ and amused perusal.
 __author__ = 'Ian M. <ian.hg.dev@gmail.com>'
 __version__ = '0.0.0'
 
-from .bot import TweetFeederBot
+from .lazy import lazy_attributes
+
+lazy_attributes(__name__, {
+    'TweetFeederBot': 'tweetfeeder.bot',
+    'BotHost': 'tweetfeeder.host',
+    'Fleet': 'tweetfeeder.fleet'
+})
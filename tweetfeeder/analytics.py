@@ -0,0 +1,163 @@
+"""
+Columnar analysis of a stats file: totals, top tweets,
+score percentiles and reruns compared to first runs.
+Uses NumPy when it's installed, and the stdlib array module otherwise.
+
+python -m tweetfeeder.analytics <stats.json> [--top N] [--json]
+"""
+import argparse
+import heapq
+import json
+import sys
+from array import array
+from collections import Counter
+from tweetfeeder.file_io.records import Record, TitleTable
+from tweetfeeder.file_io.utils import FileIO
+from tweetfeeder.scoring import DEFAULT_WEIGHTS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STAT_COLUMNS = ('favorites', 'retweets', 'requotes', 'replies', 'rt_comments')
+PERCENTILES = (50, 90, 99)
+
+def _values(rows: list, name: str) -> list:
+    ''' One stat from every row, whether the rows are TweetStats records or JSON dicts '''
+    if rows and isinstance(rows[0], Record):
+        return [getattr(row, name) for row in rows]
+    return [row.get(name, 0) for row in rows]
+
+def _count(value) -> int:
+    ''' Number of entries in a list stat, or the stat itself if already a count '''
+    return len(value) if isinstance(value, (list, tuple)) else value
+
+class StatsTable:
+    """
+    One array per tweet stat, plus score and publication count columns, with a row per title.
+    Aggregates then run over whole columns rather than the nested dicts.
+    """
+    def __init__(self, stats_data: dict, weights: dict = None):
+        ''' Splits the nested tweets dict into columns '''
+        weights = weights or DEFAULT_WEIGHTS
+        tweets = stats_data.get('tweets', {})
+        id_to_title = stats_data.get('id_to_title', {})
+        published = id_to_title.counts() if isinstance(id_to_title, TitleTable) else Counter(id_to_title.values())
+        self.titles = list(tweets)
+        rows = list(tweets.values())
+        columns = {name: array('l', _values(rows, name)) for name in STAT_COLUMNS[:-1]}
+        columns['rt_comments'] = array('l', [_count(value) for value in _values(rows, 'rt_comments')])
+        columns['published'] = array('l', [published[title] for title in self.titles])
+        factors = [(name, weights.get(name, 0)) for name in STAT_COLUMNS if weights.get(name, 0)]
+        if numpy is not None:
+            self.columns = {name: numpy.asarray(column) for name, column in columns.items()}
+            self.scores = numpy.zeros(len(rows), dtype=numpy.int64)
+            for name, factor in factors:
+                self.scores += self.columns[name] * factor
+        else:
+            self.columns = columns
+            scores = [0] * len(rows)
+            for name, factor in factors:
+                scores = [score + value * factor for score, value in zip(scores, columns[name])]
+            self.scores = array('l', scores)
+
+    def __len__(self):
+        ''' Number of titles '''
+        return len(self.titles)
+
+    def totals(self) -> dict:
+        ''' Sum of each stat column '''
+        return {name: int(sum(self.columns[name])) for name in STAT_COLUMNS}
+
+    def top(self, count: int = 10) -> list:
+        ''' (title, score) of the highest scoring titles, best first '''
+        count = min(count, len(self.titles))
+        if count <= 0:
+            return []
+        if numpy is not None:
+            best = numpy.argsort(-self.scores, kind='stable')[:count] # Ties keep file order
+        else:
+            best = heapq.nlargest(count, range(len(self.titles)), key=self.scores.__getitem__)
+        return [(self.titles[i], int(self.scores[i])) for i in best]
+
+    def percentiles(self, percents=PERCENTILES) -> dict:
+        ''' Score at each percentile (linear interpolation, like numpy's default) '''
+        if not self.titles:
+            return {percent: 0 for percent in percents}
+        if numpy is not None:
+            return dict(zip(percents, (float(x) for x in numpy.percentile(self.scores, percents))))
+        ordered = sorted(self.scores)
+        results = {}
+        for percent in percents:
+            rank = (len(ordered) - 1) * percent / 100
+            low = int(rank)
+            high = min(low + 1, len(ordered) - 1)
+            results[percent] = ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+        return results
+
+    def rerun_comparison(self) -> dict:
+        """
+        Count and mean score of titles published once (first runs only)
+        against those published more than once (rerun at least once).
+        """
+        if numpy is not None:
+            rerun = self.columns['published'] > 1
+            groups = {'first_run': self.scores[~rerun], 'rerun': self.scores[rerun]}
+            return {
+                name: {'titles': int(len(scores)), 'mean_score': float(scores.mean()) if len(scores) else 0.0}
+                for name, scores in groups.items()
+            }
+        groups = {'first_run': [0, 0], 'rerun': [0, 0]}
+        for published, score in zip(self.columns['published'], self.scores):
+            group = groups['rerun' if published > 1 else 'first_run']
+            group[0] += 1
+            group[1] += score
+        return {
+            name: {'titles': count, 'mean_score': total / count if count else 0.0}
+            for name, (count, total) in groups.items()
+        }
+
+    def summary(self, top: int = 10) -> dict:
+        ''' Every aggregate, JSON-ready '''
+        return {
+            'titles': len(self),
+            'totals': self.totals(),
+            'top': self.top(top),
+            'score_percentiles': self.percentiles(),
+            'reruns': self.rerun_comparison()
+        }
+
+def report(stats_data: dict, top: int = 10, weights: dict = None) -> str:
+    ''' Human readable summary of a stats dict '''
+    summary = StatsTable(stats_data, weights).summary(top)
+    lines = ["{} titles. Totals: {}".format(
+        summary['titles'], ", ".join("{} {}".format(v, k) for k, v in summary['totals'].items())
+    )]
+    lines.append("Score percentiles: " + ", ".join(
+        "p{} {:g}".format(k, v) for k, v in summary['score_percentiles'].items()
+    ))
+    lines.append("Reruns: " + ", ".join(
+        "{} titles averaging {:.1f} ({})".format(v['titles'], v['mean_score'], k.replace('_', ' '))
+        for k, v in summary['reruns'].items()
+    ))
+    lines.append("Top {}:".format(len(summary['top'])))
+    lines.extend("{:>6}  {}".format(score, title) for title, score in summary['top'])
+    return "\n".join(lines)
+
+def main(argv=None):
+    ''' Prints a report on a stats file '''
+    parser = argparse.ArgumentParser(description="Summarize a TweetFeeder stats file.")
+    parser.add_argument('stats', help="path to a stats JSON file")
+    parser.add_argument('--top', type=int, default=10, help="number of top tweets to list")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of text")
+    args = parser.parse_args(argv)
+    stats_data = FileIO.get_json_dict(args.stats)
+    if args.json:
+        json.dump(StatsTable(stats_data).summary(args.top), sys.stdout, indent=2)
+        print()
+    else:
+        print(report(stats_data, args.top))
+
+if __name__ == "__main__":
+    main()
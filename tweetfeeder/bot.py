@@ -3,12 +3,22 @@ Handles the import of config data
 and automatic usage of Twitter.
 """
 import cmd
+from functools import partial
+from os import path
 from tweepy import Stream, API
+from tweepy.error import TweepError
 from tweetfeeder.file_io import Config
 from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+from tweetfeeder.tracing import Tracer
+from tweetfeeder.profiling import Profiler
+from tweetfeeder.ratelimit import ApiScheduler, Priority
+from tweetfeeder.jobs import Job, JobTable
+from tweetfeeder import analytics
 from tweetfeeder.flags import BotFunctions
 from tweetfeeder.streaming import TweetFeederListener
 from tweetfeeder.tweeting import TweetLoop
+from tweetfeeder.watching import FeedWatcher
 from tweetfeeder.file_io.models import Feed, Stats
 from tweetfeeder.exceptions import InvalidCommand
 
@@ -18,40 +28,112 @@ class TweetFeederBot:
     and tracking tweet performance / responses.
     Also takes commands from a master Twitter account.
     """
-    def __init__(self, functionality=BotFunctions(), config_file=None):
+    def __init__(self, functionality=BotFunctions(), config_file=None, host=None, name=None):
         """
         Create a TweetFeeder bot and acquire
-        authorization from Twitter
+        authorization from Twitter.
+        When run by a BotHost, the bot shares the host's scheduler, APIs
+        and stats flusher, and logs under its own namespace.
         """
-        Log.setup(type(self).__name__)
-        Log.enable_console_output()
-        Log.info("BOT.init", "{:-^80}".format(str(functionality)))
-        self.config = Config(functionality, self.refresh, config_file)
-        self.feed = Feed(self.config.feed_filepath)
-        self.stats = Stats(self.config.stats_filepath, self.config.functionality.SaveStats)
-        self.tweet_loop = TweetLoop(self.config, self.feed, self.stats)
-        self.master_cmd = TweetFeederBot.MasterCommand(self)
-        Log.enable_file_output(self.config.functionality.Log, self.config.log_filepath)
-        Log.enable_dm_output(self.config.functionality.Alerts, self.alert_master)
-
-        # Follow up initialization
-        self.userstream = Stream(
-            self.config.authorization,
-            TweetFeederListener(self.config, self.stats, self.master_cmd.onecmd)
+        self.host = host
+        self.log_namespace = Log.namespace(name or type(self).__name__) if host else None
+        if not host:
+            Log.setup(type(self).__name__)
+            Log.enable_console_output()
+        with Log.scope(self.log_namespace):
+            Log.info("BOT.init", "{:-^80}".format(str(functionality)))
+            self.config = Config(functionality, self.refresh, config_file)
+            self.feed = Feed(self.config.feed_filepath)
+            self.stats = self._load_stats()
+            self.api_scheduler = ApiScheduler(self._timer_factory) # One rate limit budget for every component
+            self.tweet_loop = TweetLoop(
+                self.config, self.feed, self.stats,
+                self._timer_factory, self._api_factory, self.api_scheduler
+            )
+            self.feed_watcher = FeedWatcher(
+                self.feed, self.config.feed_poll_interval,
+                self._timer_factory, self._feed_changed
+            )
+            self.toggle_feed_watcher(BotFunctions.Tweet in functionality)
+            self.master_cmd = TweetFeederBot.MasterCommand(self)
+            self.command_jobs = JobTable(
+                self.master_cmd.onecmd, self.config.command_workers, TweetFeederBot.MasterCommand.INLINE
+            )
+            Log.enable_file_output(self.config.functionality.Log, self.config.log_filepath)
+            Log.enable_dm_output(self.config.functionality.Alerts, self.alert_master)
+            self.enable_metrics()
+
+            # Follow up initialization
+            self.userstream = Stream(
+                self.config.authorization,
+                TweetFeederListener(
+                    self.config, self.stats, self.command_jobs.submit,
+                    self._timer_factory, self._api_factory, self.api_scheduler
+                )
+            )
+            self.toggle_userstream(BotFunctions.Listen in functionality)
+
+    @property
+    def _timer_factory(self):
+        ''' threading.Timer replacement from the host, if any '''
+        return self.host.timer if self.host else None
+
+    @property
+    def _api_factory(self):
+        ''' tweepy.API replacement from the host, if any '''
+        return self.host.api_pool.get if self.host else API
+
+    def _load_stats(self):
+        ''' Creates a Stats object, saved through the host's flusher if hosted. '''
+        return Stats(
+            self.config.stats_filepath,
+            self.config.functionality.SaveStats,
+            self.host.flusher if self.host else None,
+            self.config.stats_format
         )
-        self.toggle_userstream(BotFunctions.Listen in functionality)
-
-    def refresh(self):
-        ''' Recreates some objects used by the bot with new functionality. '''
-        Log.debug("BOT.refresh", "Current index: " + str(self.stats.last_feed_index))
-        self.shutdown()
-        self.feed = Feed(self.config.feed_filepath)
-        self.stats = Stats(self.config.stats_filepath, self.config.functionality.SaveStats)
-        if self.config.functionality.Tweet:
-            self.tweet_loop.start()
-        self.toggle_userstream(self.config.functionality.Listen)
-        Log.enable_file_output(self.config.functionality.Log, self.config.log_filepath)
-        Log.enable_dm_output(self.config.functionality.Alerts, self.alert_master)
+
+    def refresh(self, previous: BotFunctions = None):
+        """
+        Applies a change of functionality, restarting only what the changed flags affect;
+        in-memory stats, the stream connection and queued tweets are otherwise kept.
+        Without the previous functionality, everything is restarted and stats are reloaded from disk.
+        """
+        functionality = self.config.functionality
+        if previous is None:
+            Log.debug("BOT.refresh", "Current index: " + str(self.stats.last_feed_index))
+            self.shutdown()
+            self.stats.set_dirty()
+            changed = BotFunctions.All
+        else:
+            changed = previous ^ functionality
+            Log.debug("BOT.refresh", "Changed functions: " + str(changed))
+        if changed.SaveStats:
+            self.stats.save = functionality.SaveStats
+        if changed.Tweet:
+            if functionality.Tweet:
+                self.tweet_loop.start()
+            else:
+                self.tweet_loop.stop()
+            self.toggle_feed_watcher(functionality.Tweet)
+        if changed.Listen:
+            self.toggle_userstream(functionality.Listen)
+            if not functionality.Listen:
+                self.userstream.listener.ingest.stop()
+        if changed.Log:
+            Log.enable_file_output(functionality.Log, self.config.log_filepath)
+        if changed.Alerts:
+            Log.enable_dm_output(functionality.Alerts, self.alert_master)
+
+    def toggle_feed_watcher(self, enabled=True):
+        ''' Enable hot reloading of the feed file (unless the config's poll interval is 0) '''
+        if enabled and self.config.feed_poll_interval and not self.feed_watcher.is_running():
+            self.feed_watcher.start()
+        elif not enabled:
+            self.feed_watcher.stop()
+
+    def _feed_changed(self, change):
+        ''' Passes a hot-reloaded feed region on to the tweet loop '''
+        self.tweet_loop.on_feed_change(change)
 
     def toggle_userstream(self, enabled=True):
         ''' Enable stream listening '''
@@ -60,19 +142,40 @@ class TweetFeederBot:
         elif not enabled:
             self.userstream.disconnect()
 
+    def enable_metrics(self):
+        ''' Starts the metrics exporters and tracing that the config asks for (a host does this once for its bots). '''
+        if self.host:
+            return
+        if self.config.metrics_filepath:
+            Metrics.start_file_export(self.config.metrics_filepath, self.config.metrics_interval)
+        if self.config.metrics_port:
+            Metrics.serve(self.config.metrics_port)
+        Tracer.configure(self.config.trace_sample_rate / 100, self.config.trace_buffer)
+
     def alert_master(self, text):
-        ''' Send a DM to the master account. '''
-        self.tweet_loop.api.send_direct_message(user_id=self.config.master_id, text=text)
+        ''' Send a DM to the master account (later, if the DM rate limit is used up). '''
+        sent = self.api_scheduler.submit(
+            Priority.ALERT, self.tweet_loop.api, 'send_direct_message', user_id=self.config.master_id, text=text
+        )
+        if sent.done():
+            sent.result() # Raise errors, as before
 
     def shutdown(self):
         ''' Stops stream tracking and other loops, presumably to end the program. '''
         Log.info("BOT.shutdown", "Stopping stream and loops.")
         self.toggle_userstream(False)
+        self.toggle_feed_watcher(False)
+        self.userstream.listener.ingest.stop()
+        self.command_jobs.stop()
         self.tweet_loop.stop()
+        self.api_scheduler.stop()
+        self.stats.flush()
         return True
 
     class MasterCommand(cmd.Cmd):
         ''' Takes input to manipulate the Bot remotely. Only onecmd is being used at present. '''
+        INLINE = ['jobs', 'cancel'] # Answered right away, even while other commands are running
+
         def __init__(self, bot_self):
             ''' Establishes link to bot '''
             super(TweetFeederBot.MasterCommand, self).__init__(self)
@@ -112,26 +215,159 @@ class TweetFeederBot:
 
             TODO: Make this work for requotes/replies, too
             """
-            api = API(self.bot.config.authorization)
+            api = self.bot._api_factory(self.bot.config.authorization)
             stats = self.bot.stats
             if not (api and stats):
                 Log.error("BOT.cmd.sync_stats", "Cannot sync stats: bot lacks stats Functionality")
                 return False
 
-            processed = []
-            for twid in stats.data['id_to_title']:
-                title = stats.data['id_to_title'][twid]
-                # Get status info from Twitter
-                status = api.get_status(twid)
+            # Statuses are fetched at the lowest priority: what the rate limit can't afford now
+            # is fetched as windows reset, and scheduled tweets always go first
+            registered = list(stats.data['id_to_title'].items())
+            processed = set()
+            remaining = [len(registered)]
+            job = Job.current()
+            if job:
+                job.set_total(len(registered))
+            fetches = []
+            for twid, title in registered:
+                if job and job.cancelled:
+                    break
+                fetch = self.bot.api_scheduler.submit(Priority.SYNC, api, 'get_status', twid)
+                fetch.add_done_callback(partial(self._synced, stats, title, processed, remaining, job))
+                fetches.append(fetch)
+            if job:
+                # On a command worker, the job lasts until every status has been applied
+                if not job.wait_for(fetches):
+                    Log.info("BOT.cmd.sync_stats", "Cancelled after syncing {} of {} statuses".format(job.done, job.total))
+            elif remaining[0]:
+                Log.info("BOT.cmd.sync_stats", "{} statuses left to fetch when rate limits allow".format(remaining[0]))
+
+        def _synced(self, stats, title, processed, remaining, job, future):
+            ''' Applies one status fetched by sync_stats '''
+            if future.cancelled():
+                return
+            try:
+                status = future.result()
+            except TweepError as e:
+                Log.warning("BOT.cmd.sync_stats", "Couldn't sync {}: {}".format(title, e))
+            else:
                 if title not in processed:
                     # Overwrite numeric stats
                     Log.debug("BOT.cmd.sync_stats", "Overwriting stats for {}".format(title))
-                    processed.append(title)
+                    processed.add(title)
                     stats.update_tweet_stats_from_status(status.__dict__)
                 else:
                     # Mod numeric stats
                     stats.add_tweet_stats_from_status(status.__dict__)
-            Log.info("BOT.cmd.sync_stats", "Finished.")
+            if job:
+                job.advance()
+            remaining[0] -= 1
+            if not remaining[0]:
+                Log.info("BOT.cmd.sync_stats", "Finished.")
+
+        def do_jobs(self, args):
+            """Logs recent master commands with their status and progress.
+            """
+            jobs = self.bot.command_jobs.jobs()
+            Log.info("CMD.jobs", "\n".join(job.describe() for job in jobs) or "No jobs")
+
+        def do_cancel(self, args):
+            """Cancels a queued master command, or stops a running one.
+            Usage: cancel <job id>
+            """
+            try:
+                job_id = int(args.strip().lstrip('#'))
+            except ValueError as e:
+                raise InvalidCommand("Job ID should be a number") from e
+            job = self.bot.command_jobs.cancel(job_id)
+            if job is None:
+                raise InvalidCommand("No job #{}".format(job_id))
+            if job.finished and job.status != Job.CANCELLED:
+                raise InvalidCommand("Job #{} already {}".format(job_id, job.status))
+
+        def do_report(self, args):
+            """Logs a summary of tweet performance from the stats.
+            Usage: report [top count]
+            """
+            try:
+                top = int(args) if args.strip() else 5
+            except ValueError as e:
+                raise InvalidCommand("Top count should be a number") from e
+            stats = self.bot.stats
+            stats_data = {
+                'tweets': stats.all_tweet_stats(),
+                'id_to_title': stats.data['id_to_title'].copy()
+            }
+            Log.info("CMD.report", analytics.report(stats_data, top, self.bot.config.score_weights))
+
+        def do_traces(self, args):
+            """Logs the most recent hot path traces.
+            Usage: traces [count]
+            """
+            try:
+                count = int(args) if args.strip() else 5
+            except ValueError as e:
+                raise InvalidCommand("Trace count should be a number") from e
+            Log.info("CMD.traces", Tracer.dump(count) or "No traces recorded")
+
+        def do_profile(self, args):
+            """Profiles the running bot, writing reports to the log directory.
+            Usage: profile start [tweet|stream|all] [sample|cprofile]
+                   profile stop
+                   profile dump
+            """
+            words = args.lower().split()
+            action = words[0] if words else ""
+            report_dir = path.dirname(self.bot.config.log_filepath or "")
+            if action == 'start':
+                target = words[1] if len(words) > 1 else 'all'
+                mode = words[2] if len(words) > 2 else 'sample'
+                try:
+                    Profiler.start(target, mode)
+                except ValueError as e:
+                    raise InvalidCommand(str(e)) from e
+                Log.info("CMD.profile", "Profiling {} threads ({})".format(target, mode))
+            elif action == 'stop':
+                if not Profiler.is_running():
+                    raise InvalidCommand("No profile is running.")
+                Profiler.stop()
+                Log.info("CMD.profile", "Profile saved to " + Profiler.dump(report_dir))
+            elif action == 'dump':
+                Log.info("CMD.profile", "Profile saved to " + Profiler.dump(report_dir))
+            else:
+                raise InvalidCommand("First argument should be 'start', 'stop' or 'dump'.")
+
+        def do_snapshot(self, args):
+            """Takes, lists, compares or prunes snapshots of the stats.
+            Usage: snapshot take [label]
+                   snapshot list
+                   snapshot diff <from> [to]
+                   snapshot prune <count kept>
+            Snapshots are named by time, or found by label or position (-1 is the latest).
+            Without [to], diff compares against the current stats.
+            """
+            words = args.split()
+            action = words[0].lower() if words else ""
+            stats = self.bot.stats
+            if not stats.snapshots:
+                raise InvalidCommand("Snapshots need a stats file.")
+            if action == 'take':
+                manifest = stats.snapshot(" ".join(words[1:]) or None)
+                Log.info("CMD.snapshot", "Took snapshot " + manifest['name'])
+            elif action == 'list':
+                Log.info("CMD.snapshot", "\n".join(stats.snapshots.names()) or "No snapshots")
+            elif action == 'diff' and len(words) in (2, 3):
+                try:
+                    diff = stats.diff_snapshots(*words[1:])
+                except KeyError as e:
+                    raise InvalidCommand(e.args[0]) from e
+                Log.info("CMD.snapshot", diff.report())
+            elif action == 'prune' and len(words) == 2 and words[1].isdigit():
+                pruned = stats.snapshots.prune(int(words[1]))
+                Log.info("CMD.snapshot", "Deleted {} snapshots".format(pruned))
+            else:
+                raise InvalidCommand("First argument should be 'take', 'list', 'diff' or 'prune'.")
 
         def do_status(self, args):
             """Returns information on the bot's status.
@@ -142,7 +378,9 @@ class TweetFeederBot:
                 report += "Time until next tweet: {} seconds".format(
                         self.bot.tweet_loop.time_until_tweet()
                     )
-            
+            if self.bot.config.functionality.Listen:
+                report += "\nStream ingest: {}".format(self.bot.userstream.listener.ingest.metrics())
+
             Log.info(
                 "CMD.status",
                 report
@@ -1,2 +1,4 @@
 ''' Data classes created from file '''
-from .config import Config
+from ..lazy import lazy_attributes
+
+lazy_attributes(__name__, {'Config': 'tweetfeeder.file_io.config'})
@@ -1,12 +1,14 @@
 ''' Compile-time configuration data for hg_tweetfeeder.bot '''
+import json
+from hashlib import sha1
 from os import path, mkdir
 from re import search, sub
 from configparser import ConfigParser, ParsingError
 from datetime import datetime
-from tweepy import OAuthHandler
 from .utils import FileIO
 from ..flags import BotFunctions
 from ..exceptions import LoadConfigError
+from ..ingest import IngestQueue
 
 class Config:
     ''' Regenerative .ini config file interpretation for usage inside hg_tweetfeeder.bot '''
@@ -20,14 +22,10 @@ class Config:
             elif file_ext != ".ini":
                 raise LoadConfigError("TweetFeeder config file should be of .ini type.")
             
-            if path.exists(filepath):
-                try:
-                    assert path.isfile(filepath)
-                    config.read(filepath)          
-                except (AssertionError, ParsingError) as e:
-                    raise LoadConfigError("Error parsing config ({}).".format(filepath))
-            else:
+            if not path.exists(filepath):
                 raise LoadConfigError("No config file at given filepath ({}).".format(filepath))
+            if not path.isfile(filepath):
+                raise LoadConfigError("Error parsing config ({}).".format(filepath))
         
         # Internal dictionary that represents the config file's sections, options, and default values
         # All string values can be called safely from this dictionary (see properties)
@@ -36,7 +34,11 @@ class Config:
                 'feed'  : None,
                 'stats' : None,
                 'log'   : None,
-                'auth'  : None
+                'auth'  : None,
+                'metrics' : None
+            },
+            "Stats Settings" : {
+                'stats_format'      : "pretty"
             },
             "Tweet Settings" : {
                 'tweet_times_list'  : "XX:XX, XX:XX",
@@ -44,7 +46,33 @@ class Config:
                 'rest_period'       : "0 seconds",
                 'min_tweet_delay'   : "4 seconds",
                 'looping_min_score' : "0 points",
-                'looping_max_times' : "0 times"
+                'looping_max_times' : "0 times",
+                'feed_poll_interval': "5 seconds",
+                'retry_base_delay'  : "30 seconds",
+                'retry_max_delay'   : "3600 seconds",
+                'retry_max_attempts': "10 times"
+            },
+            "Rerun Scoring" : {
+                'favorites_weight'   : "1 points each",
+                'retweets_weight'    : "2 points each",
+                'requotes_weight'    : "2 points each",
+                'replies_weight'     : "1 points each",
+                'rt_comments_weight' : "2 points each"
+            },
+            "Stream Settings" : {
+                'ingest_workers'    : "0 threads",
+                'ingest_queue_size' : "1000 events",
+                'overflow_policy'   : "block",
+                'droppable_types'   : "status, favorite, unfavorite",
+                'command_workers'   : "2 threads"
+            },
+            "Metrics" : {
+                'metrics_port'      : "0 (disabled)",
+                'metrics_interval'  : "60 seconds"
+            },
+            "Tracing" : {
+                'trace_sample_rate' : "0 percent",
+                'trace_buffer'      : "100 traces"
             }
         }
 
@@ -57,26 +85,65 @@ class Config:
         self.min_tweet_delay = 4
         self.looping_min_score = 0 # Score necessary to rerun a tweet
         self.looping_max_times = 0 # Number of times the feed can be looped over (disabled by default)
+        self.feed_poll_interval = 5 # Seconds between checks of the feed file for changes (0 disables hot reloading)
+        self.retry_base_delay = 30 # Seconds before the first retry of a failed post; doubles each retry
+        self.retry_max_delay = 3600 # Longest wait between retries
+        self.retry_max_attempts = 10 # Tries before a post is given up on
+        self.favorites_weight = 1 # Rerun score points per favorite (and so on)
+        self.retweets_weight = 2
+        self.requotes_weight = 2
+        self.replies_weight = 1
+        self.rt_comments_weight = 2
+        self.ingest_workers = 0 # Threads handling stream events (0 handles them on the stream thread)
+        self.ingest_queue_size = 1000 # Stream events that can wait for an ingest worker
+        self.command_workers = 2 # Threads running master commands (0 runs them on the stream thread)
+        self.metrics_port = 0 # Loopback port serving /metrics (disabled by default)
+        self.metrics_interval = 60 # Seconds between rewrites of the metrics file
+        self.trace_sample_rate = 0 # Percentage of hot path operations traced
+        self.trace_buffer = 100 # Recent traces kept for the traces command
+
+        # A compiled copy of this config, saved when it was last parsed, skips parsing it again
+        cache = ConfigCache(filepath, self._config_dict) if filepath else None
+        compiled = cache.load() if cache else None
+        missing_options = False
+        if compiled:
+            self._config_dict = compiled['options']
+            self.__dict__.update(compiled['values'])
+        elif filepath:
+            try:
+                config.read(filepath)
+            except ParsingError as e:
+                raise LoadConfigError("Error parsing config ({}).".format(filepath)) from e
 
-        # Iterate over internal dictionary to both update self.values and generate config file
-        for section, option_dict in self._config_dict.items():
-            if not config.has_section(section):
-                config.add_section(section)
-            for option, value in option_dict.items():
-                if not config.has_option(section, option):
-                    config.set(section, option, value)
-                else:
-                    self._config_dict[section][option] = config.get(section, option)
-                    if option in self.__dict__: #Update integer self.values
-                        try:
-                            self.__dict__[option] = int(sub("[^\d]", "", config.get(section, option)) or self.__dict__[option])
-                        except ValueError:
-                            raise LoadConfigError("Error parsing integer from option: {}={}".format(option, sub("[^\d]", "", config.get(section, option))))
-
-        # Check filepaths before proceeding
-        path_errors = self.verify_paths()
-        if path_errors:
-            raise LoadConfigError("The following paths failed verification: " + str(path_errors))
+        # Otherwise, iterate over internal dictionary to both update self.values and generate config file
+        if not compiled:
+            for section, option_dict in self._config_dict.items():
+                if not config.has_section(section):
+                    config.add_section(section)
+                for option, value in option_dict.items():
+                    if not config.has_option(section, option):
+                        config.set(section, option, value)
+                        missing_options = True
+                    else:
+                        self._config_dict[section][option] = config.get(section, option)
+                        if option in self.__dict__: #Update integer self.values
+                            try:
+                                self.__dict__[option] = int(sub("[^\d]", "", config.get(section, option)) or self.__dict__[option])
+                            except ValueError:
+                                raise LoadConfigError("Error parsing integer from option: {}={}".format(option, sub("[^\d]", "", config.get(section, option))))
+
+        if self.overflow_policy not in IngestQueue.POLICIES:
+            raise LoadConfigError("Unknown overflow_policy: " + self.overflow_policy)
+        if self.stats_format not in FileIO.available_formats():
+            raise LoadConfigError("Unknown or unavailable stats_format: {} (choose from {})".format(
+                self.stats_format, ", ".join(FileIO.available_formats())
+            ))
+
+        # Check filepaths before proceeding; a compiled config is only saved once its paths pass
+        if not compiled:
+            path_errors = self.verify_paths()
+            if path_errors:
+                raise LoadConfigError("The following paths failed verification: " + str(path_errors))
 
         self.authorization = None
         if self._config_dict["Filepaths"]['auth']:
@@ -96,7 +163,12 @@ class Config:
 
         # Read tweet times and split the string
         self.tweet_times = []
-        if "X" not in self._config_dict["Tweet Settings"]["tweet_times_list"]:
+        if compiled:
+            self.tweet_times = [
+                datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+                for hour, minute in compiled['tweet_times']
+            ]
+        elif "X" not in self._config_dict["Tweet Settings"]["tweet_times_list"]:
             tweet_time_strings = sub("[^\d:]", " ", self._config_dict["Tweet Settings"]["tweet_times_list"]).split()
             try:
                 self.tweet_times = self.parse_tweet_times(tweet_time_strings)
@@ -108,10 +180,16 @@ class Config:
         self.on_change = on_change or Config.on_change_dummy
         self._functionality = functionality
 
-        # Save config file, adding missing options or sections
-        if filepath:
-            with open(filepath, 'w') as configfile:
-                config.write(configfile)
+        # Save config file if it lacked options or sections, then the compiled copy
+        if filepath and not compiled:
+            if missing_options:
+                with open(filepath, 'w') as configfile:
+                    config.write(configfile)
+            cache.save(self._config_dict, {
+                option: self.__dict__[option]
+                for option_dict in self._config_dict.values() for option in option_dict
+                if option in self.__dict__
+            }, [(tweet_time.hour, tweet_time.minute) for tweet_time in self.tweet_times])
 
     @property
     def feed_filepath(self):
@@ -128,6 +206,34 @@ class Config:
         ''' Return filepath to the log. '''
         return self._config_dict["Filepaths"]['log']
 
+    @property
+    def metrics_filepath(self):
+        ''' Return filepath to the metrics text export. '''
+        return self._config_dict["Filepaths"]['metrics']
+
+    @property
+    def score_weights(self) -> dict:
+        ''' Returns the points each tweet stat is worth when scoring reruns. '''
+        return {
+            stat: self.__dict__[stat + '_weight']
+            for stat in ('favorites', 'retweets', 'requotes', 'replies', 'rt_comments')
+        }
+
+    @property
+    def overflow_policy(self) -> str:
+        ''' Returns what the stream ingest queue does when full. '''
+        return self._config_dict["Stream Settings"]['overflow_policy'].strip().lower()
+
+    @property
+    def droppable_types(self) -> list:
+        ''' Returns the stream data kinds that may be dropped under the drop_by_type policy. '''
+        return sub(",", " ", self._config_dict["Stream Settings"]['droppable_types']).split()
+
+    @property
+    def stats_format(self) -> str:
+        ''' Returns the format the stats file is saved in (any format is read). '''
+        return self._config_dict["Stats Settings"]['stats_format'].strip().lower()
+
     @property
     def functionality(self) -> BotFunctions:
         ''' Returns BotFunctions settings '''
@@ -135,13 +241,16 @@ class Config:
 
     @functionality.setter
     def functionality(self, value: BotFunctions):
-        ''' Modifies BotFunctions, then alerts a parent using on_change(). '''
+        ''' Modifies BotFunctions, then alerts a parent using on_change(previous functionality). '''
+        previous = self._functionality
         self._functionality = value
-        self.on_change()
+        if value != previous:
+            self.on_change(previous)
 
     @staticmethod
     def auth_from_keys(consumer_key, consumer_secret, access_token, access_token_secret):
         ''' Creates an authorization handler from credentials '''
+        from tweepy import OAuthHandler # Only bots need tweepy; reports and simulations don't
         authorization = OAuthHandler(
             consumer_key, consumer_secret
         )
@@ -173,7 +282,7 @@ class Config:
         return tweet_times
 
     @staticmethod
-    def on_change_dummy():
+    def on_change_dummy(previous=None):
         ''' Do nothing on change '''
         pass
 
@@ -189,3 +298,46 @@ class Config:
                     except OSError as e:                  
                         problems.add(path.dirname(filepath) + ": " + str(e))
         return problems
+
+class ConfigCache:
+    """
+    Compiled copy of a parsed .ini config, saved next to it as <config>.ini.cache.json.
+    It's keyed by a hash of the .ini's content and of the option defaults, so an edited
+    config (or a TweetFeeder version with other options) is parsed again.
+    It's only saved once the config's paths are verified, so a hit skips that check too.
+    Credentials aren't cached; they're loaded from their own file every time.
+    """
+    VERSION = 1
+
+    def __init__(self, ini_filepath: str, defaults: dict):
+        ''' Fingerprints the defaults now, before parsing fills them in '''
+        self.ini_filepath = ini_filepath
+        self.filepath = ini_filepath + ".cache.json"
+        self._defaults = json.dumps(defaults, sort_keys=True)
+
+    def key(self) -> str:
+        ''' Hash of the cache version, option defaults and .ini content '''
+        digest = sha1("{}\n{}\n".format(ConfigCache.VERSION, self._defaults).encode('utf8'))
+        with open(self.ini_filepath, 'rb') as ini_file:
+            digest.update(ini_file.read())
+        return digest.hexdigest()
+
+    def load(self) -> dict:
+        ''' The compiled config, or None if there isn't one for the .ini as it is now '''
+        try:
+            compiled = FileIO.get_json_dict(self.filepath)
+            return compiled if compiled.get('key') == self.key() else None
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def save(self, options: dict, values: dict, tweet_times: list):
+        ''' Writes the compiled config; a directory that can't be written to just means no cache '''
+        try:
+            FileIO.save_json_dict(self.filepath, {
+                'key': self.key(),
+                'options': options,
+                'values': values,
+                'tweet_times': tweet_times
+            })
+        except OSError:
+            pass
@@ -1,94 +1,265 @@
 ''' Compile-time configuration data for hg_tweetfeeder.bot '''
 import json
+import os
+from os import path
 from shutil import copyfile
+from threading import Lock, RLock, Thread
+from contextlib import contextmanager
 from collections import namedtuple
-from tweepy.models import Status
 from .utils import FileIO
+from .records import FeedEntry, TweetStats, TitleTable, tweet_stats_records
+from .snapshots import SnapshotStore, StatsDiff
 from ..exceptions import LoadFeedError, UnregisteredTweetError, AlreadyRegisteredTweetError
 from ..flags import BotFunctions
 from ..logs import Log
+from ..metrics import Metrics
+from ..tracing import Tracer
+
+STATS_FLUSH = Metrics.histogram("tweetfeeder_stats_flush_seconds", "Time taken to write the stats file")
+STATS_SIZE = Metrics.gauge("tweetfeeder_stats_file_bytes", "Size of the stats file after the last write")
+
+class FeedChange(namedtuple('FeedChange', 'start old_end new_end')):
+    """
+    The region of the feed that changed between two loads:
+    entries [start:old_end] of the old feed became [start:new_end] of the new one.
+    """
+    @property
+    def shift(self) -> int:
+        ''' How far entries after the region moved '''
+        return self.new_end - self.old_end
+
+    def map_index(self, index: int) -> int:
+        """
+        Where an old feed index is in the new feed.
+        Indices inside the region, or at its start, go to its start, so entries
+        inserted just ahead of the next tweet are tweeted next.
+        """
+        if index <= self.start:
+            return index
+        if index >= self.old_end:
+            return index + self.shift
+        return self.start
+
+def validate_feed(feed_data) -> list:
+    ''' Checks loaded feed JSON and returns it as FeedEntry records; raises LoadFeedError if it's malformed '''
+    if not isinstance(feed_data, list):
+        raise LoadFeedError("Feed should be a list of tweets")
+    for index, entry in enumerate(feed_data):
+        if not (isinstance(entry, dict) and isinstance(entry.get('title'), str) and isinstance(entry.get('text'), str)):
+            raise LoadFeedError("Feed entry {} lacks a title or text".format(index))
+    return [FeedEntry.from_dict(entry) for entry in feed_data]
 
 class Feed:
-    ''' On-demand data from tweet feed. '''
+    """
+    Tweet feed data, kept in memory and reloaded when the file changes.
+    Unwatched feeds check the file's modification time on each read;
+    watched feeds are reloaded by a FeedWatcher in the background instead.
+    """
     def __init__(self, filepath: str):
         ''' Save filepaths for the feed and stats '''
         self.filepath = filepath
-        self._total_tweets = 0
+        self.watched = False
+        self._entries = None
+        self.loaded_signature = None
+        self._lock = Lock()
 
     @property
     def total_tweets(self) -> int:
-        ''' The total tweets in the feed as last recorded. '''
-        if self._total_tweets == 0:
-            try:
-                self.get_tweets(0)
-            except LoadFeedError:
-                return 0
-        return self._total_tweets
+        ''' The total tweets in the feed. '''
+        try:
+            return len(self._current_entries())
+        except LoadFeedError:
+            return 0
+
+    def signature(self):
+        ''' Modification time and size of the feed file, or None if it can't be found '''
+        try:
+            stat = os.stat(self.filepath)
+        except (OSError, TypeError):
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def read(self):
+        ''' Loads and validates the feed file, returning its entries and signature '''
+        signature = self.signature()
+        try:
+            feed_data = FileIO.get_json_dict(self.filepath)
+        except (FileNotFoundError, TypeError):
+            raise LoadFeedError(
+                "Couldn't load feed at " + (self.filepath or "(none given)")
+                )
+        except ValueError as e:
+            raise LoadFeedError("Feed at {} isn't valid JSON: {}".format(self.filepath, e)) from e
+        return validate_feed(feed_data), signature
+
+    def swap(self, entries: list, signature=None) -> FeedChange:
+        """
+        Replaces the feed's entries with a newly read version, keeping the old
+        records outside the region that changed. Returns that region, or None if nothing did.
+        """
+        with self._lock:
+            old = self._entries
+            self.loaded_signature = signature
+            if old is None:
+                self._entries = entries
+                return FeedChange(0, 0, len(entries))
+            start = 0
+            limit = min(len(old), len(entries))
+            while start < limit and old[start].same_as(entries[start]):
+                start += 1
+            end = 0
+            while end < limit - start and old[-1 - end].same_as(entries[-1 - end]):
+                end += 1
+            if start == len(old) == len(entries):
+                return None
+            self._entries = old[:start] + entries[start:len(entries) - end] + old[len(old) - end:]
+            return FeedChange(start, len(old) - end, len(entries) - end)
+
+    def _current_entries(self) -> list:
+        ''' The loaded entries, reloading them first if unwatched and the file has changed '''
+        if self._entries is None or (not self.watched and self.signature() != self.loaded_signature):
+            self.swap(*self.read())
+        return self._entries
 
     def get_tweets(self, from_index: int):
         """
         Loads a tweet or chain of tweets at feed_index
         and returns them along with the total tweets skipped.
         """
-        next_tweets = []
-        index = from_index
-        try:
-            feed_data = FileIO.get_json_dict(self.filepath)
-        except FileNotFoundError:
+        with Tracer.span("IO.get_tweets", index=from_index):
+            return self._read_tweets(from_index)
+
+    def get_entries(self) -> list:
+        ''' Every entry in the feed as FeedEntry records '''
+        return list(self._current_entries())
+
+    def entry(self, index: int) -> FeedEntry:
+        ''' The entry at index, without copying the feed; raises IndexError past its end '''
+        return self._current_entries()[index]
+
+    def _read_tweets(self, from_index: int):
+        ''' Body of get_tweets '''
+        entries = self._current_entries()
+        if from_index >= len(entries):
             raise LoadFeedError(
-                "Couldn't load feed at " + (self.filepath or "(none given)")
-                )
-        else:
-            self._total_tweets = len(feed_data)
-            if index >= self.total_tweets:
-                raise LoadFeedError(
-                    "Given index is greater than total_tweets: " +
-                    "{} from {}".format(index+1, self.total_tweets)
-                )
-            next_tweets.append(feed_data[index])
-            itr = 0
-            try:
-                while feed_data[index+itr]['chain']:
-                    itr += 1 #Append next tweet
-                    if index + itr >= self.total_tweets:
-                        break # Don't allow a final 'chain' to cause an index error
-                    next_tweets.append(feed_data[index + itr])
-            except KeyError: #Tweet data lacked the chain element -> defaults to False
-                next_tweets[-1]['chain'] = False
-
-        # Iron out rerun trait (defaults to True)
-        for tweet in next_tweets:
-            try:
-                tweet['rerun'] = tweet['rerun']
-            except KeyError:
-                tweet['rerun'] = True
+                "Given index is greater than total_tweets: " +
+                "{} from {}".format(from_index+1, len(entries))
+            )
+        # Chain and rerun traits default to False and True
+        end = from_index + 1
+        while entries[end - 1]['chain'] and end < len(entries):
+            end += 1 # Don't allow a final 'chain' to cause an index error
+        return entries[from_index:end]
+
+class CommentLog:
+    """
+    Append-only JSON lines file holding every RT comment,
+    one {"title": ..., "text": ...} object per line.
+    Keeps comment history out of the stats file, which is rewritten on every change.
+    """
+    def __init__(self, filepath: str):
+        ''' Saves the filepath; the file is created by the first append '''
+        self.filepath = filepath
+        self._lock = Lock()
+
+    def append(self, title: str, text: str):
+        ''' Records one comment on a title '''
+        self.extend(title, [text])
 
-        return next_tweets
+    def extend(self, title: str, texts: list):
+        ''' Records several comments on a title '''
+        lines = "".join(
+            json.dumps({'title': title, 'text': text}, ensure_ascii=False) + "\n" for text in texts
+        )
+        with self._lock, open(self.filepath, 'a', encoding="utf8") as outfile:
+            outfile.write(lines)
+
+    def read(self, title: str = None) -> list:
+        ''' Every comment recorded on title, oldest first (or every {title, text} entry without one) '''
+        try:
+            with open(self.filepath, encoding="utf8") as infile:
+                entries = [json.loads(line) for line in infile if line.strip()]
+        except FileNotFoundError:
+            return []
+        if title is None:
+            return entries
+        return [entry['text'] for entry in entries if entry['title'] == title]
 
 class Stats:
     ''' Access to Tweet stats and session data '''
 
-    def __init__(self, filepath: str = None, save: bool = False):
-        ''' Save filepaths for the feed and stats '''
+    def __init__(self, filepath: str = None, save: bool = False, flusher=None, file_format: str = 'pretty'):
+        """
+        Save filepaths for the feed and stats.
+        With a flusher (see host.StatsFlusher), writes are batched by the flusher's thread.
+        The stats file is written in file_format (see FileIO.FORMATS), and read in whatever format it's in.
+        """
         Log.debug("IO.stats", "Initializing")
         self._filepath = filepath
         self._save = save
+        self._flusher = flusher
+        self.file_format = file_format
         self._stats_dict = None
+        self._lock = RLock() # Stream events may be handled by several ingest workers
+        self._transactions = 0 # Open transactions; writes wait until the last one is committed
+        self._uncommitted = False
+        self._background_flush: Thread = None
+        self.comments = CommentLog(filepath + ".comments.jsonl") if filepath else None
+        self.snapshots = SnapshotStore(filepath + ".snapshots") if filepath else None
+
+    @property
+    def filepath(self) -> str:
+        ''' Path to the stats file (None if kept in memory) '''
+        return self._filepath
 
     @property
     def data(self):
         ''' Returns a dictionary of tweet stats from var or disk. '''
         if not self._stats_dict:
             try:
-                self._stats_dict = FileIO.get_json_dict(self._filepath)
+                stats_dict = FileIO.get_json_dict(self._filepath)
+                moved = self._save and self._move_comments(stats_dict.setdefault('tweets', {}))
+                self._stats_dict = Stats.from_json_dict(stats_dict)
+                if moved:
+                    self.flush() # Without their full lists, so they're never moved twice
             except (FileNotFoundError, TypeError):
                 # Create default stats dictionary
                 Log.debug("IO.stats", "Couldn't find stats file")
-                self._stats_dict = {'feed_index': 0, 'times_rerun': 0, 'rerun_index': 0, 'id_to_title': {}, 'tweets': {}}
+                self._stats_dict = {'feed_index': 0, 'times_rerun': 0, 'rerun_index': 0, 'id_to_title': TitleTable(), 'tweets': {}}
                 assert self.last_feed_index == 0
 
         return self._stats_dict
 
+    @staticmethod
+    def from_json_dict(stats_dict: dict) -> dict:
+        ''' Converts a stats dict loaded from JSON into records and a title table, in place '''
+        stats_dict.setdefault('tweets', {}) # A stats file may hold only the session keys
+        stats_dict.setdefault('id_to_title', {})
+        tweet_stats_records(stats_dict['tweets'])
+        stats_dict['id_to_title'] = TitleTable(stats_dict['id_to_title'], stats_dict['tweets'])
+        return stats_dict
+
+    @property
+    def save(self) -> bool:
+        ''' Whether changes are written to the stats file '''
+        return self._save
+
+    @save.setter
+    def save(self, value: bool):
+        ''' Turns saving on or off; turning it on writes out changes made in the meantime '''
+        self._save = bool(value)
+        if self._save and self._stats_dict is not None:
+            self._write_stats_file()
+
+    def _move_comments(self, tweets: dict) -> bool:
+        ''' Appends the full comment lists of an older stats file to the comment log '''
+        moved = False
+        for title, t_stats in tweets.items():
+            if isinstance(t_stats.get('rt_comments'), list) and t_stats['rt_comments']:
+                self.comments.extend(title, t_stats['rt_comments'])
+                moved = True
+        return moved
+
     @property
     def last_feed_index(self) -> int:
         ''' The last saved feed index as saved in the stats file. '''
@@ -135,41 +306,56 @@ class Stats:
         self.data['rerun_index'] = value
         self._write_stats_file()
 
-    def find_title_from_id(self, twid: str):
-        ''' Converts a Tweet ID, given by Twitter, into a hash title. '''
-        if str(twid) in self.data['id_to_title'].keys():
-            return self.data['id_to_title'][str(twid)]
-        else:
-            return None
+    def find_title_from_id(self, twid):
+        ''' Converts a Tweet ID, given by Twitter (as an int or string), into a hash title. '''
+        return self.data['id_to_title'].title_of(twid)
 
     def get_tweet_stats(self, title_or_id):
         ''' Returns a dictionary that details the performance of a tweet '''
-        title = self.find_title_from_id(str(title_or_id)) or title_or_id
+        title = self.find_title_from_id(title_or_id) or title_or_id
         try:
             return self.data['tweets'][title]
         except KeyError:
             Log.debug("IO.get_stats", "No stats found for {}".format(title))
             return None
 
+    def all_tweet_stats(self) -> dict:
+        ''' Copy of the title to performance stats dictionary '''
+        with self._lock:
+            return dict(self.data['tweets'])
+
     def mod_tweet_stats(self, title_or_id, stat_name: str, value):
-        ''' Adds a value (int or list) to a given [stat_name] for Tweet [title]. '''
-        t_stats = self.get_tweet_stats(title_or_id)
-        if t_stats:
-            if isinstance(t_stats[stat_name], list):
-                t_stats[stat_name].append(value)
+        """
+        Adds a value to a given [stat_name] for Tweet [title].
+        RT comment text is appended to the comment log (when saving) and kept as a recent comment.
+        """
+        with self._lock:
+            title = self.find_title_from_id(title_or_id) or title_or_id
+            t_stats = self.get_tweet_stats(title)
+            if t_stats:
+                if stat_name == 'rt_comments' and self._save and self.comments:
+                    self.comments.append(title, value)
+                t_stats.add(stat_name, value)
+                self._write_stats_file()
             else:
-                t_stats[stat_name] += value
-            self._write_stats_file()
-        else:
-            Log.debug("IO.mod_stats", "Get failed. See above. ")
+                Log.debug("IO.mod_stats", "Get failed. See above. ")
+
+    def get_rt_comments(self, title_or_id) -> list:
+        ''' Every RT comment recorded on a tweet, oldest first; only the recent ones if not saving '''
+        title = self.find_title_from_id(title_or_id) or title_or_id
+        if self._save and self.comments:
+            return self.comments.read(title)
+        t_stats = self.get_tweet_stats(title)
+        return list(t_stats.recent_rt_comments) if t_stats else []
 
     def update_tweet_stats(self, title_or_id, stats):
         ''' Updates dict elements that detail the performance of a tweet '''
-        title = self.find_title_from_id(str(title_or_id)) or title_or_id
+        title = self.find_title_from_id(title_or_id) or title_or_id
         Log.debug("IO.update_stats", "Updating stats for {}:\n{}".format(title, stats))
         try:
-            self.data['tweets'][title].update(stats)
-            self._write_stats_file()
+            with self._lock:
+                self.data['tweets'][title].update(stats)
+                self._write_stats_file()
         except KeyError:
             Log.warning("IO.update_stats", "No stats found for {}".format(title))
 
@@ -192,34 +378,97 @@ class Stats:
     def register_tweet(self, twid: int, title: str = None):
         ''' Save a newly published Tweet to the stats dictionary '''
         Log.debug("IO.stats", "Registering tweet...")
-        if not self.get_tweet_stats(title):
-            blank_perf_stats = {
-                'favorites': 0,
-                'retweets': 0,
-                'requotes': 0,
-                'replies': 0,
-                'rt_comments': []
-            }
-            Log.debug("IO.stats", "Registering tweet: " + title)
-            self.data['id_to_title'][str(twid)] = title
-            self.data['tweets'][title] = blank_perf_stats
-            self._write_stats_file()
+        with self._lock:
+            if not self.get_tweet_stats(title):
+                Log.debug("IO.stats", "Registering tweet: " + title)
+                self.data['id_to_title'].add(twid, title)
+                self.data['tweets'][title] = TweetStats()
+                self._write_stats_file()
+            else:
+                # Stats were found, only add title to id-title dict
+                self.data['id_to_title'].add(twid, title)
+                self._write_stats_file()
+
+    def begin(self):
+        ''' Opens a transaction: changes stay in memory until it's committed '''
+        with self._lock:
+            self._transactions += 1
+
+    def commit(self, background: bool = False):
+        """
+        Closes a transaction. Ending the last open one writes every change made during it at once;
+        in the background, that write is left to another thread (or to the flusher, if there is one).
+        """
+        with self._lock:
+            self._transactions = max(self._transactions - 1, 0)
+            write = not self._transactions and self._uncommitted
+            if write:
+                self._uncommitted = False
+        if not write:
+            return
+        if background and not self._flusher:
+            self.wait_for_flush()
+            self._background_flush = Thread(target=self._flush_logged, name="StatsFlush")
+            self._background_flush.start()
         else:
-            # Stats were found, only add title to id-title dict
-            self.data['id_to_title'][str(twid)] = title
             self._write_stats_file()
 
+    @contextmanager
+    def transaction(self, background: bool = False):
+        ''' Context manager for begin() and commit() '''
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit(background)
+
+    def wait_for_flush(self, timeout: float = None):
+        ''' Waits for a write started by commit(background=True) to finish '''
+        if self._background_flush:
+            self._background_flush.join(timeout)
+
+    def _flush_logged(self):
+        ''' Body of a background write, which has no caller to raise to '''
+        try:
+            self.flush()
+        except OSError as e:
+            Log.error("IO.stats", "Couldn't save stats: " + str(e))
+
     def _write_stats_file(self):
         ''' Save the stats dict if it's dirty '''
         if self._save:
+            if self._transactions:
+                self._uncommitted = True
+            elif self._flusher:
+                self._flusher.mark_dirty(self)
+            else:
+                self.flush()
+
+    def flush(self):
+        ''' Writes the stats dict to the stats file now '''
+        if self._save and self._stats_dict is not None:
             Log.debug("IO.stats", "Saving stats file: " + self._filepath)
-            FileIO.save_json_dict(self._filepath, self._stats_dict)
+            with self._lock, STATS_FLUSH.time(), Tracer.span("IO.write_stats"):
+                FileIO.save_json_dict(self._filepath, self._stats_dict, self.file_format)
+            STATS_SIZE.set(path.getsize(self._filepath))
 
     def save_copy(self, ext):
         ''' Saves a copy of the current stats dictionary '''
         Log.debug("IO.stats", "Savin' a copy to "+self._filepath+"-"+ext)
         FileIO.save_json_dict(self._filepath+"-"+ext, self._stats_dict)
 
+    def snapshot(self, label: str = None) -> dict:
+        ''' Saves a snapshot of the current stats, sharing whatever hasn't changed with earlier ones '''
+        with self._lock:
+            return self.snapshots.take(self.data, label)
+
+    def diff_snapshots(self, older: str, newer: str = None) -> StatsDiff:
+        ''' Engagement gained between two snapshots, or since one if newer isn't given '''
+        if newer is not None:
+            return self.snapshots.diff(older, newer)
+        with self._lock:
+            return self.snapshots.diff(older, current=self.data)
+
     def set_dirty(self):
         ''' Forces the stats object to reload the stats dictionary by first deleting it. '''
         self._stats_dict = None
@@ -0,0 +1,276 @@
+''' Compact record types for feed entries and tweet stats '''
+import re
+from collections import Counter
+from collections.abc import Mapping
+from operator import attrgetter
+
+class Record:
+    """
+    Base for __slots__ records that still answer dict-style access
+    (record['title'], record.get('rerun'), 'chain' in record), so code
+    written against the JSON dicts keeps working.
+    Keys the record doesn't know are kept in extras and written back out.
+    """
+    __slots__ = ('extras',)
+    FIELDS = ()
+    DEFAULTS = {}
+    _FIELD_SET = frozenset()
+    _getter = staticmethod(lambda record: ())
+
+    def __init__(self, **values):
+        ''' Fills every field from values or DEFAULTS; unknown keys go to extras '''
+        for field in self.FIELDS:
+            setattr(self, field, values.pop(field, self.DEFAULTS.get(field)))
+        self.extras = values or None
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        ''' Creates a record from a JSON object (faster than cls(**data) for bulk loads) '''
+        record = cls.__new__(cls)
+        for field in cls.FIELDS:
+            setattr(record, field, data.get(field, cls.DEFAULTS.get(field)))
+        record.extras = None if data.keys() <= cls._FIELD_SET else {
+            key: value for key, value in data.items() if key not in cls._FIELD_SET
+        }
+        return record
+
+    def to_dict(self) -> dict:
+        ''' JSON-ready dictionary, extras included '''
+        data = dict(zip(self.FIELDS, self._getter(self)))
+        if self.extras:
+            data.update(self.extras)
+        return data
+
+    def __getitem__(self, key):
+        ''' record[key] '''
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extras and key in self.extras:
+            return self.extras[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        ''' record[key] = value '''
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extras is None:
+                self.extras = {}
+            self.extras[key] = value
+
+    def __contains__(self, key):
+        ''' key in record '''
+        return key in self.FIELDS or bool(self.extras and key in self.extras)
+
+    def __iter__(self):
+        ''' Iterates over keys, like a dict '''
+        return iter(self.keys())
+
+    def __len__(self):
+        ''' Number of keys '''
+        return len(self.FIELDS) + len(self.extras or ())
+
+    def __eq__(self, other):
+        ''' Records equal each other, or dicts, with the same items (as JSON would see them) '''
+        if isinstance(other, (Record, dict)):
+            as_json = lambda items: {k: list(v) if isinstance(v, tuple) else v for k, v in items}
+            return as_json(self.items()) == as_json(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        ''' ClassName({...}) '''
+        return "{}({!r})".format(type(self).__name__, self.to_dict())
+
+    def same_as(self, other) -> bool:
+        ''' Whether other is a record of the same type and values (faster than ==) '''
+        return type(self) is type(other) and self._getter(self) == other._getter(other) and self.extras == other.extras
+
+    def get(self, key, default=None):
+        ''' record.get(key, default) '''
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> list:
+        ''' Field names, then extra keys '''
+        return list(self.FIELDS) + list(self.extras or ())
+
+    def items(self) -> list:
+        ''' (key, value) pairs '''
+        return list(self.to_dict().items())
+
+    def update(self, other=(), **values):
+        ''' Sets several keys at once, like dict.update '''
+        for key, value in dict(other, **values).items():
+            self[key] = value
+
+class FeedEntry(Record):
+    ''' One tweet in the feed. '''
+    __slots__ = ('title', 'text', 'chain', 'rerun')
+    FIELDS = __slots__
+    DEFAULTS = {'chain': False, 'rerun': True}
+    _FIELD_SET = frozenset(FIELDS)
+    _getter = attrgetter(*FIELDS)
+
+class TweetStats(Record):
+    """
+    Performance of one published title.
+    rt_comments counts the RT comments received; only the most recent few are kept,
+    in recent_rt_comments, with the full history going to the stats' CommentLog.
+    """
+    __slots__ = ('favorites', 'retweets', 'requotes', 'replies', 'rt_comments', 'recent_rt_comments')
+    FIELDS = __slots__
+    DEFAULTS = {
+        'favorites': 0, 'retweets': 0, 'requotes': 0, 'replies': 0,
+        'rt_comments': 0, 'recent_rt_comments': ()
+    }
+    _FIELD_SET = frozenset(FIELDS)
+    _getter = attrgetter(*FIELDS)
+    RECENT_COMMENTS = 5 # RT comments kept in the stats file per title
+
+    def __init__(self, **values):
+        ''' As Record, but a list of comments becomes a count and the recent comments '''
+        super(TweetStats, self).__init__(**values)
+        self._compact_comments()
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        ''' As Record, but a list of comments (older stats files) becomes a count and the recent comments '''
+        record = super(TweetStats, cls).from_dict(data)
+        record._compact_comments()
+        return record
+
+    def _compact_comments(self):
+        ''' Splits a full rt_comments list into the count and recent comments; empty ones share a tuple '''
+        if isinstance(self.rt_comments, (list, tuple)):
+            self.recent_rt_comments = self.rt_comments[-self.RECENT_COMMENTS:]
+            self.rt_comments = len(self.rt_comments)
+        self.recent_rt_comments = tuple(self.recent_rt_comments or ())
+
+    def add(self, stat: str, value):
+        ''' Adds to a numeric stat; an RT comment's text is counted and kept as a recent comment '''
+        if stat == 'rt_comments' and isinstance(value, str):
+            self.rt_comments += 1
+            self.recent_rt_comments = (self.recent_rt_comments + (value,))[-self.RECENT_COMMENTS:]
+        else:
+            self[stat] = self[stat] + value
+
+_DIGITS = re.compile('[0-9]+')
+
+def as_tweet_id(twid):
+    ''' A Tweet ID as an int, from an int or ASCII decimal string; None for anything else (e.g. a title) '''
+    if type(twid) is int:
+        return twid
+    if isinstance(twid, str) and _DIGITS.fullmatch(twid): # Not isdigit, which accepts e.g. "²"
+        return int(twid)
+    return None
+
+class TitleTable(Mapping):
+    """
+    The stats file's id_to_title dict, kept as int Tweet IDs pointing to
+    small integer handles into a table holding each title once.
+    It reads like the {"id": "title"} dict (keys are given back as strings);
+    to_dict() rebuilds that shape for saving. Keys that aren't numeric are kept as strings.
+    """
+    __slots__ = ('_titles', '_handles', '_ids')
+
+    def __init__(self, id_to_title: dict = None, titles=()):
+        """
+        Interns the titles of an {"id": "title"} dict.
+        Titles given beforehand (e.g. the stats' tweets keys) are the copies kept.
+        """
+        self._titles = []
+        self._handles = {}
+        self._ids = {} # {int or str: int}
+        for title in titles:
+            self.handle(title)
+        for twid, title in (id_to_title or {}).items():
+            self.add(twid, title)
+
+    def handle(self, title: str) -> int:
+        ''' The title's handle, adding it to the table if new '''
+        handle = self._handles.get(title)
+        if handle is None:
+            handle = len(self._titles)
+            self._titles.append(title)
+            self._handles[title] = handle
+        return handle
+
+    def add(self, twid, title: str):
+        ''' Maps a Tweet ID to a title '''
+        key = as_tweet_id(twid)
+        self._ids[twid if key is None else key] = self.handle(title)
+
+    def title_of(self, twid):
+        ''' The title published as twid, or None; no allocation for int IDs '''
+        handle = self._ids.get(twid)
+        if handle is None:
+            if type(twid) is int:
+                return None
+            handle = self._ids.get(as_tweet_id(twid))
+            if handle is None:
+                return None
+        return self._titles[handle]
+
+    def counts(self) -> Counter:
+        ''' Number of IDs published under each title '''
+        return Counter({self._titles[handle]: count for handle, count in Counter(self._ids.values()).items()})
+
+    def copy(self):
+        ''' Independent copy of the table '''
+        table = TitleTable()
+        table._titles = list(self._titles)
+        table._handles = dict(self._handles)
+        table._ids = dict(self._ids)
+        return table
+
+    def to_dict(self) -> dict:
+        ''' The {"id": "title"} dict of the stats file '''
+        titles = self._titles
+        return {str(twid): titles[handle] for twid, handle in self._ids.items()}
+
+    def __getitem__(self, twid):
+        ''' table[twid] '''
+        title = self.title_of(twid)
+        if title is None:
+            raise KeyError(twid)
+        return title
+
+    def __setitem__(self, twid, title):
+        ''' table[twid] = title '''
+        self.add(twid, title)
+
+    def __contains__(self, twid):
+        ''' twid in table '''
+        return self.title_of(twid) is not None
+
+    def __iter__(self):
+        ''' Tweet IDs as strings, like the JSON keys '''
+        return (str(twid) for twid in self._ids)
+
+    def __len__(self):
+        ''' Number of Tweet IDs '''
+        return len(self._ids)
+
+    def values(self) -> list:
+        ''' Title of each Tweet ID '''
+        titles = self._titles
+        return [titles[handle] for handle in self._ids.values()]
+
+    def __repr__(self):
+        ''' TitleTable({...}) '''
+        return "TitleTable({!r})".format(self.to_dict())
+
+def tweet_stats_records(tweets: dict) -> dict:
+    ''' Converts a title to stats dict loaded from JSON into TweetStats records, in place '''
+    for title, stats in tweets.items():
+        if not isinstance(stats, TweetStats):
+            tweets[title] = TweetStats.from_dict(stats)
+    return tweets
+
+def to_json(obj):
+    ''' json "default" hook for records and title tables '''
+    if isinstance(obj, (Record, TitleTable)):
+        return obj.to_dict()
+    raise TypeError("{} is not JSON serializable".format(type(obj).__name__))
@@ -0,0 +1,219 @@
+"""
+Point-in-time snapshots of the stats, compressed and deduplicated.
+A snapshot's tweet stats and id_to_title are split into buckets by key, and each bucket
+is stored once, gzipped, under the hash of its contents: buckets that haven't changed
+since an earlier snapshot cost nothing to keep, and a diff only opens the buckets that differ.
+"""
+import gzip
+import json
+from collections import namedtuple
+from datetime import timedelta
+from hashlib import sha1
+from os import listdir, makedirs, path, remove, replace
+from time import localtime, strftime, time
+from zlib import crc32
+from ..logs import Log
+from .records import to_json
+from .utils import FileIO
+
+class StatsDiff(namedtuple('StatsDiff', 'older newer seconds gains new_titles')):
+    """
+    Engagement gained between two snapshots (newer may be None, for the current stats).
+    gains maps each title that gained to its {stat: increase}; new_titles were first registered in between.
+    """
+    __slots__ = ()
+
+    def total(self, title: str) -> int:
+        ''' Sum of a title's gains '''
+        return sum(self.gains[title].values())
+
+    def ranked(self) -> list:
+        ''' Titles that gained, most first '''
+        return sorted(self.gains, key=lambda title: (-self.total(title), title))
+
+    def report(self, top: int = 10) -> str:
+        ''' Summary for the snapshot diff command '''
+        lines = ["{} to {} ({}): {} titles gained, {} new".format(
+            self.older, self.newer or "now", timedelta(seconds=round(self.seconds)),
+            len(self.gains), len(self.new_titles)
+        )]
+        for title in self.ranked()[:top]:
+            lines.append("  {}: {}".format(title, ", ".join(
+                "+{} {}".format(gain, stat) for stat, gain in self.gains[title].items()
+            )))
+        return "\n".join(lines)
+
+class SnapshotStore:
+    """
+    Directory of snapshot manifests (<name>.json), sharing gzipped buckets under objects/.
+    Snapshots are named after the time they were taken and can be referred to
+    by name, by label (the latest with it) or by position (-1 is the latest).
+    """
+    BUCKETS = 64 # Per section; a change rewrites roughly 1/BUCKETS of the stats
+    ENGAGEMENT = ('favorites', 'retweets', 'requotes', 'replies', 'rt_comments')
+    SESSION_KEYS = ('feed_index', 'times_rerun', 'rerun_index')
+
+    def __init__(self, directory: str):
+        ''' Nothing is written until the first snapshot '''
+        self.directory = directory
+        self._objects = path.join(directory, 'objects')
+
+    @staticmethod
+    def _encode(bucket: dict) -> tuple:
+        ''' A bucket's (hash, JSON bytes); equal buckets always encode the same '''
+        data = json.dumps(
+            bucket, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=to_json
+        ).encode('utf8')
+        return sha1(data).hexdigest(), data
+
+    @staticmethod
+    def _split(section, buckets: int) -> list:
+        ''' Splits a {key: value} mapping into buckets by a stable hash of each key '''
+        split = [{} for _ in range(buckets)]
+        for key, value in section.items():
+            key = str(key)
+            split[crc32(key.encode('utf8')) % buckets][key] = value
+        return split
+
+    def _object_path(self, digest: str) -> str:
+        ''' Where a bucket is stored '''
+        return path.join(self._objects, digest[:2], digest + '.json.gz')
+
+    def _put(self, bucket: dict) -> tuple:
+        ''' Stores a bucket unless an identical one is stored; returns (hash, whether it was new) '''
+        digest, data = SnapshotStore._encode(bucket)
+        filepath = self._object_path(digest)
+        if path.exists(filepath):
+            return digest, False
+        makedirs(path.dirname(filepath), exist_ok=True)
+        with gzip.open(filepath + '.tmp', 'wb') as outfile:
+            outfile.write(data)
+        replace(filepath + '.tmp', filepath) # Never leaves a partly written bucket under its hash
+        return digest, True
+
+    def _get(self, digest: str) -> dict:
+        ''' A stored bucket '''
+        with gzip.open(self._object_path(digest), 'rb') as infile:
+            return json.loads(infile.read().decode('utf8'))
+
+    def _merged(self, digests: list) -> str:
+        ''' Stores the union of several buckets as one (used to compare differently split snapshots) '''
+        merged = {}
+        for digest in digests:
+            merged.update(self._get(digest))
+        return self._put(merged)[0]
+
+    def names(self) -> list:
+        ''' Snapshot names, oldest first '''
+        try:
+            return sorted(name[:-5] for name in listdir(self.directory) if name.endswith('.json'))
+        except FileNotFoundError:
+            return []
+
+    def manifest(self, ref: str) -> dict:
+        ''' A snapshot's manifest, by name, label or position; raises KeyError if there's none '''
+        names = self.names()
+        if ref in names:
+            return FileIO.get_json_dict(path.join(self.directory, ref + '.json'))
+        for name in reversed(names):
+            manifest = FileIO.get_json_dict(path.join(self.directory, name + '.json'))
+            if manifest['label'] == ref:
+                return manifest
+        try:
+            return FileIO.get_json_dict(path.join(self.directory, names[int(ref)] + '.json'))
+        except (ValueError, IndexError):
+            raise KeyError("No snapshot {}".format(ref))
+
+    def take(self, stats_dict: dict, label: str = None, now: float = None) -> dict:
+        ''' Snapshots a stats dict (as Stats.data holds it); returns the new manifest '''
+        now = time() if now is None else now
+        name = base = strftime("%Y%m%d-%H%M%S", localtime(now))
+        names = set(self.names())
+        suffix = 1
+        while name in names:
+            suffix += 1
+            name = "{}-{}".format(base, suffix)
+        manifest = {'name': name, 'label': label, 'taken': now, 'buckets': SnapshotStore.BUCKETS}
+        for key in SnapshotStore.SESSION_KEYS:
+            manifest[key] = stats_dict.get(key, 0)
+        written = 0
+        for section in ('tweets', 'id_to_title'):
+            manifest[section] = []
+            for bucket in SnapshotStore._split(stats_dict[section], SnapshotStore.BUCKETS):
+                digest, new = self._put(bucket)
+                manifest[section].append(digest)
+                written += new
+        FileIO.save_json_dict(path.join(self.directory, name + '.json'), manifest)
+        Log.debug("IO.snapshot", "Snapshot {} took {} new buckets".format(name, written))
+        return manifest
+
+    def load(self, ref: str) -> dict:
+        ''' A snapshot as a JSON stats dict (see Stats.from_json_dict) '''
+        manifest = self.manifest(ref)
+        stats_dict = {key: manifest[key] for key in SnapshotStore.SESSION_KEYS}
+        for section in ('tweets', 'id_to_title'):
+            stats_dict[section] = {}
+            for digest in manifest[section]:
+                stats_dict[section].update(self._get(digest))
+        return stats_dict
+
+    def diff(self, older: str, newer: str = None, current: dict = None) -> StatsDiff:
+        """
+        Engagement gained from snapshot older to snapshot newer, or to the current
+        stats dict if newer isn't given. Only buckets with different hashes are read.
+        """
+        old = self.manifest(older)
+        if newer is not None:
+            new = self.manifest(newer)
+            new_name, new_taken = new['name'], new['taken']
+            if new['buckets'] != old['buckets']: # Can't be compared bucket by bucket
+                old['tweets'] = [self._merged(old['tweets'])]
+                new['tweets'] = [self._merged(new['tweets'])]
+            new_digests = new['tweets']
+            read_new = lambda i: self._get(new_digests[i])
+        else:
+            new_name, new_taken = None, time()
+            split = SnapshotStore._split(current['tweets'], old['buckets'])
+            new_digests = [SnapshotStore._encode(bucket)[0] for bucket in split]
+            read_new = lambda i: split[i]
+        gains = {}
+        new_titles = []
+        for i, (old_digest, new_digest) in enumerate(zip(old['tweets'], new_digests)):
+            if old_digest == new_digest:
+                continue
+            before, after = self._get(old_digest), read_new(i)
+            for title, stats in after.items():
+                previous = before.get(title)
+                if previous is None:
+                    new_titles.append(title)
+                    previous = {}
+                gained = {}
+                for stat in SnapshotStore.ENGAGEMENT:
+                    change = _count(stats.get(stat)) - _count(previous.get(stat))
+                    if change > 0:
+                        gained[stat] = change
+                if gained:
+                    gains[title] = gained
+        return StatsDiff(old['name'], new_name, new_taken - old['taken'], gains, sorted(new_titles))
+
+    def prune(self, keep: int) -> int:
+        ''' Deletes all but the latest [keep] snapshots, then the buckets none of them use; returns the count deleted '''
+        names = self.names()
+        dropped = names[:max(len(names) - keep, 0)]
+        for name in dropped:
+            remove(path.join(self.directory, name + '.json'))
+        used = set()
+        for name in names[len(dropped):]:
+            manifest = FileIO.get_json_dict(path.join(self.directory, name + '.json'))
+            used.update(manifest['tweets'], manifest['id_to_title'])
+        for prefix in listdir(self._objects) if path.isdir(self._objects) else ():
+            for filename in listdir(path.join(self._objects, prefix)):
+                if filename.split('.')[0] not in used:
+                    remove(path.join(self._objects, prefix, filename))
+        return len(dropped)
+
+def _count(value) -> int:
+    ''' A stat as a number (rt_comments may be a list in old stats files) '''
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    return value or 0
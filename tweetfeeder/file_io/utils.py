@@ -1,17 +1,121 @@
 ''' Compile-time configuration data for hg_tweetfeeder.bot '''
 
+import gzip
+import io
 import json
+import marshal
+from .records import Record, TitleTable, to_json
+
+try:
+    from compression.zstd import compress as zstd_compress, decompress as zstd_decompress # Python 3.14+
+except ImportError:
+    try:
+        import zstandard
+        zstd_compress = lambda data: zstandard.ZstdCompressor().compress(data)
+        zstd_decompress = lambda data: zstandard.ZstdDecompressor().decompress(data)
+    except ImportError:
+        zstd_compress = zstd_decompress = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def _plain(obj):
+    ''' Copy of a JSON-ready structure with records and title tables as dicts (marshal has no default hook) '''
+    if isinstance(obj, (Record, TitleTable)):
+        return obj.to_dict() # Their values are already plain
+    if isinstance(obj, dict):
+        return {key: _plain(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_plain(value) for value in obj]
+    return obj
 
 class FileIO:
-    ''' Collection of static methods for getting stuff out of files. '''
+    """
+    Collection of static methods for getting stuff out of files.
+    JSON dicts can be saved in any of FORMATS; reading detects the format from the file's first bytes.
+        pretty      Indented JSON, for files people read and edit
+        compact     JSON without whitespace
+        gzip        Compact JSON, gzipped
+        zstd        Compact JSON, zstd compressed (Python 3.14+ or the zstandard package)
+        msgpack     MessagePack (the msgpack package)
+        marshal     Python's marshal format: fast, but only readable by the same Python version
+    """
+    FORMATS = ['pretty', 'compact', 'gzip', 'zstd', 'msgpack', 'marshal']
+    GZIP_MAGIC = b'\x1f\x8b'
+    ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+    MARSHAL_MAGIC = b'\x00TFM' # marshal has no header of its own, and a dict starts with '{' as in JSON
+
+    @staticmethod
+    def available_formats() -> list:
+        ''' FORMATS whose libraries are installed '''
+        missing = {'zstd': zstd_compress is None, 'msgpack': msgpack is None}
+        return [fmt for fmt in FileIO.FORMATS if not missing.get(fmt)]
+
+    @staticmethod
+    def detect_format(data: bytes) -> str:
+        ''' The format of a file's contents, going by its first bytes (JSON is reported as compact) '''
+        if data.startswith(FileIO.GZIP_MAGIC):
+            return 'gzip'
+        if data.startswith(FileIO.ZSTD_MAGIC):
+            return 'zstd'
+        if data.startswith(FileIO.MARSHAL_MAGIC):
+            return 'marshal'
+        if data[:1] and (0x80 <= data[0] <= 0x8f or data[0] in (0xde, 0xdf)): # A msgpack map
+            return 'msgpack'
+        return 'compact'
+
     @staticmethod
     def get_json_dict(filepath):
-        ''' Returns the entire JSON dict in a given file. '''
-        with open(filepath, encoding="utf8") as infile:
-            return json.load(infile)
+        ''' Returns the entire JSON dict in a given file, whatever format it was saved in. '''
+        with open(filepath, 'rb') as infile:
+            data = infile.read()
+        fmt = FileIO.detect_format(data)
+        if fmt == 'gzip':
+            return json.loads(gzip.decompress(data))
+        if fmt == 'zstd':
+            if zstd_decompress is None:
+                raise ValueError("{} is zstd compressed, which needs Python 3.14+ or the zstandard package".format(filepath))
+            return json.loads(zstd_decompress(data))
+        if fmt == 'marshal':
+            return marshal.loads(data[len(FileIO.MARSHAL_MAGIC):])
+        if fmt == 'msgpack':
+            if msgpack is None:
+                raise ValueError("{} is in MessagePack format, which needs the msgpack package".format(filepath))
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        return json.loads(data.decode('utf8'))
+
+    @staticmethod
+    def encode(dictionary, fmt: str = 'compact') -> bytes:
+        ''' A JSON dict (which may hold records) in one of the binary-safe FORMATS '''
+        if fmt == 'msgpack':
+            if msgpack is None:
+                raise ValueError("The msgpack format needs the msgpack package")
+            return msgpack.packb(dictionary, default=to_json, use_bin_type=True)
+        if fmt == 'marshal':
+            return FileIO.MARSHAL_MAGIC + marshal.dumps(_plain(dictionary))
+        data = json.dumps(dictionary, ensure_ascii=False, separators=(',', ':'), default=to_json).encode('utf8')
+        if fmt == 'gzip':
+            buffer = io.BytesIO() # gzip.compress only takes mtime from Python 3.8
+            with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6, mtime=0) as gzip_file:
+                gzip_file.write(data)
+            return buffer.getvalue()
+        if fmt == 'zstd':
+            if zstd_compress is None:
+                raise ValueError("The zstd format needs Python 3.14+ or the zstandard package")
+            return zstd_compress(data)
+        if fmt != 'compact':
+            raise ValueError("Unknown file format: {}".format(fmt))
+        return data
 
     @staticmethod
-    def save_json_dict(filepath, dictionary):
-        ''' Saves a JSON dict, overwriting or creating a given file. '''
-        with open(filepath, 'w', encoding="utf8") as outfile:
-            json.dump(dictionary, outfile, ensure_ascii=False, indent=4)
+    def save_json_dict(filepath, dictionary, fmt: str = 'pretty'):
+        ''' Saves a JSON dict (which may hold records), overwriting or creating a given file. '''
+        if fmt == 'pretty':
+            with open(filepath, 'w', encoding="utf8") as outfile:
+                json.dump(dictionary, outfile, ensure_ascii=False, indent=4, default=to_json)
+            return
+        data = FileIO.encode(dictionary, fmt)
+        with open(filepath, 'wb') as outfile:
+            outfile.write(data)
@@ -0,0 +1,229 @@
+"""
+Spreads a large number of bot configs over several worker processes,
+each running a BotHost over its share, so a fleet uses every core.
+"""
+import multiprocessing
+from multiprocessing.connection import wait
+from hashlib import md5
+from os import cpu_count, getpid
+from threading import Thread, Lock, Event
+from time import monotonic
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.host import BotHost, config_name, find_configs
+from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+
+WORKERS_ALIVE = Metrics.gauge("tweetfeeder_fleet_workers_alive", "Fleet worker processes currently running")
+WORKER_RESTARTS = Metrics.counter("tweetfeeder_fleet_worker_restarts_total", "Fleet worker processes restarted, by shard")
+
+def shard_for(name: str, shards: int) -> int:
+    """
+    Rendezvous hashing: the shard whose hash with the name is highest.
+    Stable between runs and processes, and changing the number of shards
+    only moves the configs that must move.
+    """
+    return max(range(shards), key=lambda shard: md5("{}:{}".format(shard, name).encode('utf8')).digest())
+
+def assign(config_files: list, shards: int) -> dict:
+    ''' Maps each shard that gets any configs to its sorted list of configs '''
+    assignments = {}
+    for config_file in config_files:
+        assignments.setdefault(shard_for(config_name(config_file), shards), []).append(config_file)
+    return {shard: sorted(files) for shard, files in sorted(assignments.items())}
+
+def run_shard(shard, config_files, functionality, workers, flush_interval, reports, stop, report_interval):
+    """
+    Body of a worker process: hosts its bots, reporting on them through
+    the reports pipe until told to stop or the supervisor goes away.
+    """
+    Metrics.reset() # Don't report values inherited from the supervisor
+    host = BotHost(config_files, BotFunctions(functionality), workers, flush_interval, export_metrics=False)
+    try:
+        while True:
+            reports.send({
+                'shard': shard,
+                'pid': getpid(),
+                'bots': host.health(),
+                'metrics': Metrics.snapshot()
+            })
+            if stop.wait(report_interval):
+                break
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass # Supervisor gone, or deciding when to stop
+    finally:
+        host.shutdown()
+
+class Fleet:
+    """
+    Supervises worker processes, one per shard of the configs.
+    Workers that exit or stop reporting are restarted with exponential backoff.
+    Their health reports and metrics are aggregated here, metrics gaining a "shard" label.
+    """
+    STARTUP_PATIENCE = 120 # Seconds a new worker may take to send its first report
+    def __init__(self, configs, processes: int = None, functionality=BotFunctions.All,
+                 workers: int = 4, flush_interval: float = 5, report_interval: float = 10,
+                 restart_delay: float = 1, max_restart_delay: float = 60):
+        ''' Assigns configs (a directory or list of .ini files) to shards; nothing starts yet. '''
+        self.config_files = find_configs(configs) if isinstance(configs, str) else list(configs)
+        self.processes = processes or cpu_count() or 1
+        self.assignments = assign(self.config_files, self.processes)
+        self.functionality = int(functionality)
+        self.workers = workers
+        self.flush_interval = flush_interval
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self._stop = Event()
+        self._lock = Lock()
+        self._processes = {}
+        self._pipes = {}
+        self._stop_events = {}
+        self._last_seen = {}
+        self._restarts = {shard: 0 for shard in self.assignments}
+        self._restart_at = {}
+        self._reported = {}
+        self._monitor = None
+
+    def start(self, metrics_port: int = 0, metrics_filepath: str = None, metrics_interval: float = 60):
+        ''' Starts every worker and the monitoring thread, plus any aggregate metrics exporters. '''
+        Log.setup(type(self).__name__)
+        Log.enable_console_output()
+        for shard in self.assignments:
+            self._spawn(shard)
+        self._monitor = Thread(target=self._monitor_loop, name="FleetMonitor", daemon=True)
+        self._monitor.start()
+        if metrics_port:
+            Metrics.serve(metrics_port)
+        if metrics_filepath:
+            Metrics.start_file_export(metrics_filepath, metrics_interval)
+        Log.info("FLEET.start", "Running {} bots in {} processes".format(
+            len(self.config_files), len(self.assignments)
+        ))
+
+    def _spawn(self, shard):
+        """
+        Starts (or restarts) a shard's worker process.
+        Each worker gets its own pipe and stop event, so one being killed
+        mid-operation can't leave shared locks held for the others.
+        """
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        stop = multiprocessing.Event()
+        process = multiprocessing.Process(
+            target=run_shard, name="FleetWorker-{}".format(shard), daemon=True,
+            args=(
+                shard, self.assignments[shard], self.functionality, self.workers,
+                self.flush_interval, writer, stop, self.report_interval
+            )
+        )
+        process.start()
+        writer.close()
+        with self._lock:
+            self._processes[shard] = process
+            self._pipes[shard] = reader
+            self._stop_events[shard] = stop
+            self._last_seen[shard] = monotonic()
+        Log.debug("FLEET.spawn", "Worker {} (pid {}) hosts {} bots".format(
+            shard, process.pid, len(self.assignments[shard])
+        ))
+
+    def _monitor_loop(self):
+        ''' Collects reports and restarts workers until the fleet stops '''
+        while not self._stop.is_set():
+            self._collect(timeout=0.5)
+            self._check_workers()
+
+    def _collect(self, timeout=0):
+        ''' Takes every waiting report, blocking up to timeout for the first '''
+        with self._lock:
+            pipes = {reader: shard for shard, reader in self._pipes.items() if reader}
+        for reader in wait(list(pipes), timeout):
+            shard = pipes[reader]
+            try:
+                while reader.poll():
+                    report = reader.recv()
+                    Metrics.merge(report.pop('metrics'), shard=shard)
+                    with self._lock:
+                        self._last_seen[shard] = monotonic()
+                        self._reported[shard] = report
+            except (EOFError, OSError):
+                reader.close() # Worker exited; _check_workers restarts it
+                with self._lock:
+                    if self._pipes.get(shard) is reader:
+                        self._pipes[shard] = None
+
+    def _check_workers(self):
+        ''' Restarts workers that have exited or stopped reporting, after their backoff '''
+        now = monotonic()
+        with self._lock:
+            processes = dict(self._processes)
+        WORKERS_ALIVE.set(sum(process.is_alive() for process in processes.values()))
+        for shard, process in processes.items():
+            if self._stop.is_set():
+                return
+            if shard in self._restart_at:
+                if now >= self._restart_at[shard]:
+                    del self._restart_at[shard]
+                    self._spawn(shard)
+                continue
+            if process.is_alive():
+                patience = self.report_interval * 3
+                if self._reported.get(shard, {}).get('pid') != process.pid:
+                    patience = max(patience, self.STARTUP_PATIENCE) # Still loading its bots
+                if now - self._last_seen[shard] < patience:
+                    continue
+                Log.warning("FLEET.check", "Worker {} (pid {}) stopped reporting".format(shard, process.pid))
+                process.terminate()
+                process.join(5)
+            delay = min(self.restart_delay * 2 ** self._restarts[shard], self.max_restart_delay)
+            self._restarts[shard] += 1
+            self._restart_at[shard] = now + delay
+            WORKER_RESTARTS.inc(shard=shard)
+            Log.warning("FLEET.check", "Worker {} (pid {}) exited with {}; restarting in {}s".format(
+                shard, process.pid, process.exitcode, delay
+            ))
+
+    def health(self) -> dict:
+        ''' Latest state of every shard and its bots '''
+        now = monotonic()
+        with self._lock:
+            shards = {}
+            for shard, process in self._processes.items():
+                report = self._reported.get(shard, {})
+                shards[shard] = {
+                    'pid': process.pid,
+                    'alive': process.is_alive(),
+                    'restarts': self._restarts[shard],
+                    'seconds_since_report': round(now - self._last_seen[shard], 1),
+                    'bots': report.get('bots', {})
+                }
+        return {
+            'processes': len(shards),
+            'alive': sum(shard['alive'] for shard in shards.values()),
+            'bots': sum(len(shard['bots']) for shard in shards.values()),
+            'shards': shards
+        }
+
+    def wait(self, timeout: float = None) -> bool:
+        ''' Blocks until the fleet is shut down (or timeout passes) '''
+        return self._stop.wait(timeout)
+
+    def shutdown(self, timeout: float = 30):
+        ''' Asks every worker to shut its bots down, terminating those that take too long. '''
+        Log.info("FLEET.shutdown", "Stopping {} workers.".format(len(self._processes)))
+        self._stop.set()
+        if self._monitor:
+            self._monitor.join()
+        for shard, process in self._processes.items():
+            if process.is_alive():
+                self._stop_events[shard].set()
+        deadline = monotonic() + timeout
+        for shard, process in self._processes.items():
+            process.join(max(deadline - monotonic(), 0))
+            if process.is_alive():
+                Log.warning("FLEET.shutdown", "Terminating worker {} (pid {})".format(shard, process.pid))
+                process.terminate()
+                process.join()
+        self._collect()
+        Metrics.stop_file_export()
+        WORKERS_ALIVE.set(0)
+        return True
@@ -0,0 +1,249 @@
+"""
+Runs many TweetFeeder bots in one process,
+sharing a timer scheduler, API objects and a stats flusher.
+"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from itertools import count
+from os import path
+from threading import Condition, Event, Lock, Thread
+from time import monotonic
+from tweepy import API
+from tweetfeeder.bot import TweetFeederBot
+from tweetfeeder.exceptions import TweetFeederError, LoadConfigError
+from tweetfeeder.flags import BotFunctions
+from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+from tweetfeeder.tracing import Tracer
+
+class ScheduledTimer:
+    """
+    Stand-in for threading.Timer whose waiting is done by a shared Scheduler.
+    Like a Timer, its interval may be changed until it is started.
+    """
+    def __init__(self, scheduler, interval, function, args=None, kwargs=None):
+        ''' Prepares, but does not start, the timer '''
+        self.scheduler = scheduler
+        self.interval = interval
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.finished = Event()
+        self._started = False
+
+    def start(self):
+        ''' Queues the timer with the scheduler '''
+        if self._started:
+            raise RuntimeError("timers can only be started once")
+        self._started = True
+        self.scheduler.schedule(self)
+
+    def cancel(self):
+        ''' Stops the timer if it hasn't fired yet '''
+        self.finished.set()
+
+    def run(self):
+        ''' Called by a scheduler worker once the interval has passed '''
+        if not self.finished.is_set():
+            self.function(*self.args, **self.kwargs)
+        self.finished.set()
+
+class Scheduler:
+    ''' One thread that waits on every bot's timers and hands due ones to a worker pool. '''
+    def __init__(self, workers: int = 4):
+        ''' Starts the scheduling thread '''
+        self._heap = []
+        self._sequence = count()
+        self._cond = Condition()
+        self._running = True
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="SchedulerWorker")
+        self._thread = Thread(target=self._run, name="Scheduler", daemon=True)
+        self._thread.start()
+
+    def timer(self, interval, function, args=None, kwargs=None) -> ScheduledTimer:
+        ''' Creates a timer; same signature as threading.Timer '''
+        return ScheduledTimer(self, interval, function, args, kwargs)
+
+    def schedule(self, timer: ScheduledTimer):
+        ''' Queues a started timer '''
+        with self._cond:
+            heapq.heappush(self._heap, (monotonic() + max(timer.interval, 0), next(self._sequence), timer))
+            self._cond.notify()
+
+    @property
+    def pending(self) -> int:
+        ''' Number of timers waiting to fire (including cancelled ones not yet discarded) '''
+        return len(self._heap)
+
+    def _run(self):
+        ''' Waits for the earliest timer, then passes it to the pool '''
+        while True:
+            with self._cond:
+                while self._running and (not self._heap or self._heap[0][0] > monotonic()):
+                    self._cond.wait(self._heap[0][0] - monotonic() if self._heap else None)
+                if not self._running:
+                    return
+                _, _, timer = heapq.heappop(self._heap)
+            if not timer.finished.is_set():
+                self._pool.submit(timer.run)
+
+    def stop(self):
+        ''' Stops scheduling; timers that haven't fired never will. '''
+        with self._cond:
+            self._running = False
+            for _, _, timer in self._heap:
+                timer.cancel()
+            self._heap.clear()
+            self._cond.notify()
+        self._pool.shutdown(wait=False)
+
+class StatsFlusher:
+    ''' Writes every dirty Stats object from one thread, at most once per interval. '''
+    def __init__(self, interval: float = 5):
+        ''' Starts the flushing thread '''
+        self.interval = interval
+        self._dirty = set()
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="StatsFlusher", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, stats):
+        ''' Requests that stats be written on the next flush '''
+        with self._lock:
+            self._dirty.add(stats)
+
+    def flush_all(self):
+        ''' Writes everything that is dirty right now '''
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for stats in dirty:
+            try:
+                stats.flush()
+            except OSError as e:
+                Log.error("HOST.flush", "Couldn't save stats: " + str(e))
+
+    def _run(self):
+        ''' Flush loop '''
+        while not self._stop.wait(self.interval):
+            self.flush_all()
+
+    def stop(self):
+        ''' Stops the thread after a final flush '''
+        self._stop.set()
+        self._thread.join()
+        self.flush_all()
+
+class ApiPool:
+    """
+    Shares tweepy API objects between components that use the same credentials and options.
+    (Tweepy 3 opens its HTTP session per call, so sockets themselves aren't pooled.)
+    """
+    def __init__(self):
+        ''' Empty pool '''
+        self._apis = {}
+        self._lock = Lock()
+
+    def get(self, authorization, **options) -> API:
+        ''' Returns the shared API for these credentials and options '''
+        key = (
+            getattr(authorization, 'consumer_key', None),
+            getattr(authorization, 'access_token', None),
+            tuple(sorted(options.items()))
+        )
+        with self._lock:
+            if key not in self._apis:
+                self._apis[key] = API(authorization, **options)
+            return self._apis[key]
+
+def config_name(config_file: str) -> str:
+    ''' Name of the bot run from a config file (its filename without extension) '''
+    return path.splitext(path.basename(config_file))[0]
+
+def export_settings(config) -> tuple:
+    ''' A config's metrics and tracing settings, which a host applies once for all its bots '''
+    return (
+        config.metrics_filepath, config.metrics_port, config.metrics_interval,
+        config.trace_sample_rate, config.trace_buffer
+    )
+
+def find_configs(config_dir: str) -> list:
+    ''' Sorted .ini configs in a directory '''
+    config_files = sorted(glob(path.join(config_dir, "*.ini")))
+    if not config_files:
+        raise LoadConfigError("No .ini configs found in " + config_dir)
+    return config_files
+
+class BotHost:
+    ''' Runs a TweetFeederBot for each .ini config in a directory (or list of configs), all in this process. '''
+    def __init__(self, configs, functionality=BotFunctions.All, workers: int = 4,
+                 flush_interval: float = 5, export_metrics: bool = True):
+        """
+        Loads every config, skipping (and logging) the ones that fail.
+        Metrics exporters and tracing are process-wide, so they're set up once, as the
+        first bot's config asks. Without export_metrics, no exporters start (a Fleet exports them instead).
+        """
+        self.export_metrics = export_metrics
+        self._stopped = Event()
+        Log.setup(type(self).__name__)
+        Log.enable_console_output()
+        self.scheduler = Scheduler(workers)
+        self.flusher = StatsFlusher(flush_interval)
+        self.api_pool = ApiPool()
+        self.bots = {}
+        config_files = find_configs(configs) if isinstance(configs, str) else list(configs)
+        for config_file in config_files:
+            name = config_name(config_file)
+            try:
+                self.bots[name] = TweetFeederBot(functionality, config_file, host=self, name=name)
+            except TweetFeederError:
+                pass # Already logged
+        Log.info("HOST.init", "Running {} of {} bots".format(len(self.bots), len(config_files)))
+        if self.bots:
+            self.enable_metrics(next(iter(self.bots.values())).config)
+
+    def enable_metrics(self, config):
+        ''' Starts the metrics exporters and tracing that a config asks for, for every bot '''
+        if self.export_metrics:
+            if config.metrics_filepath:
+                Metrics.start_file_export(config.metrics_filepath, config.metrics_interval)
+            if config.metrics_port:
+                Metrics.serve(config.metrics_port)
+        Tracer.configure(config.trace_sample_rate / 100, config.trace_buffer)
+        for name, bot in self.bots.items():
+            if export_settings(bot.config) != export_settings(config):
+                Log.warning("HOST.metrics", "Ignoring {}'s metrics and tracing settings; one set is used per host".format(name))
+
+    def timer(self, interval, function, args=None, kwargs=None) -> ScheduledTimer:
+        ''' Timer factory handed to each bot's components '''
+        return self.scheduler.timer(interval, function, args, kwargs)
+
+    def health(self) -> dict:
+        ''' Short, picklable status of each bot '''
+        health = {}
+        for name, bot in self.bots.items():
+            health[name] = {
+                'tweeting': bot.tweet_loop.is_running(),
+                'listening': bool(bot.userstream.running),
+                'feed_index': bot.tweet_loop.current_index,
+                'ingest': bot.userstream.listener.ingest.metrics()
+            }
+        return health
+
+    def wait(self, timeout: float = None) -> bool:
+        ''' Blocks until the host is shut down (or timeout passes); the scheduler's threads won't keep the process alive '''
+        return self._stopped.wait(timeout)
+
+    def shutdown(self):
+        ''' Shuts down every bot, then the shared services. '''
+        for name, bot in self.bots.items():
+            with Log.scope(bot.log_namespace):
+                bot.shutdown()
+        self.scheduler.stop()
+        self.flusher.stop()
+        if self.export_metrics:
+            Metrics.stop_file_export()
+        Log.info("HOST.shutdown", "All bots stopped.")
+        self._stopped.set()
+        return True
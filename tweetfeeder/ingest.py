@@ -0,0 +1,158 @@
+"""
+Bounded hand-off between the userstream reader thread
+and the (potentially slow) stream event handlers.
+"""
+from collections import deque, Counter
+from threading import Condition, Thread, current_thread
+from time import monotonic
+from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+
+DROPPED = Metrics.counter("tweetfeeder_stream_events_dropped_total", "Stream data dropped by a full ingest queue, by type")
+LAG = Metrics.histogram("tweetfeeder_ingest_lag_seconds", "Time stream data waited for an ingest worker")
+
+class IngestQueue:
+    """
+    Bounded queue of stream data that is drained by worker threads.
+    With zero workers, every item is handled inline by the putting thread.
+
+    Overflow policies, used when the queue is full:
+        block           The reader thread waits for a free slot.
+        drop_oldest     The oldest queued item is discarded.
+        drop_by_type    The oldest queued item of a droppable kind is discarded;
+                        failing that, a droppable incoming item is discarded.
+                        Anything else blocks.
+    """
+    POLICIES = ['block', 'drop_oldest', 'drop_by_type']
+
+    def __init__(self, handler, maxsize=1000, policy='block', droppable=None, workers=0):
+        ''' Prepares the queue; worker threads start on the first put. '''
+        if policy not in IngestQueue.POLICIES:
+            raise ValueError("Unknown overflow policy: {}".format(policy))
+        self.handler = handler
+        self.maxsize = max(maxsize, 1)
+        self.policy = policy
+        self.droppable = set(droppable or [])
+        self.workers = workers
+        self._items = deque()
+        self._cond = Condition()
+        self._threads = []
+        self._running = False
+        # Lag metrics
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = Counter()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def depth(self) -> int:
+        ''' Number of items waiting for a worker. '''
+        return len(self._items)
+
+    def metrics(self) -> dict:
+        ''' Snapshot of queue depth, throughput and lag (in seconds). '''
+        with self._cond:
+            return {
+                'depth': len(self._items),
+                'enqueued': self.enqueued,
+                'processed': self.processed,
+                'dropped': dict(self.dropped),
+                'last_lag': self.last_lag,
+                'max_lag': self.max_lag
+            }
+
+    def put(self, kind: str, item):
+        ''' Queues an item of the given kind, applying the overflow policy if full. '''
+        if not self.workers:
+            self.enqueued += 1
+            self.handler(item)
+            self.processed += 1
+            return True
+        self.start()
+        with self._cond:
+            while len(self._items) >= self.maxsize:
+                if self.policy == 'drop_oldest':
+                    self._drop(0)
+                elif self.policy == 'drop_by_type' and self._drop_droppable():
+                    pass
+                elif self.policy == 'drop_by_type' and kind in self.droppable:
+                    self.dropped[kind] += 1
+                    DROPPED.inc(type=kind)
+                    return False
+                else:
+                    self._cond.wait()
+            self._items.append((kind, monotonic(), item))
+            self.enqueued += 1
+            self._cond.notify_all()
+        return True
+
+    def start(self):
+        ''' Starts worker threads if they aren't already running. '''
+        with self._cond:
+            if self._running or not self.workers:
+                return
+            self._running = True
+            self._threads = [
+                Thread(target=self._work, name="IngestWorker-{}".format(i), daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        Log.debug("ING.start", "Started {} ingest workers".format(self.workers))
+
+    def stop(self, drain=True, timeout=None):
+        ''' Stops the workers, optionally letting them empty the queue first. '''
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            if not drain:
+                for kind, _, _ in self._items:
+                    self.dropped[kind] += 1
+                self._items.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread is not current_thread(): # e.g. a shutdown command handled by a worker
+                thread.join(timeout)
+        self._threads = []
+
+    def _drop(self, position):
+        ''' Discards a queued item; caller must hold the condition. '''
+        kind = self._items[position][0]
+        del self._items[position]
+        self.dropped[kind] += 1
+        DROPPED.inc(type=kind)
+        Log.debug("ING.drop", "Queue full; dropped a {} item".format(kind))
+
+    def _drop_droppable(self):
+        ''' Discards the oldest queued item of a droppable kind, if any. '''
+        for position, (kind, _, _) in enumerate(self._items):
+            if kind in self.droppable:
+                self._drop(position)
+                return True
+        return False
+
+    def _work(self):
+        ''' Worker loop: pop items and hand them to the handler. '''
+        while True:
+            with self._cond:
+                while not self._items and self._running:
+                    self._cond.wait()
+                if not self._items:
+                    return # Stopped and drained
+                kind, queued_at, item = self._items.popleft()
+                self._cond.notify_all()
+                self.last_lag = monotonic() - queued_at
+                self.max_lag = max(self.max_lag, self.last_lag)
+            LAG.observe(self.last_lag)
+            self._handle(item)
+
+    def _handle(self, item):
+        ''' Runs the handler, keeping worker threads alive through errors. '''
+        try:
+            self.handler(item)
+        except Exception as e: # pylint: disable=broad-except
+            Log.error("ING.handle", "Handler failed: {}".format(repr(e)))
+        with self._cond:
+            self.processed += 1
@@ -0,0 +1,257 @@
+"""
+Job table for master commands.
+Commands from the master account run on worker threads instead of the
+userstream thread, so a slow one (e.g. sync_stats) doesn't hold up stream events.
+"""
+from collections import deque
+from concurrent.futures import wait
+from itertools import count
+from threading import Condition, Event, Thread, current_thread, local
+from time import time
+from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+from tweetfeeder.exceptions import TweetFeederError
+
+COMMAND_JOBS = Metrics.counter("tweetfeeder_command_jobs_total", "Master commands finished, by command and status")
+JOBS_ACTIVE = Metrics.gauge("tweetfeeder_command_jobs_active", "Master commands queued or running")
+
+_CURRENT = local()
+
+class Job:
+    """
+    One master command, from queued to finished.
+    A running command can report progress with set_total / advance, and should
+    stop early once cancelled is True; wait_for does both for a batch of Futures.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    POLL = 0.5 # Seconds between cancellation checks in wait_for
+
+    def __init__(self, job_id: int, text: str):
+        ''' A queued command '''
+        self.id = job_id
+        self.text = text
+        self.status = Job.QUEUED
+        self.error = None
+        self.done = 0
+        self.total = None
+        self.queued_at = time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = Event()
+        self._finished = Event()
+
+    @staticmethod
+    def current():
+        ''' The job running on this thread, if any '''
+        return getattr(_CURRENT, 'job', None)
+
+    @property
+    def name(self) -> str:
+        ''' The command's name, without its arguments '''
+        words = self.text.split()
+        return words[0] if words else ""
+
+    @property
+    def cancelled(self) -> bool:
+        ''' Whether the job has been asked to stop '''
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        ''' Whether the job is done, failed or cancelled '''
+        return self._finished.is_set()
+
+    def set_total(self, total: int):
+        ''' Steps the command expects to take '''
+        self.total = total
+
+    def advance(self, steps: int = 1):
+        ''' Records progress '''
+        self.done += steps
+
+    def wait_for(self, futures) -> bool:
+        ''' Waits for the futures, cancelling those left if the job is cancelled; False if it was '''
+        pending = set(futures)
+        while pending:
+            if self.cancelled:
+                for future in pending:
+                    future.cancel()
+                return False
+            pending = wait(pending, Job.POLL).not_done
+        return True
+
+    def wait(self, timeout: float = None) -> bool:
+        ''' Waits for the job to finish '''
+        return self._finished.wait(timeout)
+
+    def describe(self) -> str:
+        ''' One line summary for the jobs command '''
+        line = "#{} {}: {}".format(self.id, self.text, self.status)
+        if self.total is not None:
+            line += ", {}/{}".format(self.done, self.total)
+        elif self.done:
+            line += ", {} done".format(self.done)
+        if self.started_at:
+            line += ", {:.0f}s".format((self.finished_at or time()) - self.started_at)
+        if self.error:
+            line += " ({})".format(self.error)
+        return line
+
+class JobTable:
+    """
+    Runs commands on worker threads, in the order they arrive, each as a numbered Job.
+    Commands named in inline run on the submitting thread instead, without a job,
+    so that e.g. jobs and cancel answer while the workers are busy.
+    With zero workers, every command runs inline.
+    """
+    KEPT = 20 # Finished jobs remembered for the jobs command
+
+    def __init__(self, cmd_method, workers: int = 2, inline=None):
+        ''' Prepares the table; worker threads start on the first submit. '''
+        self.cmd_method = cmd_method
+        self.workers = workers
+        self.inline = set(inline or [])
+        self._log_namespace = Log.current_namespace()
+        self._ids = count(1)
+        self._jobs = deque() # Every job, oldest first
+        self._queue = deque()
+        self._cond = Condition()
+        self._threads = []
+        self._running = False
+
+    def submit(self, text: str):
+        ''' Queues a command; returns its Job, or None if it ran inline '''
+        words = text.split()
+        if not self.workers or (words and words[0] in self.inline):
+            self.cmd_method(text)
+            return None
+        self.start()
+        with self._cond:
+            job = Job(next(self._ids), text)
+            self._jobs.append(job)
+            self._forget_finished()
+            self._queue.append(job)
+            JOBS_ACTIVE.inc()
+            self._cond.notify_all()
+        Log.debug("JOB.submit", "Queued job #{}: {}".format(job.id, text))
+        return job
+
+    def jobs(self) -> list:
+        ''' Recent jobs, oldest first '''
+        with self._cond:
+            return list(self._jobs)
+
+    def get(self, job_id: int):
+        ''' The job with the given ID, if it's still remembered '''
+        with self._cond:
+            return next((job for job in self._jobs if job.id == job_id), None)
+
+    def cancel(self, job_id: int):
+        """
+        Cancels a queued job, or asks a running one to stop.
+        Returns the job, or None if there's no such job.
+        """
+        with self._cond:
+            job = next((job for job in self._jobs if job.id == job_id), None)
+            if job is None or job.finished:
+                return job
+            job._cancel.set()
+            if job.status == Job.QUEUED:
+                self._queue.remove(job)
+                self._finish(job, Job.CANCELLED)
+        Log.info("JOB.cancel", "Cancelling job #{}: {}".format(job.id, job.text))
+        return job
+
+    def join(self, timeout: float = None) -> bool:
+        ''' Waits for every job submitted so far to finish '''
+        for job in self.jobs():
+            if not job.wait(timeout):
+                return False
+        return True
+
+    def start(self):
+        ''' Starts worker threads if they aren't already running. '''
+        with self._cond:
+            if self._running or not self.workers:
+                return
+            self._running = True
+            self._threads = [
+                Thread(target=self._work, name="CommandWorker-{}".format(i), daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        Log.debug("JOB.start", "Started {} command workers".format(self.workers))
+
+    def stop(self, timeout: float = None):
+        ''' Cancels queued jobs and any running elsewhere than this thread, then stops the workers. '''
+        current = Job.current()
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            while self._queue:
+                job = self._queue.popleft()
+                job._cancel.set()
+                self._finish(job, Job.CANCELLED)
+            for job in self._jobs:
+                if job.status == Job.RUNNING and job is not current:
+                    job._cancel.set()
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread is not current_thread(): # e.g. a shutdown command
+                thread.join(timeout)
+        self._threads = []
+
+    def _forget_finished(self):
+        ''' Drops the oldest finished jobs beyond KEPT; caller must hold the condition. '''
+        finished = sum(1 for job in self._jobs if job.finished)
+        for job in list(self._jobs):
+            if finished <= JobTable.KEPT:
+                break
+            if job.finished:
+                self._jobs.remove(job)
+                finished -= 1
+
+    def _finish(self, job: Job, status: str):
+        ''' Records how a job ended; caller must hold the condition. '''
+        job.status = status
+        job.finished_at = time()
+        job._finished.set()
+        JOBS_ACTIVE.dec()
+        COMMAND_JOBS.inc(command=job.name, status=status)
+
+    def _work(self):
+        ''' Worker loop: run queued jobs until stopped. '''
+        while True:
+            with self._cond:
+                while not self._queue and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                job = self._queue.popleft()
+                job.status = Job.RUNNING
+                job.started_at = time()
+            self._run(job)
+
+    def _run(self, job: Job):
+        ''' Runs one command, keeping the worker alive through its errors. '''
+        status = Job.DONE
+        _CURRENT.job = job
+        try:
+            with Log.scope(self._log_namespace):
+                self.cmd_method(job.text)
+        except TweetFeederError as e: # Already logged, e.g. InvalidCommand
+            status, job.error = Job.FAILED, str(e)
+        except Exception as e: # pylint: disable=broad-except
+            Log.error("JOB.run", "Job #{} ({}) failed: {}".format(job.id, job.text, repr(e)))
+            status, job.error = Job.FAILED, repr(e)
+        finally:
+            _CURRENT.job = None
+        with self._cond:
+            self._finish(job, Job.CANCELLED if job.cancelled and status == Job.DONE else status)
+        Log.debug("JOB.run", job.describe())
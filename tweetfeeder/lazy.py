@@ -0,0 +1,29 @@
+"""
+Lazy attributes for package modules, so that importing a package
+doesn't import everything it exports (tweepy and the bot in particular).
+Works by swapping the module's class, as module __getattr__ needs Python 3.7.
+"""
+import sys
+from importlib import import_module
+from types import ModuleType
+
+class LazyModule(ModuleType):
+    ''' Module type that imports the module behind a lazy attribute when it's first used '''
+    def __getattr__(self, name):
+        ''' Called only for attributes that haven't been loaded yet '''
+        lazy = self.__dict__.get('_lazy_attributes', {})
+        if name not in lazy:
+            raise AttributeError("module {!r} has no attribute {!r}".format(self.__name__, name))
+        value = getattr(import_module(lazy[name]), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        ''' Lists lazy attributes along with loaded ones '''
+        return sorted(set(super(LazyModule, self).__dir__()) | set(self.__dict__.get('_lazy_attributes', {})))
+
+def lazy_attributes(module_name: str, attributes: dict):
+    ''' Makes the named module load attributes ({name: module that defines it}) on first access '''
+    module = sys.modules[module_name]
+    module._lazy_attributes = attributes
+    module.__class__ = LazyModule
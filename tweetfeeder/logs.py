@@ -1,7 +1,13 @@
 ''' General logging wrapper for modules '''
 import logging
+from contextlib import contextmanager
+from threading import local
 from datetime import datetime, timedelta
 from time import time
+from .metrics import Metrics
+
+LOG_RECORDS = Metrics.counter("tweetfeeder_log_records_total", "Warnings and errors logged, by level")
+ALERTS_DROPPED = Metrics.counter("tweetfeeder_dm_alerts_dropped_total", "Log records kept from the master's DMs by the speed limit")
 
 class Log:
     ''' Wrapper for LOGGER '''
@@ -48,6 +54,7 @@ class Log:
 
     _handlers = {}
     _logger = logging.getLogger('Untitled: Use setup()')
+    _scope = local()
 
     @staticmethod
     def setup(name, level=logging.DEBUG):
@@ -56,6 +63,37 @@ class Log:
         if Log._logger.level == logging.NOTSET:
             Log._logger.setLevel(level)
 
+    @staticmethod
+    def _current() -> logging.Logger:
+        ''' The logger used by this thread: its namespace's, or the main logger '''
+        return getattr(Log._scope, 'logger', None) or Log._logger
+
+    @staticmethod
+    def namespace(name) -> str:
+        ''' Full logger name for a namespace (e.g. one bot) under the main logger '''
+        return "{}.{}".format(Log._logger.name, name)
+
+    @staticmethod
+    def current_namespace():
+        ''' Logger name of this thread's namespace, or None if it uses the main logger '''
+        logger = getattr(Log._scope, 'logger', None)
+        return logger.name if logger else None
+
+    @staticmethod
+    @contextmanager
+    def scope(namespace=None):
+        """
+        Routes this thread's logging (including handler changes) to the given
+        namespace's logger for the duration of the with-block.
+        Records still propagate to the main logger's handlers.
+        """
+        previous = getattr(Log._scope, 'logger', None)
+        Log._scope.logger = logging.getLogger(namespace) if namespace else None
+        try:
+            yield
+        finally:
+            Log._scope.logger = previous
+
     @staticmethod
     def enable_console_output(enabled=True):
         ''' Adds or removes a stderr stream handler with logger '''
@@ -103,7 +141,7 @@ class Log:
         if enabled:
             debug_handler = logging.StreamHandler(new_stream or Log.DebugStream())
             debug_handler.setLevel(logging.DEBUG)
-            Log._logger.setLevel(logging.DEBUG)
+            Log._current().setLevel(logging.DEBUG)
             Log._enable_handler('debug_output', enabled, debug_handler)
             print("Debug logging enabled.")
         else:
@@ -115,21 +153,23 @@ class Log:
         Updates the status of a handler with the logger,
         and also updates the handler if given a new_handler.
         """
-        handler, is_enabled = Log._handlers.get(name, (None, False))
+        logger = Log._current()
+        handlers = Log._handlers.setdefault(logger.name, {})
+        handler, is_enabled = handlers.get(name, (None, False))
         # Temporarily detach current handler from logger
         if is_enabled:
-            Log._logger.removeHandler(handler)
+            logger.removeHandler(handler)
         # Switch handler if new one is given
         if new_handler:
             if handler:
                 handler.close()
             handler = new_handler
         # Update handler in dictionary
-        Log._handlers[name] = (handler, enabled)
+        handlers[name] = (handler, enabled)
 
         if enabled:
             # Reattach or establish handler and return it
-            Log._logger.addHandler(handler)
+            logger.addHandler(handler)
             return handler
         else:
             # The handler was disabled, but return whatever
@@ -139,22 +179,24 @@ class Log:
     @staticmethod
     def info(place, msg, *args, **kwargs):
         ''' Normal reporting '''
-        Log._logger.info(Log._msg(place, msg), *args, **kwargs)
+        Log._current().info(Log._msg(place, msg), *args, **kwargs)
 
     @staticmethod
     def warning(place, msg, *args, **kwargs):
         ''' Problem reporting '''
-        Log._logger.warning(Log._msg(place, msg), *args, *kwargs)
+        LOG_RECORDS.inc(level='warning')
+        Log._current().warning(Log._msg(place, msg), *args, *kwargs)
 
     @staticmethod
     def error(place, msg, *args, **kwargs):
         ''' Exception reporting '''
-        Log._logger.error(Log._msg(place, msg), *args, *kwargs)
+        LOG_RECORDS.inc(level='error')
+        Log._current().error(Log._msg(place, msg), *args, *kwargs)
 
     @staticmethod
     def debug(place, msg, *args, **kwargs):
         ''' Debug info '''
-        Log._logger.debug(Log._msg(place, msg), *args, *kwargs)
+        Log._current().debug(Log._msg(place, msg), *args, *kwargs)
 
     @staticmethod
     def _msg(place, msg):
@@ -178,17 +220,18 @@ class LogSender:
 
 class DripFilter(logging.Filter):
     """Restricts too verbose logging by establishing a logging speed limit by level.
-    KeyErrors are understood to be unrestricted"""
+    KeyErrors are understood to be unrestricted.
+    Each filter keeps its own limit, so hosted bots don't use up each other's alerts."""
     TICK_SPEED = {
         logging.DEBUG: timedelta(days=1),
         logging.INFO: timedelta(seconds=1),
         logging.WARNING: timedelta(seconds=1)
     }
-    LAST_SEND = {
-        logging.DEBUG: datetime(year=1989, month=1, day=1),
-        logging.INFO: datetime(year=1989, month=1, day=1),
-        logging.WARNING: datetime(year=1989, month=1, day=1)
-    }
+
+    def __init__(self, name=''):
+        ''' Nothing has been sent yet '''
+        super().__init__(name)
+        self.last_send = dict.fromkeys(DripFilter.TICK_SPEED, datetime(year=1989, month=1, day=1))
 
     def filter(self, record):
         """Returns true if the record text is substantial and
@@ -202,13 +245,15 @@ class DripFilter(logging.Filter):
 
         okay = False
         try:
-            nxtime = DripFilter.LAST_SEND[lvl] + DripFilter.TICK_SPEED[lvl]
+            nxtime = self.last_send[lvl] + DripFilter.TICK_SPEED[lvl]
             if nxtime < datetime.now():
                 okay = True
         except KeyError:
             okay = True
 
         if okay:
-            DripFilter.LAST_SEND[lvl] = datetime.now()
+            self.last_send[lvl] = datetime.now()
+        else:
+            ALERTS_DROPPED.inc()
 
         return okay
@@ -0,0 +1,253 @@
+'''
+Process-wide counters, gauges and histograms,
+exported in the Prometheus text format to a file or a loopback HTTP endpoint.
+'''
+from bisect import bisect_left
+from contextlib import contextmanager
+from os import replace
+from threading import Lock, Thread, Event
+from time import perf_counter
+
+class Metric:
+    ''' Base class for a named metric with optional labels. '''
+    TYPE = "untyped"
+
+    def __init__(self, name, description):
+        ''' Prepares an empty set of labelled values '''
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(labels: dict) -> tuple:
+        ''' Turns keyword labels into a hashable, ordered key '''
+        return tuple(sorted(labels.items()))
+
+    @staticmethod
+    def _label_text(key: tuple, extra: str = "") -> str:
+        ''' Formats a label key as {a="b",c="d"} '''
+        parts = ['{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in key]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def value(self, **labels):
+        ''' Returns the current value for the given labels '''
+        return self._values.get(Metric._key(labels), 0)
+
+    def lines(self) -> list:
+        ''' Sample lines in the Prometheus text format '''
+        with self._lock:
+            return [
+                "{}{} {}".format(self.name, Metric._label_text(key), value)
+                for key, value in sorted(self._values.items())
+            ]
+
+class Counter(Metric):
+    ''' A value that only goes up. '''
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        ''' Adds amount to the labelled value '''
+        key = Metric._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    ''' A value that can be set, raised or lowered. '''
+    TYPE = "gauge"
+
+    def set(self, value, **labels):
+        ''' Overwrites the labelled value '''
+        with self._lock:
+            self._values[Metric._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        ''' Adds amount to the labelled value '''
+        key = Metric._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        ''' Subtracts amount from the labelled value '''
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    ''' Counts observations into cumulative buckets, tracking their sum and count. '''
+    TYPE = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+    def __init__(self, name, description, buckets=None):
+        ''' Fixes the bucket boundaries '''
+        super(Histogram, self).__init__(name, description)
+        self.buckets = tuple(sorted(buckets or Histogram.DEFAULT_BUCKETS))
+
+    def observe(self, value, **labels):
+        ''' Records one observation '''
+        key = Metric._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0, 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def value(self, **labels):
+        ''' Returns (sum, count) for the given labels '''
+        _, total, count = self._values.get(Metric._key(labels), (None, 0.0, 0))
+        return total, count
+
+    @contextmanager
+    def time(self, **labels):
+        ''' Observes the duration of the with-block in seconds '''
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, **labels)
+
+    def lines(self) -> list:
+        ''' Bucket, sum and count lines in the Prometheus text format '''
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append("{}_bucket{} {}".format(
+                        self.name, Metric._label_text(key, 'le="{}"'.format(bound)), cumulative
+                    ))
+                lines.append("{}_sum{} {}".format(self.name, Metric._label_text(key), total))
+                lines.append("{}_count{} {}".format(self.name, Metric._label_text(key), count))
+        return lines
+
+class Metrics:
+    ''' Process-wide metric registry and exporters, used statically like Log. '''
+    _registry = {}
+    _lock = Lock()
+    _server = None
+    _file_export = None
+
+    @staticmethod
+    def _get(cls, name, description, **kwargs):
+        ''' Returns the registered metric, creating it on first use '''
+        with Metrics._lock:
+            metric = Metrics._registry.get(name)
+            if metric is None:
+                metric = cls(name, description, **kwargs)
+                Metrics._registry[name] = metric
+            return metric
+
+    @staticmethod
+    def counter(name, description="") -> Counter:
+        ''' Gets or creates a Counter '''
+        return Metrics._get(Counter, name, description)
+
+    @staticmethod
+    def gauge(name, description="") -> Gauge:
+        ''' Gets or creates a Gauge '''
+        return Metrics._get(Gauge, name, description)
+
+    @staticmethod
+    def histogram(name, description="", buckets=None) -> Histogram:
+        ''' Gets or creates a Histogram '''
+        return Metrics._get(Histogram, name, description, buckets=buckets)
+
+    @staticmethod
+    def reset():
+        ''' Zeroes every metric; mostly for tests '''
+        with Metrics._lock:
+            for metric in Metrics._registry.values():
+                with metric._lock:
+                    metric._values.clear()
+
+    @staticmethod
+    def snapshot() -> list:
+        ''' Picklable copy of every metric, for merging into another process's registry '''
+        with Metrics._lock:
+            metrics = list(Metrics._registry.values())
+        snapshot = []
+        for metric in metrics:
+            with metric._lock:
+                values = [
+                    (key, (list(value[0]),) + value[1:] if isinstance(metric, Histogram) else value)
+                    for key, value in metric._values.items()
+                ]
+            snapshot.append((metric.TYPE, metric.name, metric.description, getattr(metric, 'buckets', None), values))
+        return snapshot
+
+    @staticmethod
+    def merge(snapshot: list, **labels):
+        ''' Overwrites this registry's values with a snapshot's, adding labels (e.g. shard=1) to each '''
+        types = {cls.TYPE: cls for cls in (Counter, Gauge, Histogram)}
+        for type_name, name, description, buckets, values in snapshot:
+            cls = types.get(type_name)
+            if cls is None:
+                continue
+            kwargs = {'buckets': buckets} if cls is Histogram else {}
+            metric = Metrics._get(cls, name, description, **kwargs)
+            with metric._lock:
+                for key, value in values:
+                    metric._values[Metric._key(dict(key, **labels))] = value
+
+    @staticmethod
+    def export_text() -> str:
+        ''' Renders every metric in the Prometheus text exposition format '''
+        with Metrics._lock:
+            metrics = sorted(Metrics._registry.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.description or metric.name))
+            lines.append("# TYPE {} {}".format(metric.name, metric.TYPE))
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def write_file(filepath):
+        ''' Writes export_text() to a file, replacing it atomically '''
+        with open(filepath + ".tmp", 'w', encoding='utf8') as outfile:
+            outfile.write(Metrics.export_text())
+        replace(filepath + ".tmp", filepath)
+
+    @staticmethod
+    def start_file_export(filepath, interval=60):
+        ''' Rewrites the metrics file every interval seconds in a daemon thread '''
+        Metrics.stop_file_export()
+        stop = Event()
+        def export_loop():
+            while not stop.wait(interval):
+                try:
+                    Metrics.write_file(filepath)
+                except OSError:
+                    pass # Try again next interval
+        Thread(target=export_loop, name="MetricsFileExport", daemon=True).start()
+        Metrics._file_export = (filepath, stop)
+
+    @staticmethod
+    def stop_file_export():
+        ''' Stops periodic file export, writing the file one last time '''
+        if Metrics._file_export:
+            filepath, stop = Metrics._file_export
+            stop.set()
+            Metrics._file_export = None
+            Metrics.write_file(filepath)
+
+    @staticmethod
+    def serve(port, host="127.0.0.1"):
+        ''' Serves export_text() at http://host:port/metrics from a daemon thread '''
+        if Metrics._server:
+            if Metrics._server.server_address[1] == port:
+                return Metrics._server
+            Metrics.stop_serving()
+        from http.server import HTTPServer # Imported here as it's slow to import and rarely used
+        from tweetfeeder.metrics_server import MetricsRequestHandler
+        Metrics._server = HTTPServer((host, port), MetricsRequestHandler)
+        Thread(target=Metrics._server.serve_forever, name="MetricsHTTP", daemon=True).start()
+        return Metrics._server
+
+    @staticmethod
+    def stop_serving():
+        ''' Shuts down the HTTP endpoint '''
+        if Metrics._server:
+            Metrics._server.shutdown()
+            Metrics._server.server_close()
+            Metrics._server = None
@@ -0,0 +1,21 @@
+''' HTTP endpoint for Metrics.serve, kept apart so importing metrics doesn't import http.server. '''
+from http.server import BaseHTTPRequestHandler
+from tweetfeeder.metrics import Metrics
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    ''' Answers GET /metrics with the registry's text export. '''
+    def do_GET(self):
+        ''' Only /metrics exists '''
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = Metrics.export_text().encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        ''' Keep scrapes out of stderr '''
+        pass
@@ -0,0 +1,203 @@
+"""
+Durable outbound tweet queue.
+Posts wait on disk until the API accepts them, retried with exponential backoff,
+so a Twitter outage delays tweets instead of losing them.
+"""
+from concurrent.futures import CancelledError
+from threading import Timer, RLock
+from time import time
+from random import uniform
+from tweepy.error import TweepError, RateLimitError
+from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+from tweetfeeder.tracing import Tracer
+from tweetfeeder.ratelimit import ApiScheduler, Priority
+from tweetfeeder.file_io.models import Stats
+from tweetfeeder.file_io.utils import FileIO
+
+TWEETS_POSTED = Metrics.counter("tweetfeeder_tweets_posted_total", "Tweets published, by mode")
+TWEETS_FAILED = Metrics.counter("tweetfeeder_tweets_failed_total", "Tweets the API failed to publish")
+TWEETS_RETRIED = Metrics.counter("tweetfeeder_tweets_retried_total", "Failed posts scheduled for another try")
+OUTBOX_DEPTH = Metrics.gauge("tweetfeeder_outbox_depth", "Posts waiting in the outbox")
+
+class Outbox:
+    """
+    First in, first out queue of posts, each a {title, index, text, reply_to, attempts, next_try} dict.
+    A post that fails holds back the ones after it, so a chain is published in order
+    and each of its tweets can reply to the one before.
+    Saved to filepath (if given) whenever it changes and the stats are being saved.
+    A post the rate limit scheduler defers stays first in line, without blocking the caller,
+    until the scheduler makes the call and the outbox is flushed again.
+    """
+    PERMANENT_ERRORS = (186, 187) # Status too long, duplicate status: retrying won't help
+    SENT_KEPT = 20 # Status IDs remembered for chained replies
+
+    def __init__(self, api, stats: Stats, filepath: str = None, timer_factory=None,
+                 retry_base_delay: int = 30, retry_max_delay: int = 3600, retry_max_attempts: int = 10,
+                 api_scheduler: ApiScheduler = None):
+        ''' Loads the posts left over from the last session, without sending them yet '''
+        self.api = api
+        self.stats = stats
+        self.filepath = filepath
+        self.timer_factory = timer_factory or Timer
+        self.api_scheduler = api_scheduler or ApiScheduler(self.timer_factory)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_max_attempts = retry_max_attempts
+        self._log_namespace = Log.current_namespace()
+        self._lock = RLock()
+        self._timer = None
+        self._stopped = False
+        self._in_flight = None # Future of the first post's deferred API call
+        self._pending = []
+        self._sent = [] # [title, status ID] of the latest posts, oldest first
+        if filepath:
+            self._load()
+
+    def _load(self):
+        ''' Reads the outbox file, if there is one '''
+        try:
+            outbox_dict = FileIO.get_json_dict(self.filepath)
+            self._pending = outbox_dict['pending']
+            self._sent = outbox_dict['sent']
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            Log.error("OUT.load", "Outbox file is faulty, starting empty: " + str(e))
+            return
+        OUTBOX_DEPTH.set(len(self._pending))
+        if self._pending:
+            Log.info("OUT.load", "{} posts left over from the last session".format(len(self._pending)))
+
+    def _save(self):
+        ''' Writes the outbox file, if stats are being saved too '''
+        OUTBOX_DEPTH.set(len(self._pending))
+        if self.filepath and self.stats.save:
+            FileIO.save_json_dict(self.filepath, {'pending': self._pending, 'sent': self._sent})
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pending(self) -> list:
+        ''' Copy of the posts waiting to be sent, next first '''
+        with self._lock:
+            return [dict(post) for post in self._pending]
+
+    def add(self, data: dict, index: int, reply_to: str = None, save: bool = True) -> bool:
+        """
+        Queues a feed entry, to be posted as a reply to the post titled reply_to (if it was sent).
+        Without save, the outbox file is left for the flush that follows to write.
+        Returns False if the title is already waiting to be sent.
+        """
+        with self._lock:
+            if any(post['title'] == data['title'] for post in self._pending):
+                Log.warning("OUT.add", "Already waiting to post " + data['title'])
+                return False
+            self._pending.append({
+                'title': data['title'], 'index': index, 'text': data['text'],
+                'reply_to': reply_to, 'attempts': 0, 'next_try': 0
+            })
+            if save:
+                self._save()
+        return True
+
+    def flush(self):
+        ''' Sends the posts that are due, in order, stopping at the first to fail '''
+        with self._lock, Log.scope(self._log_namespace):
+            while self._pending:
+                post = self._pending[0]
+                if post['next_try'] > time():
+                    break
+                if not self._send(post):
+                    break
+            if self._pending and not self._in_flight: # A deferred call flushes once it's made
+                self._schedule(self._pending[0]['next_try'] - time())
+            self._save()
+
+    def _send(self, post: dict) -> bool:
+        ''' Posts one tweet; returns False if it should be tried again later '''
+        future, self._in_flight = self._in_flight, None
+        if future is None:
+            reply_id = dict(self._sent).get(post['reply_to']) if post['reply_to'] else None
+            if self._wait_for_rate_limit(post):
+                return False
+            Log.debug("OUT.send", "update_status using {}".format(post['title']))
+            with Tracer.span("API.update_status"):
+                future = self.api_scheduler.submit(
+                    Priority.POST, self.api, 'update_status', post['text'], in_reply_to_status_id=reply_id
+                )
+        if not future.done():
+            Log.info("OUT.send", "Posting {} once the rate limit scheduler gets to it".format(post['title']))
+            self._in_flight = future
+            future.add_done_callback(self._call_made)
+            return False
+        try:
+            status = future.result()
+        except CancelledError:
+            return False # The scheduler stopped; sent again on the next flush
+        except TweepError as e:
+            if isinstance(e, RateLimitError) and self._wait_for_rate_limit(post):
+                return False # Without rate limit headers, it's retried like any other error
+            post['attempts'] += 1
+            if e.api_code in Outbox.PERMANENT_ERRORS or post['attempts'] >= self.retry_max_attempts:
+                Log.error("OUT.send", "Gave up on {}: {}".format(post['title'], e))
+                TWEETS_FAILED.inc()
+                self._pending.pop(0)
+                return True
+            delay = self.backoff(post['attempts'])
+            post['next_try'] = time() + delay
+            Log.warning("OUT.send", "Retrying {} in {:.0f} seconds: {}".format(post['title'], delay, e))
+            TWEETS_RETRIED.inc()
+            return False
+        Log.debug("OUT.send (id)", "Status ID: {}".format(status.id))
+        TWEETS_POSTED.inc(mode='online')
+        self.stats.register_tweet(status.id, post['title'])
+        self._sent = [sent for sent in self._sent if sent[0] != post['title']][-(Outbox.SENT_KEPT - 1):]
+        self._sent.append([post['title'], status.id])
+        self._pending.pop(0)
+        return True
+
+    def _call_made(self, future):
+        ''' Flushes the outbox (off the scheduler's thread) once a deferred post's call is made '''
+        with self._lock:
+            if future is self._in_flight:
+                self._schedule(0)
+
+    def _wait_for_rate_limit(self, post: dict) -> bool:
+        ''' Holds a post back, without counting an attempt, until the rate limit window resets '''
+        wait = self.api_scheduler.wait_time('update_status', Priority.POST)
+        if wait <= 0:
+            return False
+        post['next_try'] = time() + wait
+        Log.info("OUT.send", "Rate limited; posting {} in {:.0f} seconds".format(post['title'], wait))
+        return True
+
+    def backoff(self, attempts: int) -> float:
+        ''' Seconds to wait after a post's nth failure: doubling each time, capped, with jitter '''
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempts - 1))
+        return uniform(delay / 2, delay)
+
+    def _schedule(self, delay: float):
+        ''' (Re)starts the timer that flushes the outbox, unless stopped '''
+        if self._timer:
+            self._timer.cancel()
+        if self._stopped:
+            self._timer = None
+            return
+        self._timer = self.timer_factory(max(delay, 0), self.flush)
+        self._timer.start()
+
+    def resume(self):
+        ''' Sends the posts left over from the last session, off the calling thread '''
+        with self._lock:
+            self._stopped = False
+            if self._pending:
+                self._schedule(self._pending[0]['next_try'] - time())
+
+    def stop(self):
+        ''' Stops retrying until resumed; waiting posts stay in the outbox file '''
+        with self._lock:
+            self._stopped = True
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
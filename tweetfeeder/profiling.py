@@ -0,0 +1,177 @@
+'''
+On-demand profiling of a running bot, controlled by the "profile" master command.
+'''
+import cProfile
+import io
+import pstats
+import sys
+from collections import Counter
+from datetime import datetime
+from os import path
+from threading import Thread, Event, Lock, local, get_ident
+
+class Profiler:
+    """
+    Process-wide profiler, used statically like Log.
+
+    Modes:
+        sample      A background thread samples the stacks of the targeted threads.
+        cprofile    The bot's tweet / stream callbacks run under per-thread cProfile
+                    profiles (cProfile can only watch the thread that enables it).
+    Targets:
+        tweet       Threads running the TweetLoop
+        stream      Threads handling userstream data
+        all         Every thread but the profiler's own
+    """
+    TARGETS = ['tweet', 'stream', 'all']
+    MODES = ['sample', 'cprofile']
+    TARGET_FILES = {
+        'tweet': ['tweeting.py'],
+        'stream': ['streaming.py', 'ingest.py']
+    }
+
+    target = None
+    mode = None
+    interval = 0.005
+    _started = None
+    _profiled = None
+    _stop = None
+    _sampler = None
+    _samples = Counter()
+    _sample_count = 0
+    _profiles = []
+    _local = local()
+    _lock = Lock()
+
+    @staticmethod
+    def is_running() -> bool:
+        ''' True while a profile is being collected. '''
+        return Profiler.target is not None
+
+    @staticmethod
+    def start(target='all', mode='sample', interval=0.005):
+        ''' Begins collecting a profile of the target threads. '''
+        if target not in Profiler.TARGETS:
+            raise ValueError("Profile target should be one of " + str(Profiler.TARGETS))
+        if mode not in Profiler.MODES:
+            raise ValueError("Profile mode should be one of " + str(Profiler.MODES))
+        Profiler.stop()
+        with Profiler._lock:
+            Profiler._samples = Counter()
+            Profiler._sample_count = 0
+            Profiler._profiles = []
+        Profiler.interval = interval
+        Profiler._started = datetime.now()
+        Profiler.mode = mode
+        Profiler.target = Profiler._profiled = target
+        if mode == 'sample':
+            Profiler._stop = Event()
+            Profiler._sampler = Thread(target=Profiler._sample_loop, args=(Profiler._stop,), name="Profiler", daemon=True)
+            Profiler._sampler.start()
+
+    @staticmethod
+    def stop():
+        ''' Stops collecting; the profile stays available to report(). '''
+        Profiler.target = None
+        if Profiler._stop:
+            Profiler._stop.set()
+            Profiler._sampler.join()
+            Profiler._stop = None
+            Profiler._sampler = None
+
+    @staticmethod
+    def run(target, func, *args, **kwargs):
+        ''' Calls func, under cProfile if a cprofile run targets these threads. '''
+        if Profiler.mode != 'cprofile' or Profiler.target not in (target, 'all'):
+            return func(*args, **kwargs)
+        if getattr(Profiler._local, 'active', False):
+            return func(*args, **kwargs) # Already inside a profiled call
+        profile = getattr(Profiler._local, 'profile', None)
+        if profile is None or profile not in Profiler._profiles:
+            profile = Profiler._local.profile = cProfile.Profile()
+            with Profiler._lock:
+                Profiler._profiles.append(profile)
+        Profiler._local.active = True
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            Profiler._local.active = False
+
+    @staticmethod
+    def _sample_loop(stop: Event):
+        ''' Samples thread stacks until told to stop. '''
+        own_ident = get_ident()
+        while not stop.wait(Profiler.interval):
+            frames = sys._current_frames() # pylint: disable=protected-access
+            with Profiler._lock:
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    stack = Profiler._stack_of(frame)
+                    if Profiler._is_target(stack):
+                        Profiler._samples[";".join(stack)] += 1
+                        Profiler._sample_count += 1
+
+    @staticmethod
+    def _stack_of(frame) -> list:
+        ''' Outermost-first list of "file:function:line" entries '''
+        stack = []
+        while frame:
+            code = frame.f_code
+            stack.append("{}:{}:{}".format(path.basename(code.co_filename), code.co_name, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    @staticmethod
+    def _is_target(stack: list) -> bool:
+        ''' Whether a sampled stack belongs to the targeted threads '''
+        if Profiler.target == 'all':
+            return True
+        files = Profiler.TARGET_FILES.get(Profiler.target, [])
+        return any(entry.split(':', 1)[0] in files for entry in stack)
+
+    @staticmethod
+    def report() -> str:
+        ''' Formats the collected profile as text. '''
+        header = "Profile of {} threads ({}{}) started {:%m/%d/%y %H:%M:%S}\n".format(
+            Profiler._profiled, Profiler.mode, "" if Profiler.is_running() else ", stopped",
+            Profiler._started or datetime.now()
+        )
+        if Profiler.mode == 'cprofile':
+            with Profiler._lock:
+                profiles = list(Profiler._profiles)
+            if not profiles:
+                return header + "No profiled calls.\n"
+            out = io.StringIO()
+            stats = pstats.Stats(profiles[0], stream=out)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats('cumulative').print_stats(40)
+            return header + out.getvalue()
+
+        with Profiler._lock:
+            samples = Counter(Profiler._samples)
+            total = Profiler._sample_count
+        own, inclusive = Counter(), Counter()
+        for stack, count in samples.items():
+            entries = stack.split(';')
+            own[entries[-1]] += count
+            for entry in set(entries):
+                inclusive[entry] += count
+        lines = [header, "{} samples every {}s\n".format(total, Profiler.interval)]
+        for title, counter in (("Self", own), ("Inclusive", inclusive)):
+            lines.append("\n{:>8} {:>7}  {}".format(title, "%", "function"))
+            for entry, count in counter.most_common(30):
+                lines.append("{:>8} {:>6.1f}%  {}".format(count, 100.0 * count / max(total, 1), entry))
+        lines.append("\nCollapsed stacks:")
+        lines.extend("{} {}".format(stack, count) for stack, count in samples.most_common())
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def dump(directory) -> str:
+        ''' Writes report() to a timestamped file in directory, returning its path. '''
+        filepath = path.join(directory or ".", "profile-{:%Y%m%d-%H%M%S}.txt".format(datetime.now()))
+        with open(filepath, 'w', encoding='utf8') as outfile:
+            outfile.write(Profiler.report())
+        return filepath
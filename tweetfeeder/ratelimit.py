@@ -0,0 +1,210 @@
+"""
+Rate limit budgets for Twitter API calls, shared by a bot's components.
+Each endpoint's budget comes from the x-rate-limit-* headers of its last response.
+A call that its budget can't afford waits in a queue, by priority, until the window resets,
+and low priorities leave part of every window to higher ones.
+"""
+import heapq
+from concurrent.futures import Future
+from itertools import count
+from threading import Timer, Lock
+from time import time
+from tweepy.error import TweepError
+from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+
+API_CALLS = Metrics.histogram("tweetfeeder_api_call_seconds", "Twitter API call latency by endpoint")
+CALLS_DEFERRED = Metrics.counter("tweetfeeder_api_calls_deferred_total", "API calls queued until their rate limit window resets")
+RATE_REMAINING = Metrics.gauge("tweetfeeder_rate_limit_remaining", "Requests left in the current rate limit window")
+
+class Priority:
+    ''' Importance of an API call; lower goes first '''
+    POST = 0        # Scheduled tweets
+    COMMAND = 1     # Replies to the master's DM commands
+    ALERT = 2       # DMs from Log alerts
+    RT_CHECK = 3    # Looking for comments on retweets
+    SYNC = 4        # sync_stats and other bulk reads
+
+    # Share of each window a priority must leave unused
+    RESERVES = {POST: 0.0, COMMAND: 0.05, ALERT: 0.1, RT_CHECK: 0.2, SYNC: 0.3}
+
+# Rate limited endpoint of each tweepy.API method TweetFeeder calls
+ENDPOINTS = {
+    'update_status': 'statuses/update',
+    'get_status': 'statuses/show',
+    'statuses_lookup': 'statuses/lookup',
+    'user_timeline': 'statuses/user_timeline',
+    'send_direct_message': 'direct_messages/new'
+}
+
+class RateBudget:
+    ''' What's left of one endpoint's rate limit window, as last reported by Twitter '''
+    __slots__ = ('limit', 'remaining', 'reset')
+
+    def __init__(self):
+        ''' Unknown until a response reports it '''
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0
+
+    def update(self, headers):
+        ''' Reads x-rate-limit-limit, -remaining and -reset (an epoch time), if given '''
+        try:
+            limit = int(headers['x-rate-limit-limit'])
+            remaining = int(headers['x-rate-limit-remaining'])
+            reset = float(headers['x-rate-limit-reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.limit = limit
+        # Calls still in flight were already taken off; don't give them back
+        self.remaining = remaining if self.remaining is None or reset != self.reset else min(remaining, self.remaining)
+        self.reset = reset
+
+    def allows(self, priority: int, now: float) -> bool:
+        ''' Whether a call of this priority may be made now '''
+        if self.limit is None or now >= self.reset:
+            return True # Unknown or a new window
+        return self.remaining > int(self.limit * Priority.RESERVES[priority])
+
+    def take(self, now: float):
+        ''' Counts a call about to be made '''
+        if self.limit is not None and now < self.reset:
+            self.remaining -= 1
+
+class ApiScheduler:
+    """
+    Makes API calls for a bot's components, through their own tweepy.API objects.
+    Calls run in the caller's thread when their budget allows; otherwise they're queued
+    and run later, by priority, from a timer. Either way, the caller gets a Future.
+    """
+    DRAIN_BATCH = 10 # Queued calls made per timer, so others get a turn between batches
+
+    def __init__(self, timer_factory=None):
+        ''' No budgets are known until the first responses '''
+        self.timer_factory = timer_factory or Timer
+        self._log_namespace = Log.current_namespace()
+        self._budgets = {}
+        self._queues = {} # Endpoint: heap of (priority, order, api, method, args, kwargs, future)
+        self._order = count()
+        self._lock = Lock()
+        self._timer = None
+        self._timer_due = None
+
+    def budget(self, endpoint: str) -> RateBudget:
+        ''' The budget of an endpoint (or of a method, by its name) '''
+        endpoint = ENDPOINTS.get(endpoint, endpoint)
+        with self._lock:
+            return self._budgets.setdefault(endpoint, RateBudget())
+
+    def wait_time(self, method: str, priority: int = Priority.POST) -> float:
+        ''' Seconds until a call could be made (0 if it could be made now) '''
+        budget = self.budget(method)
+        now = time()
+        return 0.0 if budget.allows(priority, now) else budget.reset - now
+
+    def queued(self) -> int:
+        ''' Calls waiting for their window to reset '''
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, priority: int, api, method: str, *args, **kwargs) -> Future:
+        ''' Calls api.method(*args, **kwargs) now if its budget allows, or once it does '''
+        endpoint = ENDPOINTS.get(method, method)
+        future = Future()
+        item = (priority, next(self._order), api, method, args, kwargs, future)
+        with self._lock:
+            budget = self._budgets.setdefault(endpoint, RateBudget())
+            queue = self._queues.setdefault(endpoint, [])
+            now = time()
+            if (queue and queue[0][0] <= priority) or not budget.allows(priority, now):
+                heapq.heappush(queue, item)
+                CALLS_DEFERRED.inc(endpoint=endpoint)
+                Log.debug("API.defer", "{} waits for the {} window to reset".format(method, endpoint))
+                self._schedule_drain()
+                return future
+            budget.take(now)
+        self._run(endpoint, item)
+        return future
+
+    def call(self, priority: int, api, method: str, *args, **kwargs):
+        ''' submit(), waiting for the result '''
+        return self.submit(priority, api, method, *args, **kwargs).result()
+
+    def _run(self, endpoint: str, item: tuple):
+        ''' Makes a call and records the rate limit its response reports '''
+        _, _, api, method, args, kwargs, future = item
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with API_CALLS.time(endpoint=method):
+                result = getattr(api, method)(*args, **kwargs)
+        except TweepError as e:
+            self._record(endpoint, getattr(e.response, 'headers', None))
+            future.set_exception(e)
+        except Exception as e: # pylint: disable=broad-except
+            future.set_exception(e) # Never leave the caller waiting, or end a drain early
+        else:
+            self._record(endpoint, getattr(getattr(api, 'last_response', None), 'headers', None))
+            future.set_result(result)
+
+    def _record(self, endpoint: str, headers):
+        ''' Updates a budget from response headers '''
+        if headers is None:
+            return
+        with self._lock:
+            budget = self._budgets[endpoint]
+            budget.update(headers)
+            if budget.remaining is not None:
+                RATE_REMAINING.set(budget.remaining, endpoint=endpoint)
+            if self._queues.get(endpoint):
+                self._schedule_drain()
+
+    def _schedule_drain(self):
+        ''' (Re)starts the timer for the earliest queued call that can be made; run while locked '''
+        now = time()
+        waits = [
+            max(self._budgets[endpoint].reset - now, 0)
+            if not self._budgets[endpoint].allows(queue[0][0], now) else 0
+            for endpoint, queue in self._queues.items() if queue
+        ]
+        if not waits:
+            return
+        due = now + min(waits)
+        if self._timer and not self._timer.finished.is_set() and self._timer_due <= due:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer = self.timer_factory(due - now, self._drain)
+        self._timer_due = due
+        self._timer.start()
+
+    def _drain(self):
+        ''' Makes a batch of queued calls, most important first, then waits for the next '''
+        with Log.scope(self._log_namespace):
+            for _ in range(ApiScheduler.DRAIN_BATCH):
+                with self._lock:
+                    now = time()
+                    ready = [
+                        (queue[0], endpoint) for endpoint, queue in self._queues.items()
+                        if queue and self._budgets[endpoint].allows(queue[0][0], now)
+                    ]
+                    if not ready:
+                        break
+                    item, endpoint = min(ready, key=lambda pair: pair[0][:2])
+                    heapq.heappop(self._queues[endpoint])
+                    self._budgets[endpoint].take(now)
+                self._run(endpoint, item)
+            with self._lock:
+                self._timer = None
+                self._schedule_drain()
+
+    def stop(self):
+        ''' Cancels the timer and every queued call '''
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            queues, self._queues = self._queues, {}
+        for queue in queues.values():
+            for item in queue:
+                item[-1].cancel()
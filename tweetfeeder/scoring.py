@@ -0,0 +1,58 @@
+"""
+Engagement scoring of published tweets,
+deciding which feed entries are worth rerunning.
+"""
+from bisect import bisect_left
+
+DEFAULT_WEIGHTS = {
+    'favorites': 1,
+    'retweets': 2,
+    'requotes': 2,
+    'replies': 1,
+    'rt_comments': 2
+}
+
+def score(tweet_stats: dict, weights: dict = None) -> int:
+    ''' Weighted sum of a tweet's stats; list stats (rt_comments) count their entries. '''
+    weights = weights or DEFAULT_WEIGHTS
+    total = 0
+    for stat, weight in weights.items():
+        value = tweet_stats.get(stat, 0) if tweet_stats else 0
+        total += weight * (len(value) if isinstance(value, (list, tuple)) else value)
+    return total
+
+class RerunIndex:
+    """
+    Sorted feed indices of the entries that may be rerun:
+    those with a true "rerun" trait whose title scored at least min_score.
+    Built once per pass through the feed so rerun mode can jump between entries.
+    """
+    def __init__(self, entries: list, tweet_stats: dict, weights: dict = None, min_score: int = 0):
+        ''' Scores every title in the feed and keeps the eligible indices '''
+        self.min_score = min_score
+        self.feed_size = len(entries)
+        self.scores = {}
+        self.indices = []
+        for index, entry in enumerate(entries):
+            title = entry['title']
+            if title not in self.scores:
+                self.scores[title] = score(tweet_stats.get(title), weights)
+            if entry.get('rerun', True) and self.scores[title] >= min_score:
+                self.indices.append(index)
+        self._eligible = set(self.indices)
+
+    def allows(self, index: int) -> bool:
+        ''' Whether the entry at index may be rerun '''
+        return index in self._eligible
+
+    def next_index(self, from_index: int, limit: int = 0) -> int:
+        """
+        The first eligible index at or after from_index; the feed size if there is none.
+        A limit above from_index (the end of the feed as it was when rerunning began)
+        is never jumped over, as entries past it haven't been published yet.
+        """
+        position = bisect_left(self.indices, from_index)
+        next_index = self.indices[position] if position < len(self.indices) else self.feed_size
+        if limit > from_index:
+            next_index = min(next_index, limit)
+        return next_index
@@ -0,0 +1,77 @@
+"""
+Dry run of a bot's tweet schedule: which feed entries it would tweet, and when,
+following the same chain, rest period and rerun rules as the TweetLoop.
+Needs no credentials and imports neither tweepy nor the bot.
+"""
+from datetime import datetime, timedelta
+from tweetfeeder.file_io.config import Config
+from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.scoring import RerunIndex
+
+def tweet_slots(config: Config, after: datetime):
+    ''' Yields the times the loop may start tweeting at after [after] (without random deviation) '''
+    if not config.tweet_times:
+        slot = after
+        while True:
+            slot += timedelta(seconds=config.min_tweet_delay)
+            yield slot
+    times = sorted(tweet_time.time() for tweet_time in config.tweet_times)
+    day = after.date()
+    while True:
+        for tweet_time in times:
+            slot = datetime.combine(day, tweet_time)
+            if slot > after:
+                yield slot
+        day += timedelta(days=1)
+
+def simulate(config: Config, feed: Feed, stats: Stats, count: int = 10, start: datetime = None) -> list:
+    """
+    The next [count] tweets as (time, feed index, entry, rerun) tuples,
+    starting from the stats' saved feed index.
+    """
+    now = start or datetime.now()
+    index = stats.last_feed_index
+    times_rerun = stats.times_rerun
+    rerun_limit = stats.last_rerun_index
+    rerun_index = None
+    total = feed.total_tweets
+    schedule = []
+    while len(schedule) < count:
+        if index >= total:
+            if times_rerun >= config.looping_max_times:
+                break # End of feed, and not allowed to loop
+            times_rerun += 1
+            rerun_limit = index
+            index = 0
+            rerun_index = None
+        if rerun_limit > 0 and index > rerun_limit:
+            times_rerun = 0
+        if times_rerun > 0:
+            if rerun_index is None:
+                rerun_index = RerunIndex(
+                    feed.get_entries(), stats.all_tweet_stats(),
+                    config.score_weights, config.looping_min_score
+                )
+            index = rerun_index.next_index(index, rerun_limit)
+            if index >= total:
+                continue
+        group = feed.get_tweets(index)
+        slot = next(tweet_slots(config, now))
+        for offset, entry in enumerate(group):
+            if times_rerun > 0 and not rerun_index.allows(index + offset):
+                continue
+            schedule.append((slot, index + offset, entry, times_rerun > 0))
+            slot += timedelta(seconds=config.min_tweet_delay)
+        if schedule and schedule[-1][0] > now:
+            now = schedule[-1][0] + timedelta(seconds=abs(config.rest_period))
+        index += len(group)
+    return schedule[:count]
+
+def describe(schedule: list) -> str:
+    ''' One line per simulated tweet '''
+    if not schedule:
+        return "Nothing left to tweet."
+    return "\n".join(
+        "{:%Y-%m-%d %H:%M:%S}  #{:<6} {}{}".format(time, index, entry['title'], " (rerun)" if rerun else "")
+        for time, index, entry, rerun in schedule
+    )
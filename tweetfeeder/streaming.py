@@ -4,27 +4,53 @@ UserStream listener for use by TweetFeederBot.
 import json
 from threading import Timer
 from tweepy import StreamListener, API
+from tweepy.error import TweepError
+from tweepy.models import Status
 from tweetfeeder.logs import Log
+from tweetfeeder.ingest import IngestQueue
+from tweetfeeder.metrics import Metrics
+from tweetfeeder.tracing import Tracer
+from tweetfeeder.profiling import Profiler
+from tweetfeeder.ratelimit import ApiScheduler, Priority
 from tweetfeeder.file_io import Config
 from tweetfeeder.file_io.models import Feed, Stats
 from tweetfeeder.file_io.utils import FileIO
 from tweetfeeder.exceptions import InvalidCommand, UnregisteredTweetError, ArgumentError
 
+STREAM_EVENTS = Metrics.counter("tweetfeeder_stream_events_total", "Stream data received, by type")
+STREAM_SKIPPED = Metrics.counter("tweetfeeder_stream_events_skipped_total", "Stream data skipped before dispatch, by type")
+
 class TweetFeederListener(StreamListener):
     """
     Receives events from Tweepy
     """
-    def __init__(self, config: Config, stats: Stats, cmd_method: classmethod):
+    TRACKED_EVENTS = ['favorite', 'unfavorite', 'quoted_tweet']
+    IGNORED_EVENTS = ['follow']
+
+    def __init__(self, config: Config, stats: Stats, cmd_method: classmethod, timer_factory=None, api_factory=None,
+                 api_scheduler: ApiScheduler = None):
         """
         Creates a TweetFeederListener using config data
         and Tweepy API from a TweetFeederBot.
+        timer_factory and api_factory replace threading.Timer and tweepy.API, e.g. in host mode.
+        RT comment checks wait their turn in api_scheduler, behind the bot's scheduled tweets.
         """
         self._config = config
         self._stats = stats
         self.cmd_method = cmd_method
-        self.api = API(config.authorization)
+        self.timer_factory = timer_factory or Timer
+        self.api = (api_factory or API)(config.authorization)
+        self.api_scheduler = api_scheduler or ApiScheduler(self.timer_factory)
+        self._log_namespace = Log.current_namespace()
         self.timers = []
         self.check_delay = 420  #Seven minutes
+        self.ingest = IngestQueue(
+            self._handle,
+            config.ingest_queue_size,
+            config.overflow_policy,
+            config.droppable_types,
+            config.ingest_workers
+        )
         super(TweetFeederListener, self).__init__(self.api)
 
     def on_connect(self):
@@ -35,8 +61,82 @@ class TweetFeederListener(StreamListener):
         '''Debug wrapper for StreamListener.on_data'''
         if raw_data is None:
             Log.debug("STR.on_data", "Received empty streaming data")
-        elif super(TweetFeederListener, self).on_data(raw_data) is False:
-            Log.error("STR.on_data", "Streaming halt!")
+            return
+        with Log.scope(self._log_namespace), Tracer.span("STR.on_data") as span:
+            data = json.loads(raw_data)
+            kind = self.kind_of(data)
+            STREAM_EVENTS.inc(type=kind)
+            if span:
+                span.attrs['kind'] = kind
+            if not self.is_relevant(data):
+                STREAM_SKIPPED.inc(type=kind)
+                return
+            self.ingest.put(kind, (data, raw_data))
+
+    def _handle(self, item):
+        ''' Called by the ingest queue for each relevant piece of stream data. '''
+        with Log.scope(self._log_namespace), Tracer.span("STR.dispatch"):
+            if Profiler.run('stream', self._dispatch, *item) is False:
+                Log.error("STR.on_data", "Streaming halt!")
+
+    @staticmethod
+    def kind_of(data: dict) -> str:
+        ''' Names the type of raw stream data, as used by the ingest queue's overflow policy. '''
+        if 'event' in data:
+            return data['event']
+        elif 'in_reply_to_status_id' in data:
+            return 'status'
+        elif 'direct_message' in data:
+            return 'direct_message'
+        return 'control'
+
+    def is_relevant(self, data: dict):
+        """
+        Pre-dispatch check of raw stream data.
+        Returns False for traffic that on_status / on_event would discard
+        or that cannot change Stats, so no Tweepy models are built for it.
+        The master's events are always dispatched, registered tweet or not.
+        """
+        if 'event' in data:
+            if data['event'] in TweetFeederListener.TRACKED_EVENTS:
+                return self._from_master(data['source']) or self._is_registered(data['target_object']['id'])
+            return data['event'] not in TweetFeederListener.IGNORED_EVENTS
+        if 'in_reply_to_status_id' not in data:
+            return True # Direct messages and stream control messages
+        if self._from_master(data['user']):
+            return True
+        retweeted = data.get('retweeted_status')
+        if retweeted and retweeted['user']['id'] == self._config.bot_id:
+            return self._is_registered(retweeted['id'])
+        reply_to = data['in_reply_to_user_id']
+        if reply_to == self._config.bot_id:
+            return self._is_registered(data['in_reply_to_status_id'])
+        if data['user']['id'] == self._config.bot_id:
+            return not reply_to # Replies made by the bot are ignored
+        if data.get('is_quote_status') or not reply_to:
+            return False # Picked up by on_event, or just a mention
+        return True # Oddball replies, logged by on_status
+
+    def _from_master(self, user: dict):
+        ''' True if stream data came from the master account '''
+        return user.get('id') == self._config.master_id
+
+    def _is_registered(self, twid):
+        ''' True if the given Tweet ID has stats that an event could modify. '''
+        if self._stats.find_title_from_id(twid) is None:
+            Log.debug("STR.on_data", "Skipping event on unregistered tweet {}".format(twid))
+            return False
+        return True
+
+    def _dispatch(self, data: dict, raw_data):
+        ''' Builds a Tweepy model from already parsed data and routes it like StreamListener.on_data '''
+        if 'in_reply_to_status_id' in data:
+            return self.on_status(Status.parse(self.api, data))
+        elif 'event' in data:
+            return self.on_event(Status.parse(self.api, data))
+        elif 'direct_message' in data:
+            return self.on_direct_message(Status.parse(self.api, data))
+        return super(TweetFeederListener, self).on_data(raw_data)
 
     def on_direct_message(self, status):
         ''' Called when a new direct message arrives '''
@@ -66,7 +166,7 @@ class TweetFeederListener(StreamListener):
         """
         absolute = ['favorite', 'unfavorite']
         relative_pos = ['quoted_tweet']
-        ignored = ['follow']
+        ignored = TweetFeederListener.IGNORED_EVENTS
         actor = status.source['screen_name']
         info = ""
 
@@ -97,7 +197,7 @@ class TweetFeederListener(StreamListener):
             actor = status.user.screen_name
             info = status.retweeted_status.id
             self._stats.mod_tweet_stats(info, 'retweets', 1)
-            timer = Timer(self.check_delay, self.check_for_comments, (info, status.user.id))
+            timer = self.timer_factory(self.check_delay, self.check_for_comments, (info, status.user.id))
             timer.start()
             self.timers.append(timer)
         elif status.in_reply_to_user_id == self._config.bot_id:
@@ -146,33 +246,53 @@ class TweetFeederListener(StreamListener):
         Log.warning("STR.on_disconnect", "Streaming: " + notice)
 
     def check_for_comments(self, tweet_id, user_id=None, user_timeline=None):
-        ''' Checks a list of statuses (downloads them if necessary) for any comments made after a retweet '''
-        Log.debug("STR.rt_check", "Checking for comments on retweet...")
-        if not user_id and not user_timeline:
-            raise ArgumentError("check_for_comments requires user_id or user_timeline")
-
-        if not user_timeline:
-            user_timeline = self.api.user_timeline(id=user_id)
-
-        twenty_statuses = reversed(user_timeline)
-        pick_up_next = False
-        potential_comment = None
-        for status in twenty_statuses:
-            if pick_up_next:
-                potential_comment = status
-                break
-            try:
-                if status.retweeted_status.id == tweet_id:
-                    pick_up_next = True
-            except AttributeError:
-                pass
-        if potential_comment:
-            if 'RT' in potential_comment.text and not 'RT @' in potential_comment.text:
-                Log.info("STR.rt_check", "User ({}) commented on retweet!".format(potential_comment.user.screen_name))
-                # Add related text to rt_comments
-                self._stats.mod_tweet_stats(tweet_id, 'rt_comments', potential_comment.text)
+        """
+        Checks a list of statuses (downloads them if necessary) for any comments made after a retweet.
+        If the download has to wait for the rate limit, the check is finished once it's done.
+        """
+        with Log.scope(self._log_namespace):
+            Log.debug("STR.rt_check", "Checking for comments on retweet...")
+            if not user_id and not user_timeline:
+                raise ArgumentError("check_for_comments requires user_id or user_timeline")
+
+            if not user_timeline:
+                self.api_scheduler.submit(
+                    Priority.RT_CHECK, self.api, 'user_timeline', id=user_id
+                ).add_done_callback(lambda future: self._timeline_arrived(tweet_id, future))
+                return
+
+            twenty_statuses = reversed(user_timeline)
+            pick_up_next = False
+            potential_comment = None
+            for status in twenty_statuses:
+                if pick_up_next:
+                    potential_comment = status
+                    break
+                try:
+                    if status.retweeted_status.id == tweet_id:
+                        pick_up_next = True
+                except AttributeError:
+                    pass
+            if potential_comment:
+                if 'RT' in potential_comment.text and not 'RT @' in potential_comment.text:
+                    Log.info("STR.rt_check", "User ({}) commented on retweet!".format(potential_comment.user.screen_name))
+                    # Add related text to rt_comments
+                    self._stats.mod_tweet_stats(tweet_id, 'rt_comments', potential_comment.text)
+
+            self._clear_finished_checks()
 
-        self._clear_finished_checks()
+    def _timeline_arrived(self, tweet_id, future):
+        ''' Finishes a check_for_comments once its user timeline has been downloaded '''
+        if future.cancelled():
+            return
+        try:
+            user_timeline = future.result()
+        except TweepError as e:
+            with Log.scope(self._log_namespace):
+                Log.warning("STR.rt_check", "Couldn't get user timeline: " + str(e))
+            return
+        if user_timeline:
+            self.check_for_comments(tweet_id, user_timeline=user_timeline)
 
     def cancel_checks(self):
         ''' Cancel all timed checks of RT comments '''
@@ -0,0 +1,105 @@
+'''
+Lightweight, sampled tracing of the bot's hot paths.
+Finished traces are kept in a ring buffer until dumped.
+'''
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from random import random
+from threading import local, Lock
+from time import perf_counter
+
+class Span:
+    ''' One timed operation, possibly containing child spans. '''
+    __slots__ = ('name', 'attrs', 'started', 'duration', 'children', '_start_counter')
+
+    def __init__(self, name, attrs):
+        ''' Starts timing '''
+        self.name = name
+        self.attrs = attrs
+        self.started = datetime.now()
+        self.duration = None
+        self.children = []
+        self._start_counter = perf_counter()
+
+    def finish(self):
+        ''' Stops timing '''
+        self.duration = perf_counter() - self._start_counter
+
+    def lines(self, depth=0) -> list:
+        ''' Indented, human readable description of this span and its children '''
+        attrs = " ".join("{}={}".format(k, v) for k, v in sorted(self.attrs.items()))
+        lines = ["{}{} {:.2f}ms {}".format("  " * depth, self.name, (self.duration or 0) * 1000, attrs).rstrip()]
+        for child in self.children:
+            lines.extend(child.lines(depth + 1))
+        return lines
+
+class Tracer:
+    ''' Process-wide span tracer, used statically like Log. '''
+    sample_rate = 0.0
+    _traces = deque(maxlen=100)
+    _lock = Lock()
+    _local = local()
+
+    @staticmethod
+    def configure(sample_rate=None, buffer_size=None):
+        ''' Sets the fraction of root spans recorded and how many traces are kept. '''
+        if sample_rate is not None:
+            Tracer.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if buffer_size is not None:
+            with Tracer._lock:
+                Tracer._traces = deque(Tracer._traces, maxlen=max(buffer_size, 1))
+
+    @staticmethod
+    @contextmanager
+    def span(name, **attrs):
+        """
+        Times the with-block as a span of the current thread's trace.
+        A span opened outside any trace starts one, if chosen by sampling;
+        the finished trace then goes into the ring buffer.
+        """
+        stack = getattr(Tracer._local, 'stack', None)
+        if stack is None:
+            stack = Tracer._local.stack = []
+        if stack:
+            parent = stack[-1]
+            if parent is None: # Unsampled trace
+                yield None
+                return
+            current = Span(name, attrs)
+            parent.children.append(current)
+        elif Tracer.sample_rate and random() < Tracer.sample_rate:
+            current = Span(name, attrs)
+        else:
+            current = None
+        stack.append(current)
+        try:
+            yield current
+        finally:
+            stack.pop()
+            if current:
+                current.finish()
+                if not stack:
+                    with Tracer._lock:
+                        Tracer._traces.append(current)
+
+    @staticmethod
+    def traces(count=None) -> list:
+        ''' Returns the most recent finished traces, oldest first. '''
+        with Tracer._lock:
+            traces = list(Tracer._traces)
+        return traces[-count:] if count else traces
+
+    @staticmethod
+    def dump(count=None) -> str:
+        ''' Formats the most recent traces as text. '''
+        return "\n".join(
+            "{:%m/%d %H:%M:%S} ".format(trace.started) + "\n".join(trace.lines())
+            for trace in Tracer.traces(count)
+        )
+
+    @staticmethod
+    def clear():
+        ''' Empties the ring buffer. '''
+        with Tracer._lock:
+            Tracer._traces.clear()
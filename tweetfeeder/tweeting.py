@@ -1,35 +1,59 @@
 """
 Timed Tweet publishing
 """
-from threading import Timer, Event
+from threading import Timer, Event, RLock
 from datetime import datetime, timedelta
 from queue import deque
 from time import sleep
 from random import uniform
 from tweepy import API
-from tweepy.models import Status
-from tweepy.error import TweepError
 from tweetfeeder.logs import Log
-from tweetfeeder.file_io.models import Feed, Stats
+from tweetfeeder.metrics import Metrics
+from tweetfeeder.tracing import Tracer
+from tweetfeeder.profiling import Profiler
+from tweetfeeder.scoring import RerunIndex
+from tweetfeeder.outbox import Outbox
+from tweetfeeder.ratelimit import ApiScheduler
+from tweetfeeder.file_io.models import Feed, FeedChange, Stats
 from tweetfeeder.exceptions import TweetFeederError, LoadFeedError, NoTimerError, ExistingTimerError
 from tweetfeeder.file_io.config import Config
 
+TWEETS_POSTED = Metrics.counter("tweetfeeder_tweets_posted_total", "Tweets published, by mode")
+TIMER_DEPTH = Metrics.gauge("tweetfeeder_timer_queue_depth", "Timers queued in the TweetLoop")
+
 class TweetLoop():
     ''' Interprets TweetFeeder configuration to publish Tweets on a schedule '''
-    def __init__(self, config: Config, feed: Feed, stats: Stats = None):
+    def __init__(self, config: Config, feed: Feed, stats: Stats = None, timer_factory=None, api_factory=None,
+                 api_scheduler: ApiScheduler = None):
         """
         Creates an object capable of timed publishing of Tweets.
         Automatically starts if config.functionality.Tweet
+        timer_factory and api_factory replace threading.Timer and tweepy.API, e.g. in host mode.
+        Rate limits are left to api_scheduler (shared with the bot's other components), not tweepy.
         """
         self.config = config
-        self.api = API(self.config.authorization, retry_count=1, retry_delay=10, wait_on_rate_limit=True)
+        self.timer_factory = timer_factory or Timer
+        self.api = (api_factory or API)(self.config.authorization, retry_count=1, retry_delay=10)
+        self.api_scheduler = api_scheduler or ApiScheduler(self.timer_factory)
+        self._log_namespace = Log.current_namespace()
         self.feed: Feed = feed
         self.stats: Stats = stats or Stats()
+        self.outbox = Outbox(
+            self.api, self.stats, self.stats.filepath and self.stats.filepath + ".outbox.json",
+            self.timer_factory, config.retry_base_delay, config.retry_max_delay, config.retry_max_attempts,
+            self.api_scheduler
+        )
         self.current_index: int = 0 #Set in start
         self.current_timer: Timer = None
         self._current_started = datetime.now()
         self.lock: Event = Event()
         self.timers: deque = deque()
+        self._rerun_index: RerunIndex = None # Built when a rerun pass needs it
+        self._loop_lock = RLock() # Held while tweeting, queueing timers or applying a feed change
+        self._generation = 0 # Incremented when queued timers are replaced; their stale tweets are dropped
+        self._tweet_started = datetime.now()
+        self._chain_timer = None # Next timer of the chain being tweeted, if any
+        self._in_transaction = False # Stats writes are held back until a chain is finished
         if config.functionality.Tweet:
             self.start()
 
@@ -75,6 +99,8 @@ class TweetLoop():
             self.lock.set()
             self.current_index = self.stats.last_feed_index
             Log.debug("TWT.start", "Set current index to " + str(self.current_index))
+            if self.config.functionality.Online:
+                self.outbox.resume()
             # Add the next timer tweet starting from
             # the last successfully tweeted index
             self._next()
@@ -84,6 +110,11 @@ class TweetLoop():
 
     def _next(self):
         ''' When only one timer is left, queue up more '''
+        with self._loop_lock, Log.scope(self._log_namespace), Tracer.span("TWT.next", queued=len(self.timers)):
+            return self._queue_next()
+
+    def _queue_next(self):
+        ''' Body of _next: replenishes timers and starts the next one '''
         # Replenish timers when all queued timers have been popped off
         if not self.timers:
             Log.debug("TWT.next", "Creating next timers")
@@ -96,16 +127,23 @@ class TweetLoop():
                     self.stats.times_rerun = self.stats.times_rerun + 1
                     self.stats.last_rerun_index = self.current_index
                     self.current_index = 0
+                    self._rerun_index = None # Rescore for the new pass
                 else:
                     # Terminate loop
                     Log.info("TWT.next", "Reached end of feed, but not allowed to loop.")
-                    self.stop()
+                    self._stop_timers() # Posts still in the outbox keep being retried
                     return False
             
             # Check to see that the current_index has not surpassed a previous rerun
             if self.stats.last_rerun_index > 0 and self.current_index > self.stats.last_rerun_index:
                 self.stats.times_rerun = 0 # Restore normal tweeting mode
 
+            if self.stats.times_rerun > 0:
+                # Jump straight to the next entry worth rerunning
+                self.current_index = self.rerun_index.next_index(
+                    self.current_index, self.stats.last_rerun_index
+                )
+
             # make_tweet_timers will start searching from current_index,
             # but will continue iterating down the feed until it finds timers
             # it can actually use (this is important in rerun mode)
@@ -126,10 +164,11 @@ class TweetLoop():
                 # This does not affect index_inc
                 if self.config.rest_period:
                     self.timers.append(
-                        Timer(abs(self.config.rest_period), self._next)
+                        self.timer_factory(abs(self.config.rest_period), self._next)
                     )
             # Update current index with the feed entries both used and skipped
             self.current_index += index_inc
+            TIMER_DEPTH.set(len(self.timers))
 
         if self.current_timer and not self.lock.is_set() and self.current_timer.args:
             # Current timer exists, but hasn't tweeted yet; fast forward
@@ -141,21 +180,49 @@ class TweetLoop():
             # current_timer is finishing up tweeting or doesn't exist;
             # pop off a timer and start it
             self.current_timer = self.timers.popleft()
+            if self.current_timer is self._chain_timer:
+                # Time spent posting the last tweet of the chain counts towards the delay
+                self.current_timer.interval = max(
+                    self.current_timer.interval - (datetime.now() - self._tweet_started).total_seconds(), 0
+                )
             self.current_timer.start()
             self._current_started = datetime.now()
             Log.debug("TWT.next", "Starting new timer with interval {}".format(self.current_timer.interval))
         else:
             # No timers were created or the last timer was just a delay
             Log.debug("TWT.next", "Forced into recursion as no timers were produced")
-            return self._next()
+            return self._queue_next()
         return True
 
     def stop(self):
-        ''' Cancels the current timer, which prevents futher timers from starting. '''
+        ''' Cancels the current timer, which prevents futher timers from starting, and stops retrying posts. '''
+        self._stop_timers()
+        self.outbox.stop()
+
+    def _stop_timers(self):
+        ''' Body of stop, apart from the outbox '''
         Log.info("TWT.stop", "Stopping current timer and clearing timer list.")
         if self.current_timer:
             self.current_timer.cancel()
             self.timers.clear()
+        self._end_chain()
+
+    @property
+    def rerun_index(self) -> RerunIndex:
+        ''' Entries eligible for this rerun pass, rebuilt if the feed has changed size. '''
+        if self._rerun_index is None or self._rerun_index.feed_size != self.feed.total_tweets:
+            try:
+                entries = self.feed.get_entries()
+            except LoadFeedError:
+                entries = []
+            self._rerun_index = RerunIndex(
+                entries, self.stats.all_tweet_stats(),
+                self.config.score_weights, self.config.looping_min_score
+            )
+            Log.debug("TWT.rerun_index", "{} of {} entries may be rerun (min score {})".format(
+                len(self._rerun_index.indices), len(entries), self.config.looping_min_score
+            ))
+        return self._rerun_index
 
     def _make_tweet_timers(self, from_index: int):
         ''' Returns a tweet timer (multiple if chained), all with the same interval. '''
@@ -168,35 +235,107 @@ class TweetLoop():
 
         timers = []
         for idx, t_data in enumerate(next_tweets):
-            # If rerunning, skip tweets which don't have a True "rerun" trait
-            if self.stats.times_rerun > 0 and not t_data['rerun']:
+            # If rerunning, skip tweets without a True "rerun" trait or a high enough score
+            if self.stats.times_rerun > 0 and not self.rerun_index.allows(from_index+idx):
                 timers.append(None)
             else:
                 timers.append(
-                    Timer(self.config.min_tweet_delay, self._tweet, (t_data, from_index+idx))
+                    self.timer_factory(
+                        self.config.min_tweet_delay, self._tweet, (t_data, from_index+idx, self._generation)
+                    )
                 )
         return timers
 
-    def _tweet(self, data: dict, index: int):
+    def _tweet(self, data: dict, index: int, generation: int = None):
         ''' Tweet, then signal for the next to begin '''
-        assert not self.lock.is_set()
-        self.lock.set()
-        success = 1
-        if self.config.functionality.Online:
-            Log.debug("TWT.tweet", "update_status using {}".format(data['title']))
-            try:
-                status = self.api.update_status(data['text'])
-            except TweepError as e: #TODO: Switch over to Tweepy's retry system, configurable when creating API
-                Log.error("TWT.tweet", str(e))
-                success = 0
+        with self._loop_lock:
+            if generation is not None and generation != self._generation:
+                return # Queued before a feed change replaced it
+            assert not self.lock.is_set()
+            self.lock.set()
+            self._tweet_started = datetime.now()
+            with Log.scope(self._log_namespace), Tracer.span("TWT.tweet", title=data['title'], index=index):
+                Profiler.run('tweet', self._publish, data, index)
+            self.lock.clear()
+
+    def on_feed_change(self, change: FeedChange):
+        """
+        Applies a hot-reloaded feed. Saved and queued indices follow their entries;
+        queued timers are only rebuilt if the entries they would tweet were changed.
+        """
+        with self._loop_lock, Log.scope(self._log_namespace):
+            self._rerun_index = None # Rescore against the new entries
+            pending = [
+                timer for timer in [self.current_timer] + list(self.timers)
+                if timer and timer.args and not timer.finished.is_set()
+            ]
+            queued = [timer.args[1] for timer in pending]
+            if self.stats.last_feed_index != change.map_index(self.stats.last_feed_index):
+                self.stats.last_feed_index = change.map_index(self.stats.last_feed_index)
+            if self.stats.last_rerun_index and change.start < self.stats.last_rerun_index:
+                self.stats.last_rerun_index = change.map_index(self.stats.last_rerun_index)
+            self.current_index = change.map_index(self.current_index)
+            if not queued or change.start > max(queued) or (change.start < min(queued) and change.old_end <= min(queued)):
+                # Queued tweets are unaffected, though they may have moved
+                for timer in pending:
+                    data, index, generation = timer.args
+                    timer.args = (data, change.map_index(index), generation)
+                return
+            Log.info("TWT.feed_change", "Requeueing tweets from feed index {}".format(min(queued)))
+            self._generation += 1
+            for timer in [self.current_timer] + list(self.timers):
+                if timer:
+                    timer.cancel()
+            self.timers.clear()
+            self.current_timer = None
+            self._end_chain()
+            self.current_index = change.map_index(min(queued))
+            self._next()
+
+    def _publish(self, data: dict, index: int):
+        """
+        Body of _tweet, run while the lock is held.
+        A chain's tweets are recorded in one stats transaction, written in the background
+        after its last tweet, so each tweet of the chain only waits on its post.
+        Other tweets save their stats as they go.
+        """
+        if data['chain'] and not self._in_transaction:
+            self.stats.begin()
+            self._in_transaction = True
+        try:
+            if self.config.functionality.Online:
+                # Once in the outbox, the post survives API failures and restarts
+                self.outbox.add(data, index, self._chain_parent(index), save=False)
+                self.outbox.flush() # Saves the outbox once, whether or not the post went out
             else:
-                Log.debug("TWT.tweet (id)", "Status ID: {}".format(status.id))
-                self.stats.register_tweet(status.id, data['title'])
-        else:
-            Log.info("TWT.tweet", data['title'])
-        self.stats.last_feed_index = index + success
+                Log.info("TWT.tweet", data['title'])
+                TWEETS_POSTED.inc(mode='offline')
+            self.stats.last_feed_index = index + 1
+        finally:
+            next_timer = self.timers[0] if self.timers else None
+            if data['chain'] and next_timer and next_timer.args and next_timer.args[1] == index + 1:
+                self._chain_timer = next_timer
+            else:
+                self._end_chain()
         self._next()
-        self.lock.clear()
+
+    def _end_chain(self):
+        ''' Commits the stats transaction of the chain being tweeted '''
+        with self._loop_lock:
+            self._chain_timer = None
+            if self._in_transaction:
+                self._in_transaction = False
+                self.stats.commit(background=True)
+
+    def _chain_parent(self, index: int) -> str:
+        ''' Title of the entry this one is chained to, if any '''
+        if index <= 0:
+            return None
+        try:
+            previous = self.feed.entry(index - 1)
+        except (LoadFeedError, IndexError):
+            return None
+        return previous['title'] if previous['chain'] else None
 
     def wait_for_tweet(self, timeout=None, timer_expected=True, last_timer=False):
         ''' Hangs up the calling thread while the CURRENT timer loops. '''
@@ -0,0 +1,86 @@
+"""
+Hot reloading of the tweet feed: polls the feed file's modification time
+and swaps new versions into the running bot once they've been validated.
+"""
+from threading import Timer
+from tweetfeeder.logs import Log
+from tweetfeeder.metrics import Metrics
+from tweetfeeder.exceptions import LoadFeedError
+from tweetfeeder.file_io.models import Feed
+
+FEED_RELOADS = Metrics.counter("tweetfeeder_feed_reloads_total", "Feed file changes seen by the watcher, by result")
+
+class FeedWatcher:
+    """
+    Checks a Feed's file every interval from a background timer.
+    A changed file is read and validated on the timer's thread; if it's valid
+    it replaces the feed's entries in one step and on_change receives the
+    FeedChange describing the region that differs. Invalid files are logged
+    and the last good version stays in use.
+    """
+    def __init__(self, feed: Feed, interval: float = 5, timer_factory=None, on_change=None):
+        ''' Prepares, but does not start, the watcher '''
+        self.feed = feed
+        self.interval = interval
+        self.timer_factory = timer_factory or Timer
+        self.on_change = on_change
+        self._log_namespace = Log.current_namespace()
+        self._timer = None
+        self._running = False
+        self._rejected = None # Signature of the last invalid file, so it's only reported once
+
+    def start(self):
+        ''' Takes over reloading the feed and starts polling '''
+        if not self._running:
+            self._running = True
+            self.feed.watched = True
+            self._schedule()
+
+    def stop(self):
+        ''' Stops polling; the feed goes back to checking its file on each read '''
+        self._running = False
+        self.feed.watched = False
+        if self._timer:
+            self._timer.cancel()
+
+    def is_running(self) -> bool:
+        ''' Whether the watcher is polling '''
+        return self._running
+
+    def _schedule(self):
+        ''' Queues the next check '''
+        self._timer = self.timer_factory(self.interval, self.check)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def check(self):
+        ''' Reloads the feed if its file has changed, then queues the next check '''
+        with Log.scope(self._log_namespace):
+            try:
+                self.reload()
+            finally:
+                if self._running:
+                    self._schedule()
+
+    def reload(self):
+        ''' Reads, validates and swaps in the feed file if it has changed; returns the FeedChange, if any '''
+        signature = self.feed.signature()
+        if signature is None or signature == self.feed.loaded_signature or signature == self._rejected:
+            return None
+        try:
+            entries, signature = self.feed.read()
+        except LoadFeedError:
+            # Already logged
+            FEED_RELOADS.inc(result='invalid')
+            self._rejected = signature
+            Log.warning("WATCH.reload", "Keeping the previous version of " + self.feed.filepath)
+            return None
+        change = self.feed.swap(entries, signature)
+        FEED_RELOADS.inc(result='changed' if change else 'unchanged')
+        if change:
+            Log.info("WATCH.reload", "Feed entries {}-{} changed ({:+d} entries)".format(
+                change.start, change.new_end, change.shift
+            ))
+            if self.on_change:
+                self.on_change(change)
+        return change